@@ -0,0 +1,154 @@
+"""
+Caché semántica de respuestas de /chat/query.
+
+Una respuesta se reutiliza solo si coincide el usuario, el contexto de conversación que
+entra al prompt (últimos 2 mensajes) y la versión de datos del usuario (`data_versions`,
+migrations/0009: la sube cualquier cambio en sus movimientos, cuentas o presupuestos).
+Dentro de ese ámbito:
+  1. Coincidencia exacta por texto normalizado (sin embedding ni Gemini).
+  2. Casi-duplicado: similitud coseno del embedding de la pregunta >= ANSWER_CACHE_SIMILARITY
+     y los mismos términos clave (meses, números, categorías, comercios: todo lo que no es
+     relleno de la pregunta). "gasté en enero" y "gasté en febrero" se parecen mucho en el
+     embedding pero no comparten respuesta.
+Entradas en memoria con TTL y desalojo LRU (ANSWER_CACHE_MAX). Se guardan y se devuelven
+copias: quien recibe la respuesta puede modificarla (timestamp) sin tocar la caché.
+"""
+import copy
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import numpy as np
+
+from database import get_conn
+
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "600"))
+ANSWER_CACHE_MAX = int(os.getenv("ANSWER_CACHE_MAX", "256"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+# Relleno de la pregunta: no cambia qué se pregunta ("cuánto he gastado" ~ "cuál fue mi gasto")
+_FILLER_WORDS = frozenset("""
+    cuanto cuanta cuantos cuantas que cual cuales como donde cuando
+    el la los las un una unos unas lo de del en a al por para con y o
+    mi mis me tu tus su sus se le es son fue fueron hay este esta esto estos estas
+    gaste gastado gastamos gasto gastos gastar he has ha llevo lleva llevas tengo tuve
+    dime dame muestrame mostrar ver quiero saber total hola afi favor porfa
+""".split())
+
+_entries: "OrderedDict[tuple, dict]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits_exact": 0, "hits_semantic": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+
+def normalize_question(question: str) -> str:
+    text = unicodedata.normalize("NFKD", question or "").encode("ascii", "ignore").decode("ascii")
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def key_terms(question: str) -> frozenset:
+    """Términos que cambian la respuesta (enero, 2024, restaurantes, uber...)."""
+    return frozenset(normalize_question(question).split()) - _FILLER_WORDS
+
+
+def context_key(context: str) -> str:
+    return hashlib.md5((context or "").encode("utf-8")).hexdigest()
+
+
+def get_data_version(user_id: Optional[int]) -> int:
+    """Versión de datos del usuario; sin usuario (modo abierto) vale la suma global."""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            if user_id:
+                cur.execute("SELECT COALESCE(MAX(version), 0) FROM data_versions WHERE user_id = %s;", (user_id,))
+            else:
+                cur.execute("SELECT COALESCE(SUM(version), 0) FROM data_versions;")
+            return int(cur.fetchone()[0])
+
+
+def _unit(embedding: Optional[Sequence[float]]) -> Optional[np.ndarray]:
+    if embedding is None:
+        return None
+    vec = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else None
+
+
+def _purge_expired(now: float) -> None:
+    for key in [k for k, entry in _entries.items() if entry["expires"] <= now]:
+        del _entries[key]
+        _stats["expired"] += 1
+
+
+def lookup(user_id: Optional[int], question: str, context: str, version: int,
+           embedding: Optional[Sequence[float]] = None, count_miss: bool = True) -> Optional[dict]:
+    """
+    Copia de la respuesta cacheada o None. Sin `embedding` solo prueba la coincidencia exacta;
+    con él busca además el casi-duplicado más parecido del mismo ámbito y los mismos términos clave.
+    `count_miss=False` para la pasada exacta previa a calcular el embedding.
+    """
+    scope = (user_id, context_key(context), version)
+    key = scope + (normalize_question(question),)
+    now = time.monotonic()
+    with _lock:
+        _purge_expired(now)
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            _stats["hits_exact"] += 1
+            return copy.deepcopy(entry["result"])
+
+        query_vec = _unit(embedding)
+        if query_vec is not None:
+            terms = key_terms(question)
+            best_key, best_score = None, ANSWER_CACHE_SIMILARITY
+            for candidate_key, candidate in _entries.items():
+                if candidate_key[:3] != scope or candidate["embedding"] is None or candidate["terms"] != terms:
+                    continue
+                score = float(np.dot(query_vec, candidate["embedding"]))
+                if score >= best_score:
+                    best_key, best_score = candidate_key, score
+            if best_key is not None:
+                _entries.move_to_end(best_key)
+                _stats["hits_semantic"] += 1
+                return copy.deepcopy(_entries[best_key]["result"])
+        if count_miss:
+            _stats["misses"] += 1
+    return None
+
+
+def store(user_id: Optional[int], question: str, context: str, version: int, result: dict,
+          embedding: Optional[Sequence[float]] = None) -> None:
+    key = (user_id, context_key(context), version, normalize_question(question))
+    now = time.monotonic()
+    with _lock:
+        _purge_expired(now)
+        _entries[key] = {
+            "result": copy.deepcopy(result),
+            "embedding": _unit(embedding),
+            "terms": key_terms(question),
+            "expires": now + ANSWER_CACHE_TTL,
+        }
+        _entries.move_to_end(key)
+        _stats["stores"] += 1
+        while len(_entries) > ANSWER_CACHE_MAX:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def answer_cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats, size=len(_entries))
+    lookups = stats["hits_exact"] + stats["hits_semantic"] + stats["misses"]
+    stats["hit_rate"] = round((stats["hits_exact"] + stats["hits_semantic"]) / lookups, 3) if lookups else 0.0
+    return stats
@@ -9,6 +9,7 @@ from typing import Dict, List, Tuple
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+import llm_client
 from db_ops import ensure_account, insert_transactions, list_accounts
 
 
@@ -106,8 +107,7 @@ def extract_transactions(file_path: Path, mime_type: str, model_name: str) -> Li
         time.sleep(1)
         uploaded = genai.get_file(uploaded.name)
 
-    model = genai.GenerativeModel(model_name)
-    response = model.generate_content([PROMPT, uploaded])
+    response = llm_client.generate_sync(model_name, [PROMPT, uploaded])
     text = response.text or ""
     return parse_gemini_response(text)
 
@@ -1,7 +1,8 @@
 import os
 import datetime
-import google.generativeai as genai
+import llm_client
 from database import get_conn
+from rollups import month_totals, net_balance
 
 def get_financial_summary():
     """Obtiene resumen financiero de la DB."""
@@ -12,14 +13,12 @@ def get_financial_summary():
     }
     
     try:
+        # 1. Saldo Total y 3. Gastos del Mes: desde monthly_rollups (no escanea transactions)
+        summary["balance"] = net_balance()
+        summary["month_spent"] = month_totals()["spend"]
+
         with get_conn() as conn:
             with conn.cursor() as cur:
-                # 1. Saldo Total (Net Worth aproximado: suma de todas las transacciones)
-                cur.execute("SELECT SUM(amount) FROM transactions;")
-                row = cur.fetchone()
-                if row and row[0] is not None:
-                    summary["balance"] = float(row[0])
-
                 # 2. Gastos de Ayer (Solo montos negativos)
                 cur.execute("""
                     SELECT SUM(amount) FROM transactions 
@@ -30,16 +29,6 @@ def get_financial_summary():
                 if row and row[0] is not None:
                     summary["yesterday_spent"] = abs(float(row[0])) # Mostrar positivo como "gasto"
 
-                # 3. Gastos del Mes (Solo montos negativos)
-                cur.execute("""
-                    SELECT SUM(amount) FROM transactions 
-                    WHERE date >= date_trunc('month', CURRENT_DATE) 
-                    AND amount < 0;
-                """)
-                row = cur.fetchone()
-                if row and row[0] is not None:
-                    summary["month_spent"] = abs(float(row[0]))
-
     except Exception as e:
         print(f"⚠️ Error obteniendo resumen financiero: {e}")
         # Retornamos ceros o lo que se haya podido calcular
@@ -80,8 +69,7 @@ No uses markdown complejo (negritas **texto** están bien).
 """
 
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content(prompt)
+        response = llm_client.generate_sync("gemini-2.5-flash", prompt, priority=llm_client.ALERT)
         return response.text
     except Exception as e:
         return f"⚠️ Error generando briefing: {e}"
@@ -1,7 +1,9 @@
 import os
 import datetime
 import google.generativeai as genai
+import llm_client
 from database import get_conn
+from rollups import month_totals, net_balance
 
 ADMIN_PHONE = os.getenv("ADMIN_PHONE")
 GENAI_KEY = os.getenv("GOOGLE_API_KEY")
@@ -16,17 +18,20 @@ def _fetch_snapshot():
         "yesterday_spend": None,
         "month_spend": None,
     }
+    # Liquidez y gasto del mes salen de monthly_rollups (costo constante con el historial)
+    try:
+        snapshot["liquidity"] = net_balance()
+    except Exception as e:
+        print(f"⚠️ Error obteniendo liquidez aproximada: {e}")
+    try:
+        snapshot["month_spend"] = month_totals()["spend"]
+    except Exception as e:
+        print(f"⚠️ Error obteniendo gastos del mes: {e}")
+
+    # Ayer no es granular por mes: consulta directa acotada por idx_tx_date
     try:
         with get_conn() as conn:
             with conn.cursor() as cur:
-                try:
-                    cur.execute("SELECT COALESCE(SUM(amount), 0) FROM transactions;")
-                    row = cur.fetchone()
-                    snapshot["liquidity"] = float(row[0]) if row and row[0] is not None else None
-                except Exception as e:
-                    print(f"⚠️ Error obteniendo liquidez aproximada: {e}")
-                    conn.rollback()
-
                 try:
                     cur.execute(
                         """
@@ -41,19 +46,6 @@ def _fetch_snapshot():
                 except Exception as e:
                     print(f"⚠️ Error obteniendo gastos de ayer: {e}")
 
-                try:
-                    cur.execute(
-                        """
-                        SELECT COALESCE(SUM(amount), 0)
-                        FROM transactions
-                        WHERE date >= date_trunc('month', CURRENT_DATE)
-                        AND amount < 0;
-                        """
-                    )
-                    row = cur.fetchone()
-                    snapshot["month_spend"] = abs(float(row[0])) if row and row[0] is not None else None
-                except Exception as e:
-                    print(f"⚠️ Error obteniendo gastos del mes: {e}")
     except Exception as e:
         print(f"⚠️ No se pudo conectar a la DB para briefing: {e}")
 
@@ -101,8 +93,7 @@ SALIDA: Solo el texto del mensaje.
 """
 
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content(prompt)
+        response = await llm_client.generate("gemini-2.5-flash", prompt, priority=llm_client.ALERT)
         message = (response.text or "").strip()
     except Exception as e:
         print(f"⚠️ Error generando briefing con Gemini: {e}")
@@ -0,0 +1,92 @@
+import csv
+import io
+from typing import Iterable, List, Optional, Sequence
+
+from database import get_conn
+
+# Columnas que cargan los importadores (el resto usa los DEFAULT de la tabla)
+TX_COPY_COLUMNS = (
+    "account_id",
+    "date",
+    "amount",
+    "description",
+    "category",
+    "status",
+    "import_source",
+    "user_id",
+    "tx_fingerprint",
+)
+
+_STAGE_DDL = """
+    CREATE TEMP TABLE tx_stage (
+        account_id INT,
+        date DATE,
+        amount NUMERIC(19, 4),
+        description TEXT,
+        category VARCHAR(100),
+        status VARCHAR(20),
+        import_source VARCHAR(255),
+        user_id INTEGER,
+        tx_fingerprint VARCHAR(32)
+    ) ON COMMIT DROP;
+"""
+
+
+class CsvRowStream:
+    """
+    Archivo de solo lectura que serializa filas a CSV bajo demanda.
+    COPY lo consume por bloques, así que el lote nunca se materializa completo en memoria.
+    """
+
+    def __init__(self, rows: Iterable[Sequence]):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+        self._pending = ""
+        self.rows_written = 0
+
+    def _fill(self, size: int) -> None:
+        while size < 0 or len(self._pending) < size:
+            try:
+                row = next(self._rows)
+            except StopIteration:
+                return
+            # En CSV de COPY un campo vacío sin comillas es NULL
+            self._writer.writerow(["" if value is None else value for value in row])
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+            self.rows_written += 1
+
+    def read(self, size: int = -1) -> str:
+        self._fill(size)
+        if size is None or size < 0:
+            chunk, self._pending = self._pending, ""
+        else:
+            chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+
+def copy_transactions(cur, rows: Iterable[Sequence]) -> List[str]:
+    """
+    Carga filas (en el orden de TX_COPY_COLUMNS) vía COPY FROM STDIN a una tabla staging
+    temporal y las fusiona en `transactions` con un solo INSERT ... SELECT.
+    Las huellas ya existentes se ignoran (ON CONFLICT DO NOTHING): reimportar es gratis.
+    Devuelve las huellas de las filas insertadas de verdad.
+    Debe ejecutarse dentro de una transacción (la staging se borra en el COMMIT).
+    """
+    columns = ", ".join(TX_COPY_COLUMNS)
+    cur.execute(_STAGE_DDL)
+    cur.copy_expert(f"COPY tx_stage ({columns}) FROM STDIN WITH (FORMAT csv)", CsvRowStream(rows))
+    cur.execute(
+        f"INSERT INTO transactions ({columns}) SELECT {columns} FROM tx_stage ON CONFLICT DO NOTHING RETURNING tx_fingerprint;"
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def bulk_load_transactions(rows: Iterable[Sequence], user_id: Optional[int] = None) -> List[str]:
+    """Abre una transacción propia y carga las filas con COPY. Devuelve las huellas insertadas."""
+    with get_conn(user_id=user_id) as conn:
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            return copy_transactions(cur, rows)
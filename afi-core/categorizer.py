@@ -0,0 +1,124 @@
+"""
+Motor de categorización masiva por reglas (keyword -> categoría, con prioridad).
+
+Todo el set de reglas se aplica en UNA sentencia: las reglas viajan como arrays
+(unnest), cada movimiento toma la regla ganadora (DISTINCT ON por prioridad) y el
+UPDATE devuelve qué regla lo tocó para contar coincidencias por regla.
+El filtro `LIKE ANY(...)` sobre LOWER(description) lo resuelve el índice GIN pg_trgm
+(migrations/0004) en vez de un seq scan por keyword.
+
+Con user_id, la vista previa y el UPDATE filtran `t.user_id` explícitamente: el pool
+conecta como afi_user, que salta el RLS, así que no basta con la sesión del usuario.
+"""
+from typing import Iterable, List, Optional, Sequence, Union
+
+from database import get_conn
+
+RuleInput = Union[dict, Sequence]
+
+_MATCH_CTE = """
+    WITH rules AS (
+        SELECT *
+        FROM unnest(%(ids)s::int[], %(patterns)s::text[], %(categories)s::text[], %(priorities)s::int[])
+            AS r(rule_id, pattern, category, priority)
+    ),
+    matches AS (
+        SELECT DISTINCT ON (t.transaction_id) t.transaction_id, r.rule_id, r.category
+        FROM transactions t
+        JOIN rules r ON LOWER(t.description) LIKE r.pattern
+        WHERE LOWER(t.description) LIKE ANY(%(patterns)s::text[])
+          {extra_filter} {user_filter}
+        ORDER BY t.transaction_id, r.priority DESC, r.rule_id
+    )
+"""
+
+_APPLY_SQL = _MATCH_CTE + """,
+    updated AS (
+        UPDATE transactions t
+        SET category = m.category
+        FROM matches m
+        WHERE t.transaction_id = m.transaction_id
+          AND t.category IS DISTINCT FROM m.category {user_filter}
+        RETURNING m.rule_id
+    )
+    SELECT rule_id, COUNT(*) FROM updated GROUP BY rule_id;
+"""
+
+_PREVIEW_SQL = _MATCH_CTE + """
+    SELECT m.rule_id, COUNT(*)
+    FROM matches m
+    JOIN transactions t ON t.transaction_id = m.transaction_id
+    WHERE t.category IS DISTINCT FROM m.category {user_filter}
+    GROUP BY m.rule_id;
+"""
+
+
+def _like_pattern(keyword: str) -> str:
+    """'%keyword%' en minúsculas, escapando los comodines de LIKE que traiga el keyword."""
+    escaped = keyword.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def normalize_rules(rules: Iterable[RuleInput]) -> List[dict]:
+    """
+    Acepta dicts {"keyword", "category", "priority"} o tuplas (keyword, category[, priority]).
+    Mayor prioridad gana; a igual prioridad gana la regla que aparece primero.
+    """
+    normalized = []
+    for rule in rules or []:
+        if isinstance(rule, dict):
+            keyword, category, priority = rule.get("keyword"), rule.get("category"), rule.get("priority", 0)
+        else:
+            keyword, category = rule[0], rule[1]
+            priority = rule[2] if len(rule) > 2 else 0
+        keyword = str(keyword or "").strip()
+        if not keyword or not category:
+            continue
+        normalized.append({"keyword": keyword, "category": str(category), "priority": int(priority or 0)})
+    return normalized
+
+
+def apply_category_rules(
+    rules: Iterable[RuleInput],
+    dry_run: bool = False,
+    only_uncategorized: bool = False,
+    user_id: Optional[int] = None,
+) -> dict:
+    """
+    Aplica (o previsualiza con dry_run) un set de reglas en una sola pasada.
+    Devuelve {"updated": total, "dry_run": bool, "rules": [{keyword, category, priority, matches}]}.
+    """
+    normalized = normalize_rules(rules)
+    result = {"updated": 0, "dry_run": dry_run, "rules": [dict(rule, matches=0) for rule in normalized]}
+    if not normalized:
+        return result
+
+    params = {
+        "ids": list(range(len(normalized))),
+        "patterns": [_like_pattern(rule["keyword"]) for rule in normalized],
+        "categories": [rule["category"] for rule in normalized],
+        "priorities": [rule["priority"] for rule in normalized],
+        "user_id": user_id,
+    }
+    extra_filter = "AND (t.category IS NULL OR t.category = '')" if only_uncategorized else ""
+    user_filter = "" if user_id is None else "AND t.user_id = %(user_id)s"
+    sql = (_PREVIEW_SQL if dry_run else _APPLY_SQL).format(extra_filter=extra_filter, user_filter=user_filter)
+
+    with get_conn(user_id=user_id) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            counts = cur.fetchall()
+
+    for rule_id, count in counts:
+        result["rules"][rule_id]["matches"] = count
+        result["updated"] += count
+    return result
+
+
+def format_rule_report(result: dict) -> str:
+    """Resumen legible por regla para el chat."""
+    verb = "Coincidirían" if result.get("dry_run") else "Actualizadas"
+    lines = [f"📋 {verb}: {result.get('updated', 0)} transacciones."]
+    for rule in result.get("rules", []):
+        lines.append(f"- '{rule['keyword']}' → {rule['category']}: {rule['matches']}")
+    return "\n".join(lines)
@@ -0,0 +1,90 @@
+"""
+Armado de contexto previo a la primera llamada a Gemini.
+
+- `load_user_row`: users.id, perfil, modo, file_context y memoria de chat del teléfono en
+  un solo round trip (antes eran _resolve_user_id + get_user_profile + get_user_context +
+  conversation_store.load, cada uno con su conexión).
+- `gather_timed`: corre las fuentes independientes a la vez (fila del usuario, RAG, esquema,
+  presupuestos...) y mide cada una. El tiempo hasta la primera llamada al LLM queda en el de
+  la fuente más lenta en vez de la suma. Una fuente que falla devuelve None y no tumba el resto.
+
+Tiempos por fuente (promedio / máximo) y de cada etapa completa en context_stats() (/metrics).
+"""
+import asyncio
+import threading
+import time
+from typing import Optional
+
+import conversation_store
+from database import get_conn
+
+_lock = threading.Lock()
+_stats: dict = {}
+
+
+def _record(name: str, ms: float) -> None:
+    with _lock:
+        entry = _stats.setdefault(name, {"calls": 0, "ms_total": 0.0, "ms_max": 0.0})
+        entry["calls"] += 1
+        entry["ms_total"] += ms
+        entry["ms_max"] = max(entry["ms_max"], ms)
+
+
+async def _timed(stage: str, name: str, awaitable, timings: dict):
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    except Exception as e:
+        print(f"⚠️ Contexto '{name}' falló: {e}")
+        return None
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        timings[name] = round(ms, 1)
+        _record(f"{stage}.{name}", ms)
+
+
+async def gather_timed(stage: str, **sources) -> tuple:
+    """(resultados por nombre, ms por fuente + "total") de awaitables que corren en paralelo."""
+    timings: dict = {}
+    start = time.perf_counter()
+    names = list(sources)
+    values = await asyncio.gather(*(_timed(stage, name, sources[name], timings) for name in names))
+    total = (time.perf_counter() - start) * 1000
+    timings["total"] = round(total, 1)
+    _record(f"{stage}.total", total)
+    return dict(zip(names, values)), timings
+
+
+def load_user_row(phone: Optional[str]) -> dict:
+    """Identidad, perfil, estado y memoria de chat del teléfono en una sola consulta."""
+    context = {"user_id": None, "profile": None, "state": None, "memory": conversation_store.memory_from_row(None, None)}
+    if not phone:
+        return context
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT u.id, u.phone, u.name, u.role, u.profile_status, u.financial_goals,
+                       s.phone, s.file_context, s.current_mode, s.chat_history, s.chat_summary
+                FROM (SELECT %s::text AS phone) p
+                LEFT JOIN users u ON u.phone = p.phone
+                LEFT JOIN user_state s ON s.phone = p.phone;
+                """,
+                (phone,),
+            )
+            row = cur.fetchone()
+    if row[0] is not None:
+        context["user_id"] = row[0]
+        context["profile"] = {"phone": row[1], "name": row[2], "role": row[3], "status": row[4], "goals": row[5]}
+    if row[6] is not None:
+        context["state"] = {"file_context": row[7], "mode": row[8]}
+        context["memory"] = conversation_store.memory_from_row(row[9], row[10])
+    return context
+
+
+def context_stats() -> dict:
+    with _lock:
+        return {
+            name: {"calls": e["calls"], "ms_avg": round(e["ms_total"] / e["calls"], 1), "ms_max": round(e["ms_max"], 1)}
+            for name, e in _stats.items()
+        }
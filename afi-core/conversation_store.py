@@ -0,0 +1,183 @@
+"""
+Memoria de conversación por usuario para main.ai_router (migrations/0014).
+
+- Persistencia: los turnos de texto (usuario / modelo) se agregan a user_state.chat_history;
+  los pasos internos de function-calling no se guardan.
+- Ventana con presupuesto de tokens: al modelo solo se le envían los turnos más recientes
+  que caben en CHAT_HISTORY_TOKEN_BUDGET, más el resumen acumulado (chat_summary).
+- Resumen incremental: cuando hay turnos fuera de la ventana, `compact` los condensa junto
+  con el resumen anterior (Gemini, prioridad BATCH) y los quita de la tabla. El prompt por
+  turno queda acotado aunque la conversación dure meses.
+- Un lock por usuario: mensajes seguidos del mismo teléfono se atienden en orden (y ven la
+  respuesta anterior); usuarios distintos corren en paralelo. `compact` solo lo toma para
+  leer: la llamada BATCH al LLM corre sin él, así que el siguiente mensaje no espera al
+  resumen. Los turnos que llegan mientras tanto quedan a salvo (_store_summary quita por
+  posición solo los `folded` más viejos); _compacting evita dos resúmenes a la vez.
+"""
+import asyncio
+import os
+import weakref
+from typing import List, Optional, Tuple
+
+from psycopg2.extras import Json
+
+import llm_client
+from database import get_conn
+from quota_scheduler import estimate_tokens
+
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+CHAT_SUMMARY_MAX_WORDS = int(os.getenv("CHAT_SUMMARY_MAX_WORDS", "150"))
+CHAT_SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gemini-2.5-flash")
+
+# Se liberan solos cuando ningún mensaje del usuario los está usando
+_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+# Teléfonos con un resumen en curso
+_compacting: set = set()
+
+
+def user_lock(phone: Optional[str]) -> asyncio.Lock:
+    key = phone or ""
+    lock = _locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _locks[key] = lock
+    return lock
+
+
+def split_window(turns: List[dict], budget: int = CHAT_HISTORY_TOKEN_BUDGET) -> Tuple[List[dict], List[dict]]:
+    """(turnos viejos fuera de la ventana, turnos recientes que caben en `budget` tokens)."""
+    used, start = 0, len(turns)
+    while start > 0:
+        cost = estimate_tokens(turns[start - 1].get("text") or "")
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+    # La ventana arranca en un turno del usuario: Gemini espera user/model alternados
+    while start < len(turns) and turns[start].get("role") != "user":
+        start += 1
+    return turns[:start], turns[start:]
+
+
+def load(phone: Optional[str]) -> dict:
+    """{"summary", "turns" (ventana), "overflow" (turnos pendientes de resumir)}; vacío si la DB falla."""
+    memory = {"summary": "", "turns": [], "overflow": 0}
+    if not phone:
+        return memory
+    try:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT chat_history, chat_summary FROM user_state WHERE phone = %s;", (phone,))
+                row = cur.fetchone()
+    except Exception as e:
+        print(f"⚠️ No se pudo leer la memoria de chat de {phone}: {e}")
+        return memory
+    if not row:
+        return memory
+    return memory_from_row(row[0], row[1])
+
+
+def memory_from_row(history: Optional[List[dict]], summary: Optional[str]) -> dict:
+    """Ventana + resumen a partir de las columnas de user_state (también lo usa context_loader)."""
+    old, recent = split_window(history or [])
+    return {"summary": summary or "", "turns": recent, "overflow": len(old)}
+
+
+def needs_compaction(memory: dict, new_turns: List[dict]) -> bool:
+    """¿Quedarán turnos fuera de la ventana después de agregar `new_turns`?"""
+    return bool(memory["overflow"]) or bool(split_window(memory["turns"] + new_turns)[0])
+
+
+def to_gemini_history(turns: List[dict]) -> List[dict]:
+    return [{"role": turn["role"], "parts": [turn["text"]]} for turn in turns if turn.get("text")]
+
+
+def append_turns(phone: Optional[str], turns: List[dict]) -> None:
+    if not phone or not turns:
+        return
+    try:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO user_state (phone, chat_history, chat_updated_at)
+                    VALUES (%s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (phone) DO UPDATE SET
+                        chat_history = user_state.chat_history || EXCLUDED.chat_history,
+                        chat_updated_at = CURRENT_TIMESTAMP;
+                    """,
+                    (phone, Json(turns)),
+                )
+    except Exception as e:
+        print(f"⚠️ No se pudo guardar la memoria de chat de {phone}: {e}")
+
+
+def _read_all(phone: str) -> Tuple[List[dict], str]:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT chat_history, chat_summary FROM user_state WHERE phone = %s;", (phone,))
+            row = cur.fetchone()
+    return (row[0] or [], row[1] or "") if row else ([], "")
+
+
+def _store_summary(phone: str, summary: str, folded: int) -> None:
+    """Guarda el resumen nuevo y quita de chat_history los `folded` turnos más viejos."""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE user_state SET
+                    chat_summary = %s,
+                    chat_history = COALESCE((
+                        SELECT jsonb_agg(turn ORDER BY pos)
+                        FROM jsonb_array_elements(chat_history) WITH ORDINALITY AS t(turn, pos)
+                        WHERE pos > %s
+                    ), '[]'::jsonb),
+                    chat_updated_at = CURRENT_TIMESTAMP
+                WHERE phone = %s;
+                """,
+                (summary, folded, phone),
+            )
+
+
+def _summary_prompt(previous: str, turns: List[dict]) -> str:
+    transcript = "\n".join(f"{'USUARIO' if t['role'] == 'user' else 'AFI'}: {t.get('text') or ''}" for t in turns)
+    return f"""
+Resume la conversación entre un usuario y AFI (su CFO personal) para usarla como memoria.
+Conserva datos concretos: montos, cuentas, metas, decisiones y pendientes. Omite saludos.
+Máximo {CHAT_SUMMARY_MAX_WORDS} palabras, en español, sin markdown.
+
+RESUMEN ANTERIOR:
+{previous or "(vacío)"}
+
+TURNOS NUEVOS:
+{transcript}
+"""
+
+
+async def compact(phone: Optional[str]) -> bool:
+    """Condensa en chat_summary los turnos que ya no caben en la ventana. True si resumió."""
+    if not phone or phone in _compacting:
+        return False
+    _compacting.add(phone)
+    try:
+        # Lectura consistente con el último turno; el LLM se espera sin el lock del usuario
+        async with user_lock(phone):
+            turns, previous = await asyncio.to_thread(_read_all, phone)
+        old, _ = split_window(turns)
+        if not old:
+            return False
+        response = await llm_client.generate(
+            CHAT_SUMMARY_MODEL, _summary_prompt(previous, old), priority=llm_client.BATCH
+        )
+        summary = (response.text or "").strip()
+        if not summary:
+            return False
+        await asyncio.to_thread(_store_summary, phone, summary, len(old))
+        return True
+    except Exception as e:
+        # Sin resumen los turnos viejos quedan en la tabla; la ventana igual acota el prompt
+        print(f"⚠️ No se pudo resumir la conversación de {phone}: {e}")
+        return False
+    finally:
+        _compacting.discard(phone)
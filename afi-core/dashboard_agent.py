@@ -1,5 +1,6 @@
 import os
 import google.generativeai as genai
+import llm_client
 
 # Configuración
 API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -51,8 +52,7 @@ Solo código Python.
 """
     
     try:
-        model = genai.GenerativeModel("models/gemini-2.5-pro")
-        response = model.generate_content(prompt)
+        response = llm_client.generate_sync("models/gemini-2.5-pro", prompt)
         code = response.text.replace("```python", "").replace("```", "").strip()
         
         with open(DASHBOARD_PATH, "w") as f:
@@ -1,4 +1,5 @@
 import google.generativeai as genai
+import llm_client
 import pandas as pd
 import json
 import time
@@ -52,9 +53,7 @@ def process_file_universal(file_path, mime_type):
                 txs = extract_from_text(chunk_text)
                 if txs:
                     all_transactions.extend(txs)
-                
-                # Pequeña pausa para no saturar API
-                time.sleep(1)
+                # Sin pausa fija: quota_scheduler reparte la cuota (los lotes van con prioridad BATCH)
 
         # --- ESTRATEGIA 2: NATIVA PARA PDF/IMÁGENES ---
         else:
@@ -109,11 +108,10 @@ def extract_with_vision(file_path, mime_type):
 
 def _call_gemini(prompt, content=None):
     try:
-        model = genai.GenerativeModel(MODEL_PARSER)
         if content:
-            response = model.generate_content([prompt, content])
+            response = llm_client.generate_sync(MODEL_PARSER, [prompt, content])
         else:
-            response = model.generate_content(prompt)
+            response = llm_client.generate_sync(MODEL_PARSER, prompt)
             
         clean_json = response.text.replace("```json", "").replace("```", "").strip()
         return json.loads(clean_json)
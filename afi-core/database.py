@@ -3,20 +3,44 @@ import time
 import psycopg2
 from psycopg2.extras import Json
 
+from db_pool import ConnectionPoolManager
+from migrate import apply_migrations
+
 # Configuración
 DB_HOST = os.getenv("DB_HOST", "afi_db")
 DB_USER = os.getenv("DB_USER", "afi_user")
 DB_PASS = os.getenv("DB_PASS", "password")
 DB_NAME = os.getenv("DB_NAME", "afi_brain")
 
+# Pool de conexiones (una sola instancia por proceso)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_SECONDS", "30"))
+
+_pool = ConnectionPoolManager(
+    DB_POOL_MIN,
+    DB_POOL_MAX,
+    timeout=DB_POOL_TIMEOUT,
+    healthcheck_after=DB_POOL_HEALTHCHECK_SECONDS,
+    host=DB_HOST,
+    user=DB_USER,
+    password=DB_PASS,
+    database=DB_NAME,
+)
+
 
 def get_conn(user_id=None):
-    conn = psycopg2.connect(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME)
-    conn.autocommit = True
-    if user_id is not None:
-        with conn.cursor() as cur:
-            cur.execute("SET app.current_user_id = %s;", (str(user_id),))
-    return conn
+    """
+    Presta una conexión del pool (autocommit). Usar con `with` o llamar close() para devolverla.
+    Si se pasa user_id, la conexión queda con app.current_user_id fijado (RLS) hasta su devolución.
+    """
+    return _pool.acquire(user_id=user_id)
+
+
+def pool_stats() -> dict:
+    """Métricas del pool: tiempos de espera, timeouts y saturación."""
+    return _pool.stats()
 
 
 def wait_for_db(retries: int = 5, delay: int = 2):
@@ -37,74 +61,28 @@ def wait_for_db(retries: int = 5, delay: int = 2):
 
 
 def init_db():
-    """Inicializa esquemas y extensiones."""
+    """Aplica las migraciones pendientes (una sola vez, al arrancar) y siembra datos del entorno."""
     wait_for_db()
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS user_state (
-                    phone TEXT PRIMARY KEY,
-                    current_mode TEXT DEFAULT 'NORMAL',
-                    file_context TEXT,
-                    chat_history JSONB DEFAULT '[]'::jsonb,
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                """
-            )
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS financial_wisdom (
-                    id BIGSERIAL PRIMARY KEY,
-                    content TEXT,
-                    metadata JSONB,
-                    embedding VECTOR(768)
-                );
-                """
-            )
+            apply_migrations(cur)
+
+            # Moneda y tipo de cuenta por defecto configurables por entorno
             cur.execute(
                 """
-                CREATE INDEX IF NOT EXISTS idx_financial_wisdom_embedding
-                ON financial_wisdom USING ivfflat (embedding vector_cosine_ops);
-                """
+                INSERT INTO currencies (currency_code, currency_name, symbol)
+                VALUES (%s, 'Local Currency', '$')
+                ON CONFLICT (currency_code) DO NOTHING;
+                """,
+                (os.getenv("DEFAULT_CURRENCY", "COP"),),
             )
-
-            # NUEVA TABLA: USUARIOS (PERFIL PERSONAL)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    phone TEXT UNIQUE NOT NULL,
-                    name TEXT,
-                    role TEXT DEFAULT 'user', -- 'admin' para Diego
-                    profile_status TEXT DEFAULT 'incomplete', -- 'incomplete', 'active'
-                    financial_goals TEXT, -- Resumen de metas (ej: 'Pagar deuda Nubank')
-                    last_interaction TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-
-            # Migrar esquema legado (phone como PK) a modelo con id entero
-            cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS id SERIAL;")
-            cur.execute("ALTER TABLE users ALTER COLUMN phone SET NOT NULL;")
-            cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_phone_unique ON users(phone);")
             cur.execute(
                 """
-                DO $$
-                BEGIN
-                    IF NOT EXISTS (
-                        SELECT 1
-                        FROM information_schema.table_constraints tc
-                        JOIN information_schema.key_column_usage kcu
-                            ON tc.constraint_name = kcu.constraint_name
-                        WHERE tc.table_name = 'users'
-                          AND tc.constraint_type = 'PRIMARY KEY'
-                          AND kcu.column_name = 'id'
-                    ) THEN
-                        ALTER TABLE users DROP CONSTRAINT IF EXISTS users_pkey;
-                        ALTER TABLE users ADD CONSTRAINT users_pkey PRIMARY KEY (id);
-                    END IF;
-                END $$;
-                """
+                INSERT INTO account_types (type_name, classification)
+                VALUES (%s, 'ASSET')
+                ON CONFLICT (type_name) DO NOTHING;
+                """,
+                (os.getenv("DEFAULT_ACCOUNT_TYPE", "Wallet"),),
             )
 
             # SEED ADMIN (sin nombre, forzando onboarding limpio)
@@ -117,33 +95,6 @@ def init_db():
                         SET profile_status = 'incomplete', name = NULL;
                 """, (admin_phone,))
 
-            # Campo de datos pendientes para ingestas (limbo)
-            cur.execute("""
-                ALTER TABLE user_state
-                ADD COLUMN IF NOT EXISTS pending_file_data JSONB;
-            """)
-
-            # Sesiones y OTPs para autenticación persistente
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS sessions (
-                    token TEXT PRIMARY KEY,
-                    phone TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    expires_at TIMESTAMP NOT NULL
-                );
-                """
-            )
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS otps (
-                    phone TEXT PRIMARY KEY,
-                    code TEXT NOT NULL,
-                    expires_at TIMESTAMP NOT NULL
-                );
-                """
-            )
-
             print("✅ Esquema de Usuarios sincronizado.")
 
 
@@ -1,13 +1,24 @@
 import datetime
+import hashlib
 import os
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
 from typing import Iterable, List, Optional, Sequence, Tuple, Any
 
 from psycopg2.extras import execute_values
 
+from bulk_loader import bulk_load_transactions
+from categorizer import apply_category_rules
 from database import get_conn
+from partitions import ensure_partitions_for
 
 DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "COP")
 DEFAULT_ACCOUNT_TYPE = os.getenv("DEFAULT_ACCOUNT_TYPE", "Wallet")
+# A partir de este tamaño de lote se usa COPY (staging) en vez de INSERT ... VALUES
+BULK_COPY_MIN_ROWS = int(os.getenv("BULK_COPY_MIN_ROWS", "200"))
+# Mismo DEFAULT que transactions.user_id (admin) cuando no hay contexto de usuario
+DEFAULT_TX_USER_ID = 1
+# Descripción de un movimiento sin texto (también en el backfill de migrations/0003)
+DEFAULT_TX_DESCRIPTION = "Movimiento"
 
 
 def execute_insert(sql: str, params: Optional[Tuple] = None, user_id: Optional[int] = None) -> None:
@@ -45,113 +56,6 @@ def get_schema_info() -> dict:
             return schema
 
 
-def _ensure_base_schema(cur) -> None:
-    """Guarantee core tables exist before writing data."""
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS currencies (
-            currency_code CHAR(3) PRIMARY KEY,
-            currency_name VARCHAR(50),
-            symbol VARCHAR(5)
-        );
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS master_categories (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(50) UNIQUE NOT NULL,
-            type VARCHAR(20) NOT NULL CHECK (type IN ('fixed', 'variable', 'savings'))
-        );
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS monthly_budgets (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            category_id INTEGER REFERENCES master_categories(id),
-            month DATE NOT NULL,
-            amount_limit DECIMAL(15,2) NOT NULL DEFAULT 0,
-            UNIQUE(user_id, category_id, month)
-        );
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS account_types (
-            type_id SERIAL PRIMARY KEY,
-            type_name VARCHAR(50) NOT NULL UNIQUE,
-            classification VARCHAR(20) NOT NULL DEFAULT 'ASSET'
-        );
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS accounts (
-            account_id SERIAL PRIMARY KEY,
-            account_name VARCHAR(100) NOT NULL UNIQUE,
-            account_type_id INT REFERENCES account_types(type_id),
-            currency_code CHAR(3) REFERENCES currencies(currency_code) DEFAULT %s,
-            is_active BOOLEAN DEFAULT TRUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """,
-        (DEFAULT_CURRENCY,),
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS transactions (
-            transaction_id SERIAL PRIMARY KEY,
-            account_id INT REFERENCES accounts(account_id) ON DELETE CASCADE,
-            date DATE NOT NULL,
-            amount NUMERIC(19, 4) NOT NULL,
-            description TEXT,
-            category VARCHAR(100),
-            status VARCHAR(20) DEFAULT 'CLEARED',
-            import_source VARCHAR(255),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """
-    )
-    cur.execute(
-        """
-        ALTER TABLE IF EXISTS transactions
-        ADD COLUMN IF NOT EXISTS category_id INTEGER REFERENCES master_categories(id);
-        """
-    )
-    cur.execute(
-        """
-        INSERT INTO currencies (currency_code, currency_name, symbol)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (currency_code) DO NOTHING;
-        """,
-        (DEFAULT_CURRENCY, "Local Currency", "$"),
-    )
-    cur.execute(
-        """
-        INSERT INTO account_types (type_name, classification)
-        VALUES (%s, 'ASSET')
-        ON CONFLICT (type_name) DO NOTHING;
-        """,
-        (DEFAULT_ACCOUNT_TYPE,),
-    )
-
-    # Columnas adicionales para multi-tenant y HITL
-    cur.execute("ALTER TABLE IF EXISTS accounts ADD COLUMN IF NOT EXISTS user_id INTEGER DEFAULT 1;")
-    cur.execute(
-        """
-        ALTER TABLE IF EXISTS transactions
-        ADD COLUMN IF NOT EXISTS confidence_score FLOAT DEFAULT 1.0,
-        ADD COLUMN IF NOT EXISTS is_confirmed BOOLEAN DEFAULT FALSE,
-        ADD COLUMN IF NOT EXISTS review_needed BOOLEAN DEFAULT FALSE,
-        ADD COLUMN IF NOT EXISTS user_id INTEGER DEFAULT 1;
-        """
-    )
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_tx_date ON transactions(date);")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_monthly_budgets_user_month ON monthly_budgets(user_id, month);")
-
-
 def _coerce_date(value: object) -> datetime.date:
     if isinstance(value, datetime.date):
         return value
@@ -161,12 +65,23 @@ def _coerce_date(value: object) -> datetime.date:
         return datetime.date.today()
 
 
+def _coerce_amount(value: object) -> Optional[Decimal]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        amount = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    if not amount.is_finite():
+        return None
+    return amount
+
+
 def ensure_account(account_name: str, account_type: str = DEFAULT_ACCOUNT_TYPE, currency: str = DEFAULT_CURRENCY) -> Optional[int]:
     if not account_name:
         return None
     with get_conn() as conn:
         with conn.cursor() as cur:
-            _ensure_base_schema(cur)
             cur.execute(
                 """
                 INSERT INTO account_types (type_name, classification)
@@ -191,46 +106,125 @@ def ensure_account(account_name: str, account_type: str = DEFAULT_ACCOUNT_TYPE,
 def list_accounts() -> List[Tuple[int, str]]:
     with get_conn() as conn:
         with conn.cursor() as cur:
-            _ensure_base_schema(cur)
             cur.execute("SELECT account_id, account_name FROM accounts ORDER BY account_name;")
             return cur.fetchall()
 
 
-def insert_transactions(account_id: int, txs: Sequence[dict], import_source: Optional[str] = None, status: str = "CLEARED") -> int:
+def _normalize_description(text: object) -> str:
+    return " ".join(str(text or "").split()).lower()
+
+
+def transaction_fingerprint(
+    user_id: int,
+    account_id: int,
+    date_value: datetime.date,
+    amount: Decimal,
+    description: object,
+    import_source: Optional[str],
+    source_ref: Optional[str] = None,
+    occurrence: int = 0,
+) -> str:
+    """
+    Huella determinista de un movimiento (clave natural para reimportaciones idempotentes).
+    `occurrence` distingue movimientos idénticos legítimos dentro del mismo lote
+    (dos cafés iguales el mismo día); `source_ref` identifica el mensaje/archivo de origen
+    cuando la fuente es continua (voz, correo). Debe coincidir con el backfill de
+    migrations/0003_transaction_fingerprint.sql: monto redondeado mitad lejos de cero (ROUND
+    de Postgres), descripción vacía -> DEFAULT_TX_DESCRIPTION, todo espacio colapsado.
+    """
+    parts = [
+        str(user_id),
+        str(account_id),
+        date_value.isoformat(),
+        str(Decimal(amount).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)),
+        _normalize_description(description or DEFAULT_TX_DESCRIPTION),
+        import_source or "",
+        source_ref or "",
+        str(occurrence),
+    ]
+    return hashlib.md5("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def insert_new_transactions(
+    account_id: int,
+    txs: Sequence[dict],
+    import_source: Optional[str] = None,
+    status: str = "CLEARED",
+    user_id: Optional[int] = None,
+) -> List[dict]:
+    """
+    Inserta movimientos de forma idempotente: los que ya existen (misma huella) se ignoran.
+    Devuelve los movimientos de `txs` que se insertaron realmente (RETURNING tx_fingerprint),
+    para que las alertas no se repitan al reimportar el mismo extracto.
+    """
     if not account_id or not txs:
-        return 0
+        return []
+    owner_id = user_id or DEFAULT_TX_USER_ID
     rows: List[Tuple] = []
+    by_fingerprint: dict = {}
+    occurrences: dict = {}
     for tx in txs:
         if not isinstance(tx, dict):
             continue
-        amount_raw = tx.get("amount")
-        try:
-            amount_val = float(amount_raw)
-        except Exception:
-            continue
-        if amount_val == 0:
+        amount_val = _coerce_amount(tx.get("amount"))
+        if amount_val is None or amount_val == 0:
             continue
-        description = tx.get("description") or tx.get("payee_name") or tx.get("payee") or "Movimiento"
+        description = tx.get("description") or tx.get("payee_name") or tx.get("payee") or DEFAULT_TX_DESCRIPTION
         category = tx.get("category")
         import_src = tx.get("import_source") or import_source
         date_val = _coerce_date(tx.get("date") or datetime.date.today())
-        rows.append((account_id, date_val, amount_val, description, category, status, import_src))
+        source_ref = tx.get("source_ref")
+
+        key = (date_val, amount_val, _normalize_description(description), import_src, source_ref)
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+        fingerprint = transaction_fingerprint(
+            owner_id, account_id, date_val, amount_val, description, import_src, source_ref, occurrence
+        )
+        by_fingerprint[fingerprint] = tx
+        rows.append((account_id, date_val, amount_val, description, category, status, import_src, owner_id, fingerprint))
 
     if not rows:
-        return 0
+        return []
 
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            _ensure_base_schema(cur)
-            execute_values(
-                cur,
-                """
-                INSERT INTO transactions (account_id, date, amount, description, category, status, import_source)
-                VALUES %s
-                """,
-                rows,
-            )
-    return len(rows)
+    try:
+        # Meses históricos: su partición antes de insertar (si no, quedan en transactions_default)
+        ensure_partitions_for({row[1] for row in rows})
+    except Exception as e:
+        print(f"⚠️ No se pudieron crear particiones para la carga: {e}")
+
+    # Lotes grandes (extractos históricos): COPY a staging y merge en un solo INSERT
+    if len(rows) >= BULK_COPY_MIN_ROWS:
+        inserted = bulk_load_transactions(rows, user_id=user_id)
+    else:
+        with get_conn(user_id=user_id) as conn:
+            with conn.cursor() as cur:
+                inserted = [
+                    row[0]
+                    for row in execute_values(
+                        cur,
+                        """
+                        INSERT INTO transactions (account_id, date, amount, description, category, status, import_source, user_id, tx_fingerprint)
+                        VALUES %s
+                        ON CONFLICT DO NOTHING
+                        RETURNING tx_fingerprint
+                        """,
+                        rows,
+                        fetch=True,
+                    )
+                ]
+    return [by_fingerprint[fingerprint] for fingerprint in inserted if fingerprint in by_fingerprint]
+
+
+def insert_transactions(
+    account_id: int,
+    txs: Sequence[dict],
+    import_source: Optional[str] = None,
+    status: str = "CLEARED",
+    user_id: Optional[int] = None,
+) -> int:
+    """Como insert_new_transactions; devuelve cuántos se insertaron realmente."""
+    return len(insert_new_transactions(account_id, txs, import_source=import_source, status=status, user_id=user_id))
 
 
 def record_transaction(
@@ -257,32 +251,18 @@ def record_transaction(
     return inserted
 
 
-def bulk_categorize(category_name: str, keywords: Iterable[str]) -> int:
+def bulk_categorize(category_name: str, keywords: Iterable[str], user_id: Optional[int] = None) -> int:
+    """Mueve a `category_name` todo lo del usuario que contenga algún keyword (una sola pasada, ver categorizer)."""
     if not category_name:
         return 0
-    keywords_list = [k for k in keywords if k]
-    if not keywords_list:
+    rules = [(kw, category_name) for kw in keywords if kw]
+    if not rules:
         return 0
-    total_updated = 0
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            _ensure_base_schema(cur)
-            for kw in keywords_list:
-                cur.execute(
-                    """
-                    UPDATE transactions
-                    SET category = %s
-                    WHERE LOWER(description) LIKE LOWER(%s);
-                    """,
-                    (category_name, f"%{kw}%"),
-                )
-                total_updated += cur.rowcount
-    return total_updated
+    return apply_category_rules(rules, user_id=user_id)["updated"]
 
 
 def delete_all_accounts_and_transactions() -> None:
     with get_conn() as conn:
         with conn.cursor() as cur:
-            _ensure_base_schema(cur)
             cur.execute("DELETE FROM transactions;")
             cur.execute("DELETE FROM accounts;")
@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from typing import Optional
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2 import pool as pg_pool
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No hubo conexión libre dentro del tiempo de espera configurado."""
+
+
+class PooledConnection:
+    """
+    Proxy sobre una conexión prestada por el pool.
+    Se comporta como la conexión psycopg2 original; al salir del `with` o al llamar
+    close() la conexión vuelve al pool en vez de cerrarse.
+    """
+
+    def __init__(self, manager: "ConnectionPoolManager", conn, rls_applied: bool):
+        object.__setattr__(self, "_manager", manager)
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_rls_applied", rls_applied)
+        object.__setattr__(self, "_released", False)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if not self._conn.closed and not self._conn.autocommit:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+        return False
+
+    @property
+    def closed(self):
+        return self._released or self._conn.closed
+
+    def close(self):
+        """Devuelve la conexión al pool (idempotente)."""
+        if self._released:
+            return
+        object.__setattr__(self, "_released", True)
+        self._manager.release(self._conn, reset_rls=self._rls_applied)
+
+
+class ConnectionPoolManager:
+    """
+    Pool de conexiones acotado y seguro para RLS, compartido por todo el proceso.
+    - Espera acotada (timeout) cuando el pool está saturado.
+    - Health check (SELECT 1) de conexiones que llevan tiempo ociosas.
+    - app.current_user_id se fija al prestar y se resetea al devolver, para que una
+      conexión reutilizada nunca arrastre la identidad RLS de otro usuario.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float, healthcheck_after: float, **conn_kwargs):
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn)
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self.conn_kwargs = conn_kwargs
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._last_used: dict[int, float] = {}
+        self._stats = {
+            "acquired": 0,
+            "waited": 0,
+            "timeouts": 0,
+            "discarded": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "in_use": 0,
+            "peak_in_use": 0,
+        }
+
+    def _get_pool(self):
+        # Tras un fork (workers de uvicorn) las conexiones heredadas no se comparten.
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pool = pg_pool.ThreadedConnectionPool(self.minconn, self.maxconn, **self.conn_kwargs)
+                    self._pid = os.getpid()
+                    self._last_used = {}
+        return self._pool
+
+    def _checkout_healthy(self):
+        pool = self._get_pool()
+        for _ in range(self.maxconn + 1):
+            conn = pool.getconn()
+            if conn.closed:
+                self._discard(pool, conn)
+                continue
+            last_used = self._last_used.get(id(conn))
+            if last_used is None or time.monotonic() - last_used > self.healthcheck_after:
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1;")
+                    if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                except psycopg2.Error:
+                    self._discard(pool, conn)
+                    continue
+            conn.autocommit = True
+            return conn
+        raise psycopg2.OperationalError("No se pudo obtener una conexión sana del pool.")
+
+    def _discard(self, pool, conn):
+        self._last_used.pop(id(conn), None)
+        with self._lock:
+            self._stats["discarded"] += 1
+        try:
+            pool.putconn(conn, close=True)
+        except Exception:
+            pass
+
+    def acquire(self, user_id: Optional[int] = None) -> PooledConnection:
+        started = time.monotonic()
+        got_slot = self._slots.acquire(timeout=self.timeout)
+        wait_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self._stats["wait_ms_total"] += wait_ms
+            self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], wait_ms)
+            if wait_ms >= 1:
+                self._stats["waited"] += 1
+            if not got_slot:
+                self._stats["timeouts"] += 1
+        if not got_slot:
+            raise PoolTimeout(f"Pool de Postgres saturado ({self.maxconn} conexiones en uso).")
+
+        try:
+            conn = self._checkout_healthy()
+        except Exception:
+            self._slots.release()
+            raise
+
+        rls_applied = False
+        if user_id is not None:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT set_config('app.current_user_id', %s, false);", (str(user_id),))
+                rls_applied = True
+            except Exception:
+                self._discard(self._get_pool(), conn)
+                self._slots.release()
+                raise
+
+        with self._lock:
+            self._stats["acquired"] += 1
+            self._stats["in_use"] += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._stats["in_use"])
+        return PooledConnection(self, conn, rls_applied)
+
+    def release(self, conn, reset_rls: bool = False) -> None:
+        pool = self._get_pool()
+        try:
+            discard = bool(conn.closed)
+            if not discard:
+                try:
+                    if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    if not conn.autocommit:
+                        conn.autocommit = True
+                    if reset_rls:
+                        with conn.cursor() as cur:
+                            cur.execute("RESET app.current_user_id;")
+                except psycopg2.Error:
+                    discard = True
+            if discard:
+                self._discard(pool, conn)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                pool.putconn(conn)
+        finally:
+            with self._lock:
+                self._stats["in_use"] = max(0, self._stats["in_use"] - 1)
+            self._slots.release()
+
+    def stats(self) -> dict:
+        """Contadores de espera y saturación del pool."""
+        with self._lock:
+            snapshot = dict(self._stats)
+        acquired = snapshot["acquired"] or 1
+        snapshot["max_size"] = self.maxconn
+        snapshot["saturation"] = round(snapshot["in_use"] / self.maxconn, 3)
+        snapshot["wait_ms_avg"] = round(snapshot["wait_ms_total"] / acquired, 3)
+        snapshot["wait_ms_total"] = round(snapshot["wait_ms_total"], 3)
+        snapshot["wait_ms_max"] = round(snapshot["wait_ms_max"], 3)
+        return snapshot
+
+    def closeall(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+            self._pool = None
+            self._last_used = {}
@@ -2,6 +2,7 @@ import os
 import datetime
 from imap_tools import MailBox, AND
 import google.generativeai as genai
+import llm_client
 import json
 from db_ops import execute_insert, execute_query, ensure_account, insert_transactions
 import tempfile
@@ -37,14 +38,12 @@ def _extract_data_with_gemini(text_content, file_path=None):
     Si no hay datos financieros, devuelve [].
     """
     
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    
     try:
         if file_path:
             file_upload = genai.upload_file(file_path)
-            response = model.generate_content([prompt, file_upload])
+            response = llm_client.generate_sync("gemini-2.5-flash", [prompt, file_upload])
         else:
-            response = model.generate_content([prompt, text_content])
+            response = llm_client.generate_sync("gemini-2.5-flash", [prompt, text_content])
             
         json_text = response.text.replace("```json", "").replace("```", "").strip()
         return json.loads(json_text)
@@ -92,54 +91,36 @@ def check_emails():
                 # 3. Insertar en DB
                 if transactions:
                     print(f"   💰 Encontradas {len(transactions)} transacciones.")
+                    by_account = {}
                     for tx in transactions:
                         # Asegurar cuenta
                         acc_name = tx.get("account_hint", "Email Import")
-                        # OJO: ensure_account en db_ops no soporta user_id aun, pero insert_transactions sí debería.
-                        # Necesitamos arreglar ensure_account para que use el contexto RLS o pasarle user_id si modificamos db_ops.
-                        # Por simplicidad y tiempo, asumimos que ensure_account crea cuentas globales o para el admin (user_id=1 default en DB).
-                        # Pero con RLS activado, ensure_account fallará si no inyectamos user_id en la conexión?
-                        # get_conn() sin args usa user_id=None -> app.current_user_id null -> RLS block (si no es owner).
-                        # PERO este script corre como proceso background, usa get_conn() -> conecta como afi_user (Owner).
-                        # Al ser Owner, RLS se aplica SOLO si usamos FORCE RLS. Y LO USAMOS.
-                        # Entonces necesitamos pasar user_id a las funciones de db_ops.
-                        
-                        # Fix temporal: inyectar manualmente transacciones usando execute_insert con user_id
-                        
-                        # 1. Resolver Account ID (manual query con RLS context)
-                        # ensure_account en db_ops no recibe user_id. 
-                        # Vamos a usar execute_query para buscarla.
-                        
-                        existing_acc = execute_query(
-                            "SELECT account_id FROM accounts WHERE account_name = %s", 
-                            (acc_name,),
-                            fetch_one=True, 
-                            user_id=user_id
-                        )
-                        
-                        if existing_acc:
-                            acc_id = existing_acc[0]
-                        else:
-                            # Crear cuenta
-                            execute_insert(
-                                "INSERT INTO accounts (account_name, account_type_id, currency_code, user_id) VALUES (%s, 1, 'COP', %s)",
-                                (acc_name, user_id),
+                        # Con FORCE RLS hay que resolver la cuenta con el contexto del usuario (user_id),
+                        # por eso no se usa ensure_account (conexión sin app.current_user_id).
+                        if acc_name not in by_account:
+                            existing_acc = execute_query(
+                                "SELECT account_id FROM accounts WHERE account_name = %s", 
+                                (acc_name,),
+                                fetch_one=True, 
                                 user_id=user_id
                             )
-                            acc_id_row = execute_query("SELECT account_id FROM accounts WHERE account_name = %s", (acc_name,), fetch_one=True, user_id=user_id)
-                            acc_id = acc_id_row[0] if acc_id_row else None
-                        
+                            if not existing_acc:
+                                execute_insert(
+                                    "INSERT INTO accounts (account_name, account_type_id, currency_code, user_id) VALUES (%s, 1, 'COP', %s)",
+                                    (acc_name, user_id),
+                                    user_id=user_id
+                                )
+                                existing_acc = execute_query("SELECT account_id FROM accounts WHERE account_name = %s", (acc_name,), fetch_one=True, user_id=user_id)
+                            by_account[acc_name] = (existing_acc[0] if existing_acc else None, [])
+                        # UID del correo en la huella: reprocesar el buzón no duplica movimientos
+                        by_account[acc_name][1].append({**tx, "source_ref": f"imap:{msg.uid}"})
+
+                    saved = 0
+                    for acc_id, account_txs in by_account.values():
                         if acc_id:
-                            execute_insert(
-                                """
-                                INSERT INTO transactions (account_id, date, amount, description, category, user_id, import_source)
-                                VALUES (%s, %s, %s, %s, %s, %s, 'email_agent')
-                                """,
-                                (acc_id, tx.get('date'), tx.get('amount'), tx.get('payee'), tx.get('category'), user_id),
-                                user_id=user_id
-                            )
+                            saved += insert_transactions(acc_id, account_txs, import_source="email_agent", user_id=user_id)
                     
-                    print("   ✅ Transacciones guardadas.")
+                    print(f"   ✅ {saved} transacciones guardadas (duplicadas ignoradas).")
                 else:
                     print("   ⚠️ No se detectaron datos financieros.")
 
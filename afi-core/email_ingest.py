@@ -1,6 +1,6 @@
 import os
 from imap_tools import MailBox, AND
-import google.generativeai as genai
+import llm_client
 
 IMAP_SERVER = os.getenv("IMAP_SERVER", "imap.gmail.com")
 EMAIL_USER = os.getenv("EMAIL_USER")
@@ -24,8 +24,7 @@ Si no es transacción, devuelve {{ "is_transaction": false }}.
 Cuerpo: {msg.text or msg.html}
 """
                 try:
-                    model = genai.GenerativeModel("gemini-2.5-flash")
-                    _ = model.generate_content(prompt)
+                    _ = llm_client.generate_sync("gemini-2.5-flash", prompt)
                 except Exception as e:
                     print(f"⚠️ Error llamando a Gemini: {e}")
                 # Marcar como leído podría hacerse aquí
@@ -0,0 +1,182 @@
+"""
+Caché de embeddings compartida por todos los retrievers (RAG de main, text_to_ui_agent,
+verify_rag).
+
+    memoria (LRU por proceso) -> Postgres (embedding_cache, migrations/0010) -> API de Gemini
+
+La clave es modelo + task_type + texto normalizado (minúsculas, espacios colapsados), así
+que "hola", "Hola " y las preguntas repetidas no vuelven a salir a la red. Si la DB falla
+la caché se degrada a solo memoria; nunca bloquea la respuesta.
+
+    python embedding_cache.py prune 90     # borra entradas con más de 90 días
+"""
+import asyncio
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import llm_client
+from database import get_conn
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/text-embedding-004")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+# 0 = solo LRU en memoria (sin tabla)
+EMBEDDING_CACHE_PERSIST = os.getenv("EMBEDDING_CACHE_PERSIST", "1") == "1"
+
+_memory: "OrderedDict[str, List[float]]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"memory_hits": 0, "db_hits": 0, "api_calls": 0, "api_errors": 0, "db_errors": 0}
+
+
+def normalize_text(text: str) -> str:
+    return " ".join((text or "").split()).lower()
+
+
+def cache_key(text: str, task_type: str, model: str = EMBEDDING_MODEL) -> str:
+    return hashlib.sha256(f"{model}|{task_type}|{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def _remember(key: str, embedding: List[float]) -> None:
+    with _lock:
+        _memory[key] = embedding
+        _memory.move_to_end(key)
+        while len(_memory) > EMBEDDING_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def _load(key: str) -> Optional[List[float]]:
+    try:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT embedding FROM embedding_cache WHERE cache_key = %s;", (key,))
+                row = cur.fetchone()
+        return list(row[0]) if row else None
+    except Exception as e:
+        with _lock:
+            _stats["db_errors"] += 1
+        print(f"⚠️ Embedding cache (lectura): {e}")
+        return None
+
+
+def _save(key: str, model: str, task_type: str, embedding: List[float]) -> None:
+    try:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO embedding_cache (cache_key, model, task_type, embedding)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (cache_key) DO NOTHING;
+                    """,
+                    (key, model, task_type, [float(x) for x in embedding]),
+                )
+    except Exception as e:
+        with _lock:
+            _stats["db_errors"] += 1
+        print(f"⚠️ Embedding cache (escritura): {e}")
+
+
+def _memory_hit(key: str) -> Optional[List[float]]:
+    with _lock:
+        cached = _memory.get(key)
+        if cached is not None:
+            _memory.move_to_end(key)
+            _stats["memory_hits"] += 1
+        return cached
+
+
+def _db_hit(key: str) -> Optional[List[float]]:
+    cached = _load(key)
+    if cached is not None:
+        with _lock:
+            _stats["db_hits"] += 1
+        _remember(key, cached)
+    return cached
+
+
+def _api_result(key: str, model: str, task_type: str, resp=None, error: Optional[Exception] = None) -> Optional[List[float]]:
+    if error is not None:
+        with _lock:
+            _stats["api_errors"] += 1
+        print(f"⚠️ Embedding API: {error}")
+        return None
+    embedding = list(resp["embedding"])
+    with _lock:
+        _stats["api_calls"] += 1
+    _remember(key, embedding)
+    if EMBEDDING_CACHE_PERSIST:
+        _save(key, model, task_type, embedding)
+    return embedding
+
+
+def embed_text(text: str, task_type: str = "retrieval_query", model: str = EMBEDDING_MODEL) -> Optional[List[float]]:
+    """Embedding de `text` (o None si la API falla). Reemplaza a genai.embed_content en los retrievers."""
+    if not normalize_text(text):
+        return None
+    key = cache_key(text, task_type, model)
+    cached = _memory_hit(key)
+    if cached is None and EMBEDDING_CACHE_PERSIST:
+        cached = _db_hit(key)
+    if cached is not None:
+        return cached
+
+    try:
+        resp = llm_client.embed_sync(" ".join(text.split()), model=model, task_type=task_type,
+                                    priority=llm_client.INTERACTIVE)
+    except Exception as e:
+        return _api_result(key, model, task_type, error=e)
+    return _api_result(key, model, task_type, resp)
+
+
+async def embed_text_async(text: str, task_type: str = "retrieval_query", model: str = EMBEDDING_MODEL) -> Optional[List[float]]:
+    """Igual que embed_text para el event loop: la API va por llm_client.embed y la DB por un hilo corto."""
+    if not normalize_text(text):
+        return None
+    key = cache_key(text, task_type, model)
+    cached = _memory_hit(key)
+    if cached is None and EMBEDDING_CACHE_PERSIST:
+        cached = await asyncio.to_thread(_db_hit, key)
+    if cached is not None:
+        return cached
+
+    try:
+        resp = await llm_client.embed(" ".join(text.split()), model=model, task_type=task_type)
+    except Exception as e:
+        return _api_result(key, model, task_type, error=e)
+    if EMBEDDING_CACHE_PERSIST:
+        return await asyncio.to_thread(_api_result, key, model, task_type, resp)
+    return _api_result(key, model, task_type, resp)
+
+
+def clear_memory() -> None:
+    with _lock:
+        _memory.clear()
+
+
+def prune(older_than_days: int) -> int:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM embedding_cache WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => %s);",
+                (older_than_days,),
+            )
+            return cur.rowcount
+
+
+def embedding_cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats, memory_size=len(_memory))
+    hits = stats["memory_hits"] + stats["db_hits"]
+    lookups = hits + stats["api_calls"] + stats["api_errors"]
+    stats["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+    return stats
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "prune":
+        print(f"🧹 Embeddings eliminados: {prune(int(sys.argv[2]))}")
+    else:
+        print(__doc__)
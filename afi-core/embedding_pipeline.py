@@ -0,0 +1,118 @@
+"""
+Pipeline de embeddings para la ingesta de libros (rag_ingest.py, ingest_books.py).
+
+- Lotes: una petición a la API embebe hasta EMBED_BATCH_SIZE fragmentos.
+- Concurrencia acotada: EMBED_WORKERS hilos; el ritmo (RPM del modelo de embeddings) y el
+  backoff ante 429 los pone quota_scheduler, con prioridad BATCH frente al chat en vivo.
+- Checkpoint por fragmento: cada fila guarda el sha256 de su texto y el modelo
+  (migrations/0011 y 0012). Al reanudar solo se embeben los pares (hash, modelo) que
+  faltan; cada lote se confirma al terminar.
+- Progreso: fragmentos hechos/pendientes y throughput (fragmentos/s).
+"""
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Sequence
+
+from psycopg2.extras import Json, execute_values
+
+import llm_client
+from database import get_conn
+from embedding_cache import EMBEDDING_MODEL
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))  # tope de la API por petición
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def embed_batch(texts: Sequence[str], task_type: str = "retrieval_document",
+                model: str = EMBEDDING_MODEL) -> List[List[float]]:
+    """Embebe una lista de textos en una sola petición (prioridad BATCH; los 429 los reintenta llm_client)."""
+    result = llm_client.embed_sync(list(texts), model=model, task_type=task_type, priority=llm_client.BATCH)
+    embeddings = result["embedding"]
+    if len(embeddings) != len(texts):
+        raise ValueError(f"La API devolvió {len(embeddings)} embeddings para {len(texts)} textos")
+    return embeddings
+
+
+def stored_hashes(source: str, model: str = EMBEDDING_MODEL) -> set:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT chunk_hash FROM financial_wisdom WHERE source = %s AND embedding_model = %s;",
+                (source, model),
+            )
+            return {row[0] for row in cur.fetchall()}
+
+
+def _store_batch(source: str, batch: List[tuple], embeddings: List[List[float]], metadata: Optional[dict],
+                 model: str = EMBEDDING_MODEL) -> int:
+    rows = [
+        (content, source, Json(metadata) if metadata else None, "[" + ",".join(f"{float(x):.6f}" for x in vec) + "]",
+         digest, index, model)
+        for (index, digest, content), vec in zip(batch, embeddings)
+    ]
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            result = execute_values(
+                cur,
+                """
+                INSERT INTO financial_wisdom (content, source, metadata, embedding, chunk_hash, chunk_index, embedding_model)
+                VALUES %s
+                ON CONFLICT (source, chunk_hash, embedding_model) DO NOTHING
+                RETURNING 1
+                """,
+                rows,
+                template="(%s, %s, %s, %s::vector, %s, %s, %s)",
+                fetch=True,
+            )
+    return len(result)
+
+
+def embed_and_store(source: str, chunks: Sequence[str], metadata: Optional[dict] = None,
+                    batch_size: int = EMBED_BATCH_SIZE, workers: int = EMBED_WORKERS,
+                    model: str = EMBEDDING_MODEL) -> dict:
+    """
+    Embebe y guarda los fragmentos de `source` que aún no están en financial_wisdom para
+    `model`. Un fallo en un lote no descarta los demás: lo ya guardado queda como checkpoint.
+    """
+    done = stored_hashes(source, model)
+    pending, seen = [], set(done)
+    for index, content in enumerate(chunks):
+        digest = chunk_hash(content)
+        if digest in seen:
+            continue
+        seen.add(digest)
+        pending.append((index, digest, content))
+
+    stats = {"source": source, "chunks": len(chunks), "skipped": len(chunks) - len(pending),
+             "stored": 0, "failed": 0, "seconds": 0.0}
+    if not pending:
+        print(f"   ⏭️  '{source}': {len(chunks)} fragmentos ya embebidos.")
+        return stats
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    print(f"   🧩 '{source}': {len(pending)} fragmentos pendientes ({stats['skipped']} ya guardados), {len(batches)} lotes")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(embed_batch, [content for _, _, content in batch], model=model): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                stats["stored"] += _store_batch(source, batch, future.result(), metadata, model)
+            except Exception as e:
+                stats["failed"] += len(batch)
+                print(f"   ❌ Lote de {len(batch)} fragmentos falló: {e}")
+            elapsed = time.perf_counter() - start
+            processed = stats["stored"] + stats["failed"]
+            print(f"   💾 {processed}/{len(pending)} fragmentos | {processed / elapsed:.1f} frag/s", end="\r")
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    print(f"\n   ✅ '{source}': {stats['stored']} guardados, {stats['failed']} fallidos en {stats['seconds']}s")
+    return stats
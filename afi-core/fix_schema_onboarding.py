@@ -1,12 +1,13 @@
 from database import get_conn
+from migrate import apply_migrations
 
 def apply_fix():
     print("🚑 Fixing Database Schema (Adding missing columns)...")
     try:
         with get_conn() as conn:
             with conn.cursor() as cur:
-                cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS onboarding_status VARCHAR(50) DEFAULT 'welcome';")
-                cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS archetype VARCHAR(50);")
+                # Columnas incluidas en migrations/0001_base_schema.sql
+                apply_migrations(cur)
                 print("✅ Added 'onboarding_status' and 'archetype' columns to 'users' table.")
     except Exception as e:
         print(f"❌ Error fixing schema: {e}")
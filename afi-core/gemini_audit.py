@@ -9,6 +9,7 @@ import datetime
 from typing import Dict, Any
 from imap_tools import MailBox, AND
 import google.generativeai as genai
+import llm_client
 
 # Configuración
 IMAP_SERVER = os.getenv("IMAP_SERVER", "imap.gmail.com")
@@ -82,8 +83,7 @@ Responde SOLO con el JSON, sin explicaciones adicionales.
 """
 
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
-        response = model.generate_content(prompt)
+        response = llm_client.generate_sync(MODEL_NAME, prompt)
         raw = response.text.strip()
 
         # Extraer JSON de la respuesta
@@ -0,0 +1,191 @@
+"""
+Camino rápido para las preguntas rutinarias: "¿cuánto gasté hoy / este mes?", "saldo",
+"gastos por categoría", "gráfico del mes".
+
+Se reconocen con patrones sobre el texto normalizado (sin tildes ni signos) que deben
+cubrir el mensaje completo: "¿cuánto gasté este mes en restaurantes?" no coincide y sigue
+al LLM. Cada intención tiene una consulta fija y parametrizada (monthly_rollups o la
+partición del día de `transactions`, siempre filtrada por user_id) y una respuesta con
+plantilla. Sin Gemini: responde en milisegundos y no gasta cuota. Sin usuario identificado
+no hay camino rápido: el pool conecta como afi_user (salta el RLS) y los totales serían de
+todos los usuarios; esas preguntas siguen al agente SQL y su sandbox afi_readonly.
+
+- main.ai_router (WhatsApp): `answer_text`; el gráfico reutiliza generate_spending_chart_tool.
+- text_to_ui_agent.process_query (/chat/query): `answer_ui` devuelve el mismo bloque
+  (answer, viz_type, data, columns) que el agente SQL.
+
+INTENT_FAST_PATH=0 lo desactiva. Aciertos por intención y latencia en intent_stats() (/metrics).
+"""
+import datetime
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+from answer_cache import normalize_question
+from database import get_conn
+from rollups import category_spend, month_totals, net_balance
+
+INTENT_FAST_PATH = os.getenv("INTENT_FAST_PATH", "1") == "1"
+
+# Muletillas que no cambian la intención ("hola afi dime ... por favor")
+_PREFIX = r"^(?:(?:hola|oye|afi|y|dime|dame|muestrame|mostrame|ensename|quiero ver|me das|me muestras)\s+)*"
+_SUFFIX = r"(?:\s+(?:por favor|porfa|afi))*$"
+_PERIOD = r"(?:\s+(?P<period>(?:de |en )?(?:este|el|del) mes(?: pasado| anterior)?|(?:de |en )?el mes(?: pasado| anterior)?))?"
+
+_PATTERNS = [
+    ("spend_day", r"(?:cuanto|que) (?:he )?gaste (?P<day>hoy|ayer)|(?:mis )?gastos de (?P<day2>hoy|ayer)"),
+    ("spend_month", r"(?:cuanto|que) (?:he )?gaste" + _PERIOD + r"|(?:mis )?gastos (?:del|de este) mes(?P<last> pasado| anterior)?"),
+    ("balance", r"(?:cual es |como esta |como va )?(?:mi |el )?(?:saldo|balance)(?: total| actual| neto)?|cuanto (?:dinero )?tengo"),
+    ("spend_by_category", r"(?:mis )?gastos por categoria" + _PERIOD),
+    ("spending_chart", r"(?:un |el )?(?:grafico|grafica)(?: de (?:mis )?gastos)?" + _PERIOD),
+]
+_COMPILED = [(name, re.compile(_PREFIX + f"(?:{pattern})" + _SUFFIX)) for name, pattern in _PATTERNS]
+
+_DAY_SPEND_SQL = """
+    SELECT COALESCE(SUM(amount), 0), COUNT(*)
+    FROM transactions
+    WHERE date = %(day)s AND amount < 0 AND user_id = %(user_id)s;
+"""
+
+_lock = threading.Lock()
+_stats = {"hits": {name: 0 for name, _ in _PATTERNS}, "misses": 0, "errors": 0, "ms_total": 0.0}
+
+
+def match(text: str) -> Optional[dict]:
+    """{"intent", "period" | "day"} si el mensaje completo es una pregunta rutinaria; si no, None."""
+    if not INTENT_FAST_PATH:
+        return None
+    normalized = normalize_question(text)
+    for name, pattern in _COMPILED:
+        found = pattern.match(normalized)
+        if not found:
+            continue
+        groups = found.groupdict()
+        period = groups.get("period") or ""
+        last = "pasado" in period or "anterior" in period or bool(groups.get("last"))
+        intent = {"intent": name, "period": "last_month" if last else "current_month"}
+        if name == "spend_day":
+            intent["day"] = groups.get("day") or groups.get("day2")
+        return intent
+    with _lock:
+        _stats["misses"] += 1
+    return None
+
+
+def _money(value: float) -> str:
+    return f"${value:,.0f}"
+
+
+def _day_spend(user_id: int, day: datetime.date) -> tuple:
+    # date = día exacto: el planner solo toca la partición de ese mes
+    with get_conn(user_id=user_id) as conn:
+        with conn.cursor() as cur:
+            cur.execute(_DAY_SPEND_SQL, {"day": day, "user_id": user_id})
+            total, count = cur.fetchone()
+    return abs(float(total)), int(count)
+
+
+def _month_of(period: str) -> datetime.date:
+    month = datetime.date.today().replace(day=1)
+    if period == "last_month":
+        month = (month - datetime.timedelta(days=1)).replace(day=1)
+    return month
+
+
+def _period_label(period: str) -> str:
+    return "el mes pasado" if period == "last_month" else "este mes"
+
+
+def _resolve(intent: dict, user_id: int) -> dict:
+    """Datos + texto de la intención; comparte consultas entre WhatsApp y el dashboard."""
+    name, period = intent["intent"], intent["period"]
+    if name == "spend_day":
+        offset = 1 if intent["day"] == "ayer" else 0
+        spent, count = _day_spend(user_id, datetime.date.today() - datetime.timedelta(days=offset))
+        label = intent["day"]
+        if not count:
+            text = f"No tienes gastos registrados {label}. 🙌"
+        else:
+            text = f"💸 {label.capitalize()} llevas {_money(spent)} en gastos ({count} movimientos)."
+        return {"text": text, "viz_type": "metric", "title": f"Gastos de {label}",
+                "data": [{"gasto": spent, "movimientos": count}], "columns": ["gasto", "movimientos"]}
+
+    if name == "spend_month":
+        totals = month_totals(user_id, _month_of(period))
+        text = (f"💸 Gastos de {_period_label(period)}: {_money(totals['spend'])}\n"
+                f"💰 Ingresos: {_money(totals['income'])}\n"
+                f"📊 Neto: {_money(totals['income'] - totals['spend'])}")
+        return {"text": text, "viz_type": "metric", "title": f"Gastos de {_period_label(period)}",
+                "data": [{"gasto": totals["spend"], "ingreso": totals["income"]}], "columns": ["gasto", "ingreso"]}
+
+    if name == "balance":
+        balance = net_balance(user_id)
+        return {"text": f"🏦 Tu saldo neto (todos los movimientos registrados) es {_money(balance)}.",
+                "viz_type": "metric", "title": "Saldo neto", "data": [{"saldo": balance}], "columns": ["saldo"]}
+
+    # spend_by_category / spending_chart: rollup del mes por categoría, de mayor a menor gasto
+    by_category = sorted(((cat, abs(total)) for cat, total in category_spend(user_id, period).items()),
+                         key=lambda item: -item[1])
+    if not by_category:
+        text = f"No tienes gastos registrados {_period_label(period)}."
+    else:
+        lines = "\n".join(f"• {cat}: {_money(total)}" for cat, total in by_category[:10])
+        text = f"📊 Gastos por categoría ({_period_label(period)}):\n{lines}"
+    return {"text": text, "viz_type": "bar_chart", "title": f"Gastos por categoría ({_period_label(period)})",
+            "data": [{"categoria": cat, "gasto": total} for cat, total in by_category],
+            "columns": ["categoria", "gasto"]}
+
+
+def _timed(intent: dict, build) -> Optional[object]:
+    start = time.perf_counter()
+    try:
+        result = build()
+    except Exception as e:
+        # Sin datos del camino rápido la pregunta sigue al LLM
+        print(f"⚠️ Camino rápido '{intent['intent']}' falló: {e}")
+        with _lock:
+            _stats["errors"] += 1
+        return None
+    with _lock:
+        _stats["hits"][intent["intent"]] += 1
+        _stats["ms_total"] += (time.perf_counter() - start) * 1000
+    return result
+
+
+def answer_text(intent: dict, user_id: Optional[int]) -> Optional[str]:
+    """Respuesta para WhatsApp ("[MEDIA]ruta" en el caso del gráfico); None -> seguir al LLM."""
+    if user_id is None:
+        return None
+    if intent["intent"] == "spending_chart":
+        # tools arrastra matplotlib: /chat/query (que no dibuja PNG) no lo necesita
+        from tools import generate_spending_chart_tool
+        return _timed(intent, lambda: generate_spending_chart_tool(period=intent["period"], user_id=user_id))
+    return _timed(intent, lambda: _resolve(intent, user_id)["text"])
+
+
+def answer_ui(intent: dict, user_id: Optional[int]) -> Optional[dict]:
+    """Bloque de /chat/query (mismo formato que el agente SQL); None -> seguir al LLM."""
+    if user_id is None:
+        return None
+    result = _timed(intent, lambda: _resolve(intent, user_id))
+    if result is None:
+        return None
+    return {
+        "answer": result["text"],
+        "viz_type": result["viz_type"],
+        "title": result["title"],
+        "data": result["data"],
+        "columns": result["columns"],
+        "intent": intent["intent"],
+    }
+
+
+def intent_stats() -> dict:
+    with _lock:
+        stats = {"hits": dict(_stats["hits"]), "misses": _stats["misses"], "errors": _stats["errors"]}
+        hits = sum(stats["hits"].values())
+        stats["ms_avg"] = round(_stats["ms_total"] / hits, 2) if hits else 0.0
+    stats["enabled"] = INTENT_FAST_PATH
+    return stats
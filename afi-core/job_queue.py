@@ -0,0 +1,418 @@
+"""
+Cola de trabajos durable sobre Postgres (tabla `jobs`, migrations/0015).
+
+Saca el trabajo pesado del request: el handler encola y responde al toque; un pool de
+workers en el event loop de main lo ejecuta después.
+
+- Encolar: `enqueue(kind, payload, dedupe_key=...)`. Con dedupe_key, el mismo trabajo no se
+  duplica mientras está en cola o corriendo (devuelve el id del que ya existe); con once_key
+  (migrations/0016) tampoco si ya terminó: una sola vez por clave (el briefing del día).
+- Tomar: `claim` usa FOR UPDATE SKIP LOCKED, así varios workers (o varios procesos de
+  uvicorn) nunca toman el mismo trabajo ni se bloquean entre sí.
+- Lease: el worker renueva locked_until cada JOB_HEARTBEAT_SECONDS (y de paso guarda el
+  progreso). Si el proceso muere o hay un deploy, el lease vence y otro worker lo retoma;
+  complete/fail solo escriben si el worker sigue dueño del lease (si no, LeaseLost).
+  Al apagarse ordenadamente, los trabajos en curso vuelven a la cola sin gastar intento.
+- Reintentos: un error reprograma con backoff exponencial (JOB_RETRY_BASE_SECONDS * 2^n)
+  hasta max_attempts; JobFailed marca 'failed' sin reintentar. Los handlers deben ser
+  idempotentes: un reintento vuelve a correr el trabajo completo.
+- Concurrencia: JOB_WORKERS trabajos a la vez por proceso y un tope por tipo (register(...,
+  concurrency=) o JOB_CONCURRENCY="tipo=n,...").
+
+Los handlers se registran con `register(kind, fn, label=...)`: reciben (payload, job) y
+pueden ser sync (corren en un hilo) o async. `job.progress(fracción, nota)` reporta avance.
+Estado para el agente ("¿ya terminó?") en `status_report`; métricas en job_stats() (/metrics).
+"""
+import asyncio
+import inspect
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from psycopg2.extras import Json
+
+from database import get_conn
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "30"))
+
+STATUS_LABELS = {"queued": "⏳ en cola", "running": "⚙️ en proceso", "done": "✅ terminado", "failed": "❌ falló"}
+
+
+class JobFailed(Exception):
+    """Error definitivo: el trabajo se marca 'failed' sin reintentar."""
+
+
+class LeaseLost(Exception):
+    """El worker perdió el lease (otro lo retomó): su resultado no se guarda."""
+
+
+def _parse_concurrency(raw: str) -> Dict[str, int]:
+    limits = {}
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        name, _, value = item.partition("=")
+        limits[name.strip()] = int(value)
+    return limits
+
+
+_concurrency_env = _parse_concurrency(os.getenv("JOB_CONCURRENCY", ""))
+_handlers: Dict[str, dict] = {}
+_running: Dict[str, int] = {}
+_lock = threading.Lock()
+_stats = {"processed": 0, "failed": 0, "retried": 0, "released": 0, "lease_lost": 0, "ms_total": 0.0}
+_worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def register(kind: str, handler: Callable, label: Optional[str] = None, concurrency: int = 1,
+             timeout: Optional[float] = None) -> None:
+    """Registra el handler de `kind`; `timeout` solo aplica a handlers async."""
+    _handlers[kind] = {
+        "handler": handler,
+        "label": label or kind,
+        "concurrency": _concurrency_env.get(kind, concurrency),
+        "timeout": timeout,
+        "is_async": inspect.iscoroutinefunction(handler),
+    }
+
+
+class Job:
+    def __init__(self, row: tuple):
+        self.id, self.kind, self.payload, self.attempts, self.max_attempts, self.phone, self.user_id = row
+        self.payload = self.payload or {}
+        self.locked_by: Optional[str] = None
+        self._progress = None
+
+    def progress(self, fraction: float, note: Optional[str] = None) -> None:
+        """Avance 0..1; lo persiste el heartbeat (no hace I/O, se puede llamar desde cualquier hilo)."""
+        self._progress = (max(0.0, min(1.0, float(fraction))), note)
+
+
+def enqueue(kind: str, payload: Optional[dict] = None, user_id: Optional[int] = None, phone: Optional[str] = None,
+            dedupe_key: Optional[str] = None, max_attempts: int = JOB_MAX_ATTEMPTS, delay: float = 0,
+            once_key: Optional[str] = None) -> int:
+    """
+    Encola un trabajo y devuelve su id. Con dedupe_key devuelve el trabajo en curso si ya
+    existe; con once_key, el que ya existe aunque haya terminado (una vez por clave).
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            # Sin conflict target: cubre idx_jobs_dedupe (en curso) e idx_jobs_once (también 'done')
+            cur.execute(
+                """
+                INSERT INTO jobs (kind, payload, user_id, phone, dedupe_key, once_key, max_attempts, run_after)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+                ON CONFLICT DO NOTHING
+                RETURNING id;
+                """,
+                (kind, Json(payload or {}), user_id, phone, dedupe_key, once_key, max_attempts, delay),
+            )
+            row = cur.fetchone()
+            if row:
+                return row[0]
+            cur.execute(
+                """
+                SELECT id FROM jobs
+                WHERE kind = %(kind)s
+                  AND ((dedupe_key = %(dedupe)s AND status IN ('queued', 'running'))
+                       OR (once_key = %(once)s AND status <> 'failed'))
+                ORDER BY id DESC LIMIT 1;
+                """,
+                {"kind": kind, "dedupe": dedupe_key, "once": once_key},
+            )
+            row = cur.fetchone()
+    if not row:
+        # Terminó (o falló) entre el INSERT y el SELECT: se encola de nuevo
+        return enqueue(kind, payload, user_id, phone, dedupe_key, max_attempts, delay, once_key)
+    print(f"♻️ Trabajo {kind} ({dedupe_key or once_key}) ya existía: #{row[0]}")
+    return row[0]
+
+
+def claim(kinds: List[str], worker_id: str) -> Optional[Job]:
+    """Toma el siguiente trabajo listo (o con lease vencido) de `kinds`; None si no hay."""
+    if not kinds:
+        return None
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE jobs SET
+                    status = 'running', attempts = attempts + 1, locked_by = %(worker)s,
+                    locked_until = CURRENT_TIMESTAMP + make_interval(secs => %(lease)s),
+                    started_at = COALESCE(started_at, CURRENT_TIMESTAMP), updated_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE kind = ANY(%(kinds)s)
+                      AND ((status = 'queued' AND run_after <= CURRENT_TIMESTAMP)
+                           OR (status = 'running' AND locked_until < CURRENT_TIMESTAMP))
+                    ORDER BY run_after, id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id, kind, payload, attempts, max_attempts, phone, user_id;
+                """,
+                {"worker": worker_id, "lease": JOB_LEASE_SECONDS, "kinds": list(kinds)},
+            )
+            row = cur.fetchone()
+    if not row:
+        return None
+    job = Job(row)
+    job.locked_by = worker_id
+    return job
+
+
+def heartbeat(job: Job, worker_id: str) -> None:
+    """Renueva el lease y guarda el último progreso reportado."""
+    fraction, note = job._progress or (None, None)
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE jobs SET
+                    locked_until = CURRENT_TIMESTAMP + make_interval(secs => %s),
+                    progress = COALESCE(%s, progress), progress_note = COALESCE(%s, progress_note),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND locked_by = %s AND status = 'running';
+                """,
+                (JOB_LEASE_SECONDS, fraction, note, job.id, worker_id),
+            )
+
+
+def _check_owner(job: Job, rowcount: int) -> None:
+    if not rowcount:
+        raise LeaseLost(f"el trabajo #{job.id} ya no es de {job.locked_by}")
+
+
+def complete(job: Job, result=None) -> None:
+    """Marca 'done' solo si el worker sigue dueño del lease; si no, LeaseLost."""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE jobs SET status = 'done', progress = 1, result = %s, error = NULL,
+                    locked_by = NULL, locked_until = NULL,
+                    finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND locked_by = %s AND status = 'running';
+                """,
+                (Json(result) if result is not None else None, job.id, job.locked_by),
+            )
+            _check_owner(job, cur.rowcount)
+
+
+def fail(job: Job, error: str, retry: bool = True) -> bool:
+    """Reprograma con backoff o marca 'failed'. Devuelve True si se reintentará (LeaseLost si ya no es suyo)."""
+    retry = retry and job.attempts < job.max_attempts
+    delay = JOB_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE jobs SET
+                    status = CASE WHEN %(retry)s THEN 'queued' ELSE 'failed' END,
+                    run_after = CURRENT_TIMESTAMP + make_interval(secs => %(delay)s),
+                    finished_at = CASE WHEN %(retry)s THEN NULL ELSE CURRENT_TIMESTAMP END,
+                    error = %(error)s, locked_by = NULL, locked_until = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %(id)s AND locked_by = %(worker)s AND status = 'running';
+                """,
+                {"retry": retry, "delay": delay, "error": error[:2000], "id": job.id, "worker": job.locked_by},
+            )
+            _check_owner(job, cur.rowcount)
+    return retry
+
+
+def release(job: Job) -> None:
+    """Apagado ordenado: el trabajo vuelve a la cola sin consumir el intento."""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE jobs SET status = 'queued', attempts = GREATEST(attempts - 1, 0),
+                    locked_by = NULL, locked_until = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND locked_by = %s AND status = 'running';
+                """,
+                (job.id, job.locked_by),
+            )
+
+
+def purge(days: int = JOB_RETENTION_DAYS) -> int:
+    """Borra trabajos terminados hace más de `days` días."""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < CURRENT_TIMESTAMP - make_interval(days => %s);",
+                (days,),
+            )
+            return cur.rowcount
+
+
+# --- Pool de workers (event loop de main) ---
+
+def _available_kinds() -> List[str]:
+    with _lock:
+        return [kind for kind, spec in _handlers.items() if _running.get(kind, 0) < spec["concurrency"]]
+
+
+def _count_running(kind: str, delta: int) -> None:
+    with _lock:
+        _running[kind] = _running.get(kind, 0) + delta
+
+
+async def _keep_alive(job: Job, worker_id: str) -> None:
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            await asyncio.to_thread(heartbeat, job, worker_id)
+        except Exception as e:
+            print(f"⚠️ Heartbeat del trabajo #{job.id} falló: {e}")
+
+
+async def _execute(job: Job, worker_id: str) -> None:
+    spec = _handlers[job.kind]
+    if job.attempts > job.max_attempts:
+        # Lease vencido (el proceso murió) y ya sin intentos
+        await asyncio.to_thread(fail, job, "Sin respuesta del worker (lease vencido).", False)
+        return
+    print(f"⚙️ Trabajo #{job.id} {job.kind} (intento {job.attempts}/{job.max_attempts})")
+    keep_alive = asyncio.create_task(_keep_alive(job, worker_id))
+    start = time.perf_counter()
+    try:
+        if spec["is_async"]:
+            result = await asyncio.wait_for(spec["handler"](job.payload, job), timeout=spec["timeout"])
+        else:
+            result = await asyncio.to_thread(spec["handler"], job.payload, job)
+    except asyncio.CancelledError:
+        await asyncio.shield(asyncio.to_thread(release, job))
+        with _lock:
+            _stats["released"] += 1
+        raise
+    except Exception as e:
+        retry = await asyncio.to_thread(fail, job, f"{type(e).__name__}: {e}", not isinstance(e, JobFailed))
+        with _lock:
+            _stats["retried" if retry else "failed"] += 1
+        print(f"{'🔁' if retry else '❌'} Trabajo #{job.id} {job.kind} falló: {e}")
+    else:
+        await asyncio.to_thread(complete, job, result)
+        with _lock:
+            _stats["processed"] += 1
+            _stats["ms_total"] += (time.perf_counter() - start) * 1000
+        print(f"✅ Trabajo #{job.id} {job.kind} terminado.")
+    finally:
+        keep_alive.cancel()
+
+
+async def _worker(worker_id: str, claim_lock: asyncio.Lock) -> None:
+    while True:
+        job = None
+        try:
+            # Reservar cupo del tipo y tomar el trabajo es atómico dentro del proceso
+            async with claim_lock:
+                job = await asyncio.to_thread(claim, _available_kinds(), worker_id)
+                if job:
+                    _count_running(job.kind, 1)
+        except Exception as e:
+            print(f"⚠️ Worker {worker_id} no pudo leer la cola: {e}")
+        if not job:
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            continue
+        try:
+            await _execute(job, worker_id)
+        except asyncio.CancelledError:
+            raise
+        except LeaseLost as e:
+            # Otro worker lo retomó (heartbeats fallidos): su estado manda, este resultado se descarta
+            with _lock:
+                _stats["lease_lost"] += 1
+            print(f"⚠️ Worker {worker_id} descarta el resultado: {e}")
+        except Exception as e:
+            # complete/fail no llegaron a la DB: el lease vence y otro worker lo retoma
+            print(f"🔥 Worker {worker_id} perdió el trabajo #{job.id}: {e}")
+        finally:
+            _count_running(job.kind, -1)
+
+
+async def run_workers(count: int = JOB_WORKERS) -> None:
+    """Pool de `count` workers; corre hasta que se cancela (apagado de la app)."""
+    claim_lock = asyncio.Lock()
+    run_id = uuid.uuid4().hex[:6]
+    workers = [asyncio.create_task(_worker(f"{_worker_prefix}:{run_id}:{i}", claim_lock)) for i in range(count)]
+    print(f"🧵 Cola de trabajos: {count} workers ({', '.join(_handlers) or 'sin handlers'})")
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+# --- Estado para el agente y métricas ---
+
+def _describe(row: tuple) -> str:
+    job_id, kind, status, progress, note, error, attempts, max_attempts = row
+    label = _handlers.get(kind, {}).get("label", kind)
+    text = f"#{job_id} {label}: {STATUS_LABELS.get(status, status)}"
+    if status == "running":
+        text += f" ({progress:.0%}{', ' + note if note else ''})"
+    elif status == "queued" and attempts:
+        text += f" (reintento {attempts + 1}/{max_attempts})"
+    if error and status in ("failed", "queued"):
+        text += f" — {error[:160]}"
+    return text
+
+
+def status_report(user_id: Optional[int] = None, phone: Optional[str] = None, job_id: Optional[int] = None,
+                  limit: int = 5) -> str:
+    """Texto con el estado de un trabajo o de los últimos del usuario."""
+    where, params = [], []
+    if job_id:
+        where.append("id = %s")
+        params.append(job_id)
+    if user_id is not None:
+        where.append("user_id = %s")
+        params.append(user_id)
+    if phone:
+        where.append("phone = %s")
+        params.append(phone)
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT id, kind, status, progress, progress_note, error, attempts, max_attempts
+                FROM jobs {"WHERE " + " AND ".join(where) if where else ""}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s;
+                """,
+                (*params, limit),
+            )
+            rows = cur.fetchall()
+    if not rows:
+        return f"No encontré el trabajo #{job_id}." if job_id else "No tienes trabajos en segundo plano recientes."
+    return "\n".join(_describe(row) for row in rows)
+
+
+def job_stats() -> dict:
+    with _lock:
+        stats = {key: value for key, value in _stats.items() if key != "ms_total"}
+        stats["ms_avg"] = round(_stats["ms_total"] / _stats["processed"], 1) if _stats["processed"] else 0.0
+        stats["running"] = {kind: n for kind, n in _running.items() if n}
+    stats["limits"] = {kind: spec["concurrency"] for kind, spec in _handlers.items()}
+    try:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT kind, COUNT(*), GREATEST(EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(run_after)), 0)
+                    FROM jobs WHERE status = 'queued' GROUP BY kind;
+                    """
+                )
+                stats["queued"] = {
+                    kind: {"count": count, "oldest_wait_s": round(float(wait), 1)} for kind, count, wait in cur.fetchall()
+                }
+    except Exception as e:
+        stats["queued"] = f"error: {e}"
+    return stats
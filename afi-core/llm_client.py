@@ -0,0 +1,240 @@
+"""
+Cliente Gemini compartido por todos los agentes.
+
+- Async (handlers de FastAPI, scheduler): `generate`, `send_message` y `embed` usan las
+  APIs *_async del SDK. Una conversación esperando a Gemini no ocupa un hilo del pool por
+  defecto de asyncio, así que un worker de uvicorn atiende decenas de chats a la vez.
+- Sync (scripts, hilos del scheduler, pipelines de ingesta): `generate_sync` y `embed_sync`.
+- Cuota: cada llamada pide turno a quota_scheduler (RPM/TPM por modelo y prioridad
+  `priority=`: INTERACTIVE por defecto en async, BATCH en sync) y los 429 se reintentan.
+- Concurrencia acotada: como mucho LLM_MAX_CONCURRENCY llamadas en vuelo por event loop
+  (y otras tantas desde hilos); el resto espera turno sin consumir recursos.
+- Timeout por llamada: LLM_TIMEOUT_SECONDS (LLM_EMBED_TIMEOUT_SECONDS para embeddings) o
+  `timeout=` explícito. Se pasa también como deadline a la API; al vencer -> LLMTimeout.
+Métricas en llm_client_stats() (/metrics).
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import Optional
+
+import google.generativeai as genai
+
+import quota_scheduler
+# Clases de prioridad re-exportadas: los agentes usan llm_client.ALERT, etc.
+from quota_scheduler import ALERT, BATCH, INTERACTIVE, estimate_tokens
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_EMBED_TIMEOUT_SECONDS = float(os.getenv("LLM_EMBED_TIMEOUT_SECONDS", "10"))
+# Reintentos ante 429; la espera entre intentos la impone quota_scheduler (backoff del modelo)
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "5"))
+
+
+class LLMTimeout(TimeoutError):
+    """Gemini no respondió dentro del timeout de la llamada."""
+
+
+_lock = threading.Lock()
+_sync_limit = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+# Un semáforo por event loop: main corre en el loop de uvicorn, pero algunos hilos usan asyncio.run
+_async_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_stats = {
+    "calls": 0,
+    "errors": 0,
+    "timeouts": 0,
+    "in_flight": 0,
+    "max_in_flight": 0,
+    "waiting": 0,
+    "latency_ms_total": 0.0,
+}
+
+
+def _async_limit() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    limit = _async_limits.get(loop)
+    if limit is None:
+        limit = _async_limits[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return limit
+
+
+def _enter() -> float:
+    with _lock:
+        _stats["in_flight"] += 1
+        _stats["max_in_flight"] = max(_stats["max_in_flight"], _stats["in_flight"])
+    return time.perf_counter()
+
+
+def _exit(start: float, error: Optional[Exception] = None) -> None:
+    with _lock:
+        _stats["in_flight"] -= 1
+        _stats["calls"] += 1
+        _stats["latency_ms_total"] += (time.perf_counter() - start) * 1000
+        if isinstance(error, LLMTimeout):
+            _stats["timeouts"] += 1
+        elif error is not None:
+            _stats["errors"] += 1
+
+
+def _count_waiting(delta: int) -> None:
+    with _lock:
+        _stats["waiting"] += delta
+
+
+def _is_timeout(error: Exception) -> bool:
+    # asyncio.wait_for o deadline vencido del lado del SDK (google.api_core DeadlineExceeded)
+    return isinstance(error, TimeoutError) or type(error).__name__ == "DeadlineExceeded"
+
+
+async def _call_async(coro_factory, timeout: float, what: str):
+    limit = _async_limit()
+    _count_waiting(1)
+    try:
+        await limit.acquire()
+    finally:
+        _count_waiting(-1)
+    start = _enter()
+    error = None
+    try:
+        return await asyncio.wait_for(coro_factory(), timeout=timeout)
+    except Exception as e:
+        error = e
+        if not _is_timeout(e):
+            raise
+        error = LLMTimeout(f"{what}: sin respuesta en {timeout:.0f}s")
+        raise error from e
+    finally:
+        limit.release()
+        _exit(start, error)
+
+
+def _call_sync(call, timeout: float, what: str):
+    _count_waiting(1)
+    try:
+        _sync_limit.acquire()
+    finally:
+        _count_waiting(-1)
+    start = _enter()
+    error = None
+    try:
+        return call()
+    except Exception as e:
+        error = e
+        if not _is_timeout(e):
+            raise
+        error = LLMTimeout(f"{what}: sin respuesta en {timeout:.0f}s")
+        raise error from e
+    finally:
+        _sync_limit.release()
+        _exit(start, error)
+
+
+def _usage_tokens(response) -> Optional[int]:
+    total = getattr(getattr(response, "usage_metadata", None), "total_token_count", None)
+    return total if isinstance(total, int) else None
+
+
+async def _run_async(coro_factory, timeout: float, model: str, priority: int, tokens: int):
+    # Turno en el planificador de cuota -> llamada; un 429 pausa el modelo y se reintenta
+    for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+        await quota_scheduler.acquire_async(model, priority, tokens)
+        try:
+            response = await _call_async(coro_factory, timeout, model)
+        except Exception as e:
+            if not quota_scheduler.is_rate_limited(e):
+                raise
+            quota_scheduler.record_rate_limit(model)
+            if attempt == LLM_RATE_LIMIT_RETRIES:
+                raise
+            continue
+        quota_scheduler.record_success(model, tokens, _usage_tokens(response))
+        return response
+
+
+def _run_sync(call, timeout: float, model: str, priority: int, tokens: int):
+    for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+        quota_scheduler.acquire(model, priority, tokens)
+        try:
+            response = _call_sync(call, timeout, model)
+        except Exception as e:
+            if not quota_scheduler.is_rate_limited(e):
+                raise
+            quota_scheduler.record_rate_limit(model)
+            if attempt == LLM_RATE_LIMIT_RETRIES:
+                raise
+            continue
+        quota_scheduler.record_success(model, tokens, _usage_tokens(response))
+        return response
+
+
+def _model(model_name: str, system_instruction=None, tools=None):
+    kwargs = {}
+    if system_instruction:
+        kwargs["system_instruction"] = system_instruction
+    if tools:
+        kwargs["tools"] = tools
+    return genai.GenerativeModel(model_name, **kwargs)
+
+
+async def generate(model_name: str, contents, system_instruction=None, tools=None, timeout: Optional[float] = None,
+                   priority: int = INTERACTIVE):
+    """generate_content_async con turno de cuota, tope de concurrencia y timeout."""
+    timeout = timeout or LLM_TIMEOUT_SECONDS
+    model = _model(model_name, system_instruction, tools)
+    tokens = estimate_tokens([system_instruction, contents])
+    return await _run_async(
+        lambda: model.generate_content_async(contents, request_options={"timeout": timeout}),
+        timeout, model_name, priority, tokens,
+    )
+
+
+async def send_message(chat, content, timeout: Optional[float] = None, priority: int = INTERACTIVE):
+    """Turno de un ChatSession (function-calling): send_message_async con los mismos límites."""
+    timeout = timeout or LLM_TIMEOUT_SECONDS
+    return await _run_async(
+        lambda: chat.send_message_async(content, request_options={"timeout": timeout}),
+        timeout, chat.model.model_name, priority, estimate_tokens(content),
+    )
+
+
+async def embed(content, model: str, task_type: str = "retrieval_query", timeout: Optional[float] = None,
+                priority: int = INTERACTIVE):
+    timeout = timeout or LLM_EMBED_TIMEOUT_SECONDS
+    return await _run_async(
+        lambda: genai.embed_content_async(model=model, content=content, task_type=task_type,
+                                          request_options={"timeout": timeout}),
+        timeout, model, priority, estimate_tokens(content),
+    )
+
+
+def generate_sync(model_name: str, contents, system_instruction=None, tools=None, timeout: Optional[float] = None,
+                  priority: int = BATCH):
+    """Versión bloqueante para scripts e hilos (ingesta, auditorías, scheduler)."""
+    timeout = timeout or LLM_TIMEOUT_SECONDS
+    model = _model(model_name, system_instruction, tools)
+    tokens = estimate_tokens([system_instruction, contents])
+    return _run_sync(
+        lambda: model.generate_content(contents, request_options={"timeout": timeout}),
+        timeout, model_name, priority, tokens,
+    )
+
+
+def embed_sync(content, model: str, task_type: str = "retrieval_query", timeout: Optional[float] = None,
+               priority: int = BATCH):
+    timeout = timeout or LLM_EMBED_TIMEOUT_SECONDS
+    return _run_sync(
+        lambda: genai.embed_content(model=model, content=content, task_type=task_type,
+                                    request_options={"timeout": timeout}),
+        timeout, model, priority, estimate_tokens(content),
+    )
+
+
+def llm_client_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+    total = stats.pop("latency_ms_total")
+    stats["latency_ms_avg"] = round(total / stats["calls"], 1) if stats["calls"] else 0.0
+    stats["max_concurrency"] = LLM_MAX_CONCURRENCY
+    return stats
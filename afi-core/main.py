@@ -4,7 +4,6 @@ import datetime
 import time
 import re
 import asyncio
-import threading
 import secrets
 from uuid import uuid4
 from fastapi import FastAPI, Request, HTTPException
@@ -17,24 +16,27 @@ import email_ingest
 import identity_manager
 from briefing_agent import send_morning_briefing
 from db_ops import ensure_account, insert_transactions, execute_query
-from text_to_ui_agent import process_query
+from text_to_ui_agent import fetch_next_page, process_query
 from onboarding_agent import process_onboarding
 from message_queue import enqueue_message, worker as mq_worker
 from backup_manager import run_backup
-from tools import (
-    TOOLS_SCHEMA,
-    get_financial_audit,
-    create_category_tool,
-    categorize_payees_tool,
-    create_account_tool,
-    find_and_import_history_tool,
-    complete_onboarding_tool,
-    confirm_import_tool,
-    generate_spending_chart_tool,
-)
-from database import init_db, get_user_context, save_user_context, get_conn, save_pending_data, get_pending_data
+from partitions import ensure_future_partitions
+from answer_cache import answer_cache_stats
+from embedding_cache import embed_text_async, embedding_cache_stats
+import context_loader
+import conversation_store
+import intent_router
+import job_queue
+import llm_client
+from quota_scheduler import quota_stats
+import wisdom
+from schema_catalog import catalog_stats
+from sql_sandbox import sandbox_stats
+from tool_registry import ToolRegistry
+from tools import TOOLS_SCHEMA, get_financial_audit
+from database import init_db, save_user_context, get_conn, save_pending_data, get_pending_data, pool_stats
 from data_engine import process_file_universal
-from profile_manager import get_user_profile, update_financial_goals
+from profile_manager import update_financial_goals
 
 # Inicialización
 app = FastAPI(title="AFI Brain v7.0 God Mode")
@@ -56,12 +58,20 @@ BRIDGE_URL = os.getenv("BRIDGE_URL", "http://afi-whatsapp:3000")
 MODEL_SMART = "gemini-2.5-pro"   # Onboarding / Sherlock / Análisis profundo
 MODEL_FAST = "gemini-2.5-flash"  # Operación diaria / respuestas rápidas
 
-# Memoria de chat agéntico
-chat_history = []
-# Buffers para uploads múltiples
-upload_buffers: dict[str, list] = {}
-# Generaciones de debounce para reiniciar la espera por usuario
-debounce_generation: dict[str, int] = {}
+# Tareas en segundo plano: el event loop solo guarda referencias débiles, sin este set el GC
+# podría recolectarlas a mitad de camino
+_background_tasks: set = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+# Herramientas de function-calling: timeouts, argumentos y ejecución en paralelo (tool_registry)
+TOOLS = ToolRegistry(TOOLS_SCHEMA)
 
 # Config sesión/OTP persistente
 OTP_TTL_SECONDS = 300
@@ -96,16 +106,10 @@ class ChatQuery(BaseModel):
     history: list[dict] | None = None
 
 
-def _debounce_worker(phone: str, gen: int):
-    """Worker en hilo: espera ventana y procesa si la generación sigue vigente."""
-    # Procesar casi inmediato
-    time.sleep(0.1)
-    if debounce_generation.get(phone) != gen:
-        return
-    try:
-        asyncio.run(process_buffered_files(phone))
-    except Exception as e:
-        print(f"🔥 Error en timer de buffer para {phone}: {e}")
+class ChatPage(BaseModel):
+    page_token: str
+    token: str | None = None
+    phone: str | None = None
 
 
 async def check_emails():
@@ -119,6 +123,44 @@ async def check_emails():
         print(f"❌ Error crítico en check_emails: {e}")
 
 
+async def sync_wisdom_library():
+    """Sincronización diaria de la biblioteca de libros (solo PDFs nuevos o modificados), vía job_queue."""
+    try:
+        await asyncio.to_thread(job_queue.enqueue, "reembed_library", dedupe_key="library")
+    except Exception as e:
+        print(f"❌ Error encolando sincronización de biblioteca: {e}")
+
+
+def _run_library_sync(payload, job):
+    from rag_ingest import ingest_library
+    # El manifiesto wisdom_sources hace idempotente el reintento: solo re-embebe lo pendiente
+    total = ingest_library(progress=job.progress)
+    return total or {}
+
+
+async def schedule_morning_briefing():
+    # Un briefing por día aunque el cron dispare en varios procesos o se reinicie a las 7:00:
+    # once_key también cubre el que ya terminó ('done'), no solo el que está en curso
+    try:
+        await asyncio.to_thread(
+            job_queue.enqueue, "morning_briefing", once_key=datetime.date.today().isoformat(), max_attempts=2
+        )
+    except Exception as e:
+        print(f"❌ Error encolando briefing: {e}")
+
+
+async def _run_morning_briefing(payload, job):
+    await send_morning_briefing()
+
+
+async def purge_old_jobs():
+    try:
+        removed = await asyncio.to_thread(job_queue.purge)
+        print(f"🧹 Trabajos antiguos eliminados: {removed}")
+    except Exception as e:
+        print(f"⚠️ Error limpiando trabajos: {e}")
+
+
 def _resolve_user_id(phone: str) -> int | None:
     try:
         row = execute_query("SELECT id FROM users WHERE phone = %s", (phone,), fetch_one=True)
@@ -128,53 +170,6 @@ def _resolve_user_id(phone: str) -> int | None:
         return None
 
 
-def execute_function(name, args, user_id=None):
-    """Normaliza argumentos de llamada de herramienta y despacha a la implementación."""
-    def _to_python(val):
-        # Convierte objetos protobuf (MapComposite/RepeatedComposite) a tipos nativos.
-        if isinstance(val, dict):
-            return {k: _to_python(v) for k, v in val.items()}
-        if isinstance(val, (list, tuple)):
-            return [_to_python(v) for v in val]
-        try:
-            # RepeatedComposite itera pero no es list
-            if hasattr(val, "__iter__") and not isinstance(val, (str, bytes)):
-                return [_to_python(v) for v in list(val)]
-        except Exception:
-            pass
-        return val
-
-    py_args = {}
-    try:
-        py_args = {k: _to_python(v) for k, v in args.items()}
-    except Exception:
-        py_args = {}
-
-    if name == "get_financial_audit":
-        return get_financial_audit()
-    if name == "create_category_tool":
-        return create_category_tool(py_args.get("name"), py_args.get("group", "Gastos Variables"))
-    if name == "categorize_payees_tool":
-        keywords = py_args.get("keywords_list") or []
-        if not isinstance(keywords, list):
-            try:
-                keywords = list(keywords)
-            except Exception:
-                keywords = [str(keywords)]
-        return categorize_payees_tool(py_args.get("category_name"), keywords)
-    if name == "create_account_tool":
-        return create_account_tool(py_args.get("account_name"), py_args.get("account_type", "checking"), user_id=user_id)
-    if name == "find_and_import_history_tool":
-        return find_and_import_history_tool(py_args.get("account_name"))
-    if name == "complete_onboarding_tool":
-        return complete_onboarding_tool(py_args.get("summary"))
-    if name == "confirm_import_tool":
-        return confirm_import_tool(py_args.get("target_account_name"), user_id=user_id)
-    if name == "generate_spending_chart_tool":
-        return generate_spending_chart_tool(py_args.get("period", "current_month"), user_id=user_id)
-    return "Error: Tool not found"
-
-
 def get_system_instruction(file_summary: str, current_mode: str, wisdom_context: str, is_admin_incomplete: bool) -> str:
     """Construye el prompt del sistema con idioma forzado y capacidades multimodales."""
     if is_admin_incomplete:
@@ -246,37 +241,17 @@ INSTRUCCIONES:
     return system_instruction
 
 
-def retrieve_wisdom(query: str, top_k: int = 3) -> str:
-    """Busca pasajes relevantes en financial_wisdom usando pgvector."""
+async def retrieve_wisdom(query: str, top_k: int = 3) -> str:
+    """Busca pasajes relevantes en financial_wisdom (índice en memoria, ver wisdom.py)."""
     if not query:
         return ""
     try:
-        resp = genai.embed_content(model="models/text-embedding-004", content=query, task_type="retrieval_query")
-        embedding = None
-        if isinstance(resp, dict):
-            embedding = resp.get("embedding")
-        else:
-            try:
-                embedding = resp["embedding"]
-            except Exception:
-                embedding = None
-        if not embedding:
+        embedding = await embed_text_async(query, task_type="retrieval_query")
+        if embedding is None:
             return ""
-        vec_literal = "[" + ",".join(f"{float(x):.6f}" for x in embedding) + "]"
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT content, source FROM financial_wisdom ORDER BY embedding <-> %s::vector LIMIT %s",
-                    (vec_literal, top_k),
-                )
-                rows = cur.fetchall()
-                if not rows:
-                    return ""
-                snippets = []
-                for content, source in rows:
-                    source_name = source or "desconocido"
-                    snippets.append(f"[{source_name}] {content}")
-                return "\n\n".join(snippets)
+        # La búsqueda es ~1 ms, pero una recarga del índice va a la DB: fuera del loop
+        results = await asyncio.to_thread(wisdom.retrieve, query, top_k, embedding)
+        return wisdom.format_snippets(results, "desconocido")
     except Exception as e:
         print(f"⚠️ RAG search failed: {e}")
         return ""
@@ -326,7 +301,7 @@ def _ensure_account_sync(account_name: str) -> int | None:
         return None
 
 
-def _ingest_voice_transaction(structured: dict) -> str:
+def _ingest_voice_transaction(structured: dict, source_ref: str = None) -> str:
     if not structured:
         return "⚠️ No pude entender la nota de voz."
 
@@ -353,12 +328,14 @@ def _ingest_voice_transaction(structured: dict) -> str:
         "description": str(payee)[:200],
         "import_source": "voice_flash",
         "category": structured.get("category"),
+        # El mismo audio reenviado/reprocesado no duplica el gasto
+        "source_ref": source_ref,
     }
 
     try:
         inserted = insert_transactions(account_id, [tx_payload], import_source="voice_flash")
         if inserted == 0:
-            return "⚠️ No pude registrar el gasto en la bóveda."
+            return f"ℹ️ Ese gasto en {payee} ya estaba registrado."
         amount_display = abs(amount_value)
         return f"✅ Registré ${amount_display:,.0f} en {payee} ({account_name})."
     except Exception as e:
@@ -483,8 +460,7 @@ async def chat_query(payload: ChatQuery):
     
     # --- INTERCEPCIÓN ONBOARDING ---
     if phone:
-        # Ejecutar en hilo aparte para no bloquear
-        onboarding_reply = await asyncio.to_thread(process_onboarding, payload.question, phone)
+        onboarding_reply = await process_onboarding(payload.question, phone)
         if onboarding_reply:
             return {
                 "answer": onboarding_reply,
@@ -495,12 +471,32 @@ async def chat_query(payload: ChatQuery):
             }
     # -------------------------------
 
-    result = await asyncio.to_thread(process_query, payload.question, phone or payload.phone, payload.history or [])
+    # RLS del sandbox SQL: users.id del dueño de la sesión (no el teléfono)
+    owner_phone = phone or payload.phone
+    user_id = await asyncio.to_thread(_resolve_user_id, owner_phone) if owner_phone else None
+    result = await process_query(payload.question, user_id, payload.history or [])
     result["timestamp"] = datetime.datetime.utcnow().isoformat()
     return result
 
 
-def _extract_voice_transaction(uploaded_file, context: str):
+@app.post("/chat/query/page")
+async def chat_query_page(payload: ChatPage):
+    """Página siguiente de un resultado tabular (page_token devuelto por /chat/query)."""
+    phone = None
+    if payload.token:
+        phone = _validate_session_token(payload.token)
+        if not phone:
+            raise HTTPException(status_code=401, detail="Sesión expirada o inválida.")
+    owner_phone = phone or payload.phone
+    user_id = await asyncio.to_thread(_resolve_user_id, owner_phone) if owner_phone else None
+    page = await asyncio.to_thread(fetch_next_page, payload.page_token, user_id)
+    if page is None:
+        raise HTTPException(status_code=410, detail="La página expiró. Vuelve a hacer la pregunta.")
+    page["timestamp"] = datetime.datetime.utcnow().isoformat()
+    return page
+
+
+async def _extract_voice_transaction(uploaded_file, context: str):
     prompt = f"""
 Eres AFI, CFO personal.
 Contexto del usuario: "{context}"
@@ -516,8 +512,7 @@ Devuelve SOLO JSON con:
 Ejemplo de salida:
 {{"amount": -20000, "payee": "Taxi", "account": "Nequi", "date": "2024-11-19", "notes": "viaje aeropuerto", "transcription": "me gasté 20 mil en taxi"}}
 """
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    response = model.generate_content([prompt, uploaded_file])
+    response = await llm_client.generate(MODEL_FAST, [prompt, uploaded_file])
     raw_text = response.text or ""
     parsed = _extract_json_dict(raw_text)
     if parsed and isinstance(parsed, dict) and not parsed.get("date"):
@@ -525,7 +520,7 @@ Ejemplo de salida:
     return parsed, raw_text.strip()
 
 
-def process_multimodal_request(user_text: str, media_path: str, media_mime: str, system_instruction: str, phone: str) -> str:
+async def process_multimodal_request(user_text: str, media_path: str, media_mime: str, system_instruction: str, phone: str) -> str:
     """Procesa audio/imagen/documentos con Gemini 2.5 Flash, corrigiendo MIME y esperando procesamiento."""
     print(f"👁️ Procesando archivo: {media_path} ({media_mime})")
     if not os.path.exists(media_path):
@@ -539,17 +534,17 @@ def process_multimodal_request(user_text: str, media_path: str, media_mime: str,
         or (user_text and ".csv" in user_text.lower())
     ):
         print("📄 Documento financiero recibido.")
-        transactions = process_file_stream(media_path, media_mime or "")
+        transactions = await asyncio.to_thread(process_file_stream, media_path, media_mime or "")
         if not transactions:
             return "❌ Recibí el archivo pero no pude leer columnas de Fecha y Monto. ¿Es un formato estándar?"
-        existing = get_pending_data(phone) or []
+        existing = await asyncio.to_thread(get_pending_data, phone) or []
         if not isinstance(existing, list):
             try:
                 existing = list(existing)
             except Exception:
                 existing = []
         combined = existing + transactions
-        save_pending_data(phone, combined)
+        await asyncio.to_thread(save_pending_data, phone, combined)
         count_new = len(transactions)
         total_pending = len(combined)
         return f"""✅ Archivo procesado.
@@ -565,10 +560,11 @@ Cuando quieras cargar, dime: "Cargar a la cuenta X". """
         mime_to_use = "image/jpeg"
 
     try:
-        uploaded_file = genai.upload_file(media_path, mime_type=mime_to_use)
+        # El SDK no tiene upload async: la subida va en un hilo, la espera no ocupa ninguno
+        uploaded_file = await asyncio.to_thread(genai.upload_file, media_path, mime_type=mime_to_use)
         while uploaded_file.state.name == "PROCESSING":
-            time.sleep(0.25)
-            uploaded_file = genai.get_file(uploaded_file.name)
+            await asyncio.sleep(0.25)
+            uploaded_file = await asyncio.to_thread(genai.get_file, uploaded_file.name)
 
         if uploaded_file.state.name == "FAILED":
             return "⚠️ Google no pudo procesar el formato del archivo."
@@ -577,9 +573,9 @@ Cuando quieras cargar, dime: "Cargar a la cuenta X". """
         is_audio = "audio" in mime_to_use or "ogg" in mime_to_use
         
         if is_audio:
-            structured, raw_voice = _extract_voice_transaction(uploaded_file, user_text)
+            structured, raw_voice = await _extract_voice_transaction(uploaded_file, user_text)
             if structured:
-                return _ingest_voice_transaction(structured)
+                return await asyncio.to_thread(_ingest_voice_transaction, structured, os.path.basename(media_path))
             return raw_voice or "⚠️ Audio mudo."
 
         multimodal_prompt = f"""
@@ -591,8 +587,9 @@ ARCHIVO: Analiza este audio/imagen.
 ACCIÓN: Ejecuta la herramienta necesaria o responde.
 """
 
-        model = genai.GenerativeModel("gemini-2.5-flash", system_instruction=system_instruction, tools=TOOLS_SCHEMA)
-        response = model.generate_content([multimodal_prompt, uploaded_file])
+        response = await llm_client.generate(
+            MODEL_FAST, [multimodal_prompt, uploaded_file], system_instruction=system_instruction, tools=TOOLS_SCHEMA
+        )
         return response.text if response else "⚠️ No se obtuvo respuesta del modelo."
 
     except Exception as e:
@@ -616,19 +613,50 @@ async def send_media_message(phone: str, file_path: str, caption: str = ""):
         print(f"❌ Error enviando media a {phone}: {e}")
 
 
-def ai_router(text: str, user_context: dict) -> str:
-    """Bucle agéntico con Gemini y function-calling."""
-    global chat_history
-    print(f"🧠 [DEBUG] Enviando a Gemini: {text}")
-    try:
-        phone = user_context.get("phone") or user_context.get("from_user")
-        
-        # Resolver User ID para RLS
-        user_id = _resolve_user_id(phone) if phone else None
+async def ai_router(text: str, user_context: dict) -> str:
+    """
+    Bucle agéntico con Gemini y function-calling. Corre en el event loop: cada turno de
+    Gemini va por llm_client (async, con timeout) y la DB y las herramientas por hilos cortos.
+    """
+    phone = user_context.get("phone") or user_context.get("from_user")
+    # Mensajes seguidos del mismo usuario se atienden en orden; usuarios distintos en paralelo
+    async with conversation_store.user_lock(phone):
+        return await _ai_router_turn(text, phone)
 
-        # 1. RECUPERAR IDENTIDAD Y MEMORIA
-        user_profile = get_user_profile(phone)
-        state = get_user_context(phone)  # Memoria técnica (vectores, csv)
+
+async def _ai_router_turn(text: str, phone: str | None) -> str:
+    try:
+        # 0. CAMINO RÁPIDO: preguntas rutinarias (saldo, gasto del mes...) sin Gemini (intent_router)
+        user_row = None
+        intent = intent_router.match(text)
+        if intent:
+            user_row = await asyncio.to_thread(context_loader.load_user_row, phone)
+            state = user_row["state"]
+            # Onboarding / Sherlock siguen en el LLM: ahí la conversación guía el flujo
+            if state and (state.get("mode") or "NORMAL") == "NORMAL":
+                reply = await asyncio.to_thread(intent_router.answer_text, intent, user_row["user_id"])
+                if reply:
+                    print(f"⚡ Camino rápido ({intent['intent']}): {text}")
+                    await _remember_turn(phone, user_row["memory"], text, reply)
+                    return reply
+
+        print(f"🧠 [DEBUG] Enviando a Gemini: {text}")
+        # 1. RECUPERAR IDENTIDAD, MEMORIA Y SABIDURÍA EN PARALELO
+        # Una sola consulta trae users.id (RLS), perfil, modo, file_context y memoria de chat;
+        # el embedding + búsqueda RAG corre al mismo tiempo (context_loader)
+        sources, timings = await context_loader.gather_timed(
+            "ai_router",
+            user=(asyncio.sleep(0, result=user_row) if user_row
+                  else asyncio.to_thread(context_loader.load_user_row, phone)),
+            wisdom=retrieve_wisdom(text),
+        )
+        print(f"⏱️ Contexto ai_router (ms): {timings}")
+        user_row = sources["user"] or context_loader.load_user_row(None)
+        user_id = user_row["user_id"]
+        user_profile = user_row["profile"]
+        state = user_row["state"]  # Memoria técnica (vectores, csv)
+        memory = user_row["memory"]
+        wisdom_context = sources["wisdom"] or ""
 
         file_summary = state.get("file_context") if state else ""
         current_mode = state.get("mode") if state else "NORMAL"
@@ -652,17 +680,20 @@ def ai_router(text: str, user_context: dict) -> str:
             if not admin_incomplete and not file_summary:
                 print("🔍 Contexto vacío. Intentando leer auditoría física...")
                 try:
-                    raw_audit = get_financial_audit()  # Lee CSV
+                    raw_audit = await asyncio.to_thread(get_financial_audit)  # Lee CSV
                     if raw_audit and "total_spent" in raw_audit and "Error" not in raw_audit:
                         file_summary = raw_audit
                         current_mode = "ONBOARDING"
-                        save_user_context(phone, file_summary=raw_audit, mode="ONBOARDING")
+                        await asyncio.to_thread(save_user_context, phone, file_summary=raw_audit, mode="ONBOARDING")
                 except Exception as e:
                     print(f"⚠️ No hay CSV o error lectura: {e}")
 
-        wisdom_context = retrieve_wisdom(text)
         system_instruction = get_system_instruction(file_summary, current_mode, wisdom_context, admin_incomplete)
 
+        # Memoria de la conversación: ventana reciente + resumen de lo anterior (conversation_store)
+        if memory["summary"]:
+            system_instruction += f"\nRESUMEN DE LA CONVERSACIÓN ANTERIOR:\n{memory['summary']}\n"
+
         # 2b. Selección dinámica de modelo
         if current_mode in ("SHERLOCK", "ONBOARDING"):
             target_model = MODEL_SMART
@@ -677,69 +708,74 @@ def ai_router(text: str, user_context: dict) -> str:
             tools=TOOLS_SCHEMA,
             system_instruction=system_instruction,
         )
-        chat = model.start_chat(history=chat_history)
-        response = chat.send_message(text)
+        chat = model.start_chat(history=conversation_store.to_gemini_history(memory["turns"]))
+        response = await llm_client.send_message(chat, text)
         print(f"🧠 [DEBUG] Respuesta Gemini Cruda: {response}")
 
         while True:
-            tool_call = None
-            for part in response.parts:
-                if part.function_call:
-                    tool_call = part.function_call
-                    break
-            if not tool_call:
+            # Todas las function_call de la respuesta (Gemini puede pedir varias a la vez)
+            tool_calls = [part.function_call for part in response.parts if part.function_call]
+            if not tool_calls:
                 break
 
-            print(f"🔧 [DEBUG] Gemini quiere usar herramienta: {tool_call.name} args: {tool_call.args}")
+            print(f"🔧 [DEBUG] Gemini quiere usar herramientas: {[(c.name, c.args) for c in tool_calls]}")
             # Feedback inmediato al usuario sobre trabajo en curso
             try:
                 if phone:
-                    asyncio.create_task(enqueue_message(phone, "⏳ Procesando cambios en la Bóveda..."))
+                    _spawn(enqueue_message(phone, "⏳ Procesando cambios en la Bóveda..."))
             except Exception as e:
                 print(f"⚠️ No se pudo enviar feedback inmediato: {e}")
 
-            try:
-                # PASS USER_ID TO TOOLS
-                tool_result = execute_function(tool_call.name, tool_call.args, user_id=user_id)
-            except Exception as e:
-                tool_result = f"Error ejecutando herramienta {tool_call.name}: {e}"
-
-            print(f"🔧 [DEBUG] Resultado herramienta: {tool_result}")
-            response = chat.send_message(
+            # En paralelo, con timeout por herramienta y el USER_ID del turno (tool_registry)
+            tool_results = await TOOLS.run_calls(tool_calls, user_id=user_id)
+            print(f"🔧 [DEBUG] Resultado herramientas: {tool_results}")
+            response = await llm_client.send_message(
+                chat,
                 genai.protos.Content(
                     parts=[
                         genai.protos.Part(
                             function_response=genai.protos.FunctionResponse(
-                                name=tool_call.name, response={"result": tool_result}
+                                name=name, response={"result": result}
                             )
                         )
+                        for name, result in tool_results
                     ]
                 )
             )
 
-        chat_history = chat.history
         print(f"🧠 [DEBUG] Texto Final generado: {getattr(response, 'text', None)}")
         if not response or not response.text:
             return "⚠️ Error: Gemini generó una respuesta vacía."
-        return response.text.strip()
+        reply = response.text.strip()
+        await _remember_turn(phone, memory, text, reply)
+        return reply
     except Exception as e:
         print(f"🔥 Error en AI router: {e}")
         return "Mi conexión neuronal falló. Intenta de nuevo en un momento."
 
 
-# --- Buffer asíncrono de archivos (debounce 4s) ---
-async def process_buffered_files(phone: str):
-    files = upload_buffers.pop(phone, [])
-    if not files: return
+async def _remember_turn(phone: str | None, memory: dict, text: str, reply: str) -> None:
+    # Un gráfico queda en la memoria como marcador, no como ruta de archivo
+    stored = "[Gráfico de gastos enviado]" if reply.startswith("[MEDIA]") else reply
+    new_turns = [{"role": "user", "text": text}, {"role": "model", "text": stored}]
+    await asyncio.to_thread(conversation_store.append_turns, phone, new_turns)
+    if conversation_store.needs_compaction(memory, new_turns):
+        # Lee cuando este turno suelta el lock del usuario; el resumen corre sin bloquearlo
+        _spawn(conversation_store.compact(phone))
+
 
-    # Feedback Inmediato (UX)
-    await send_push_message(phone, "🧐 Recibido. Estoy leyendo tus documentos con Gemini Pro... Dame unos segundos.")
+# --- Buffer asíncrono de archivos (debounce 4s) ---
+async def process_buffered_files(payload: dict, job) -> dict:
+    """Trabajo 'file_extraction': lee los documentos con Gemini y deja los movimientos en el limbo."""
+    phone = payload["phone"]
+    files = payload.get("files") or []
 
     all_txs = []
     accounts_detected = set()
 
     # Procesar en paralelo o serie (Serie es más seguro para no saturar API)
-    for f in files:
+    for position, f in enumerate(files):
+        job.progress(position / len(files), f.get("filename") or os.path.basename(f["path"]))
         txs = await asyncio.to_thread(process_file_universal, f['path'], f['mime'])
         if txs:
             all_txs.extend(txs)
@@ -748,8 +784,8 @@ async def process_buffered_files(phone: str):
                 if t.get('account_hint'):
                     accounts_detected.add(t['account_hint'])
 
-    # Guardar en Limbo (DB)
-    save_pending_data(phone, all_txs)
+    # Guardar en Limbo (DB); un reintento lo sobreescribe con el mismo contenido
+    await asyncio.to_thread(save_pending_data, phone, all_txs)
     
     # Reporte Inteligente
     total = sum(t['amount'] for t in all_txs)
@@ -771,6 +807,12 @@ async def process_buffered_files(phone: str):
     
     target_phone = os.getenv("ADMIN_PHONE", phone)
     await send_push_message(target_phone, msg)
+    return {"files": len(files), "transactions": len(all_txs), "accounts": sorted(accounts_detected)}
+
+
+job_queue.register("file_extraction", process_buffered_files, label="Lectura de archivos", concurrency=2)
+job_queue.register("reembed_library", _run_library_sync, label="Re-indexación de la biblioteca", concurrency=1)
+job_queue.register("morning_briefing", _run_morning_briefing, label="Briefing matutino", concurrency=1, timeout=120)
 
 
 async def send_push_message(phone: str, text: str):
@@ -786,6 +828,25 @@ def health_check():
     return {"status": "online", "system": "AFI Core"}
 
 
+@app.get("/metrics")
+def metrics():
+    """Contadores internos de rendimiento (pool de DB, etc.)."""
+    return {
+        "db_pool": pool_stats(),
+        "schema_catalog": catalog_stats(),
+        "sql_sandbox": sandbox_stats(),
+        "answer_cache": answer_cache_stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "wisdom_index": wisdom.wisdom_stats(),
+        "llm_client": llm_client.llm_client_stats(),
+        "gemini_quota": quota_stats(),
+        "context_loader": context_loader.context_stats(),
+        "intent_router": intent_router.intent_stats(),
+        "tools": TOOLS.stats(),
+        "jobs": job_queue.job_stats(),
+    }
+
+
 @app.post("/webhook/whatsapp")
 async def receive_message(request: Request):
     data = await request.json()
@@ -811,21 +872,6 @@ async def receive_message(request: Request):
 
     reply_text = ""
 
-    # Memoria persistente para multimodal y texto
-    state = get_user_context(user_phone)
-    file_summary = state.get("file_context") if state else ""
-    current_mode = state.get("mode") if state else "NORMAL"
-
-    if not file_summary:
-        try:
-            raw_audit = get_financial_audit()
-            if raw_audit and "total_spent" in raw_audit and "Error" not in raw_audit:
-                file_summary = raw_audit
-                current_mode = "ONBOARDING"
-                save_user_context(user_phone, file_summary=raw_audit, mode="ONBOARDING")
-        except Exception as e:
-            print(f"⚠️ No hay CSV o error lectura: {e}")
-
     # Consolidar media (nuevo o legacy)
     media_payload = data.get("media")
     if not media_payload and data.get("media_path"):
@@ -848,14 +894,48 @@ async def receive_message(request: Request):
             filename = media_payload.get("filename") or media_payload.get("path")
             print(f"⏳ Buffering archivo: {filename}")
 
-            upload_buffers.setdefault(user_phone, []).append({"path": media_payload.get("path"), "mime": mime_raw, "filename": media_payload.get("filename")})
-            # Procesar de inmediato (sin esperar debounce)
-            await process_buffered_files(user_phone)
+            # La lectura con Gemini Pro va a la cola de trabajos: el webhook responde al toque
+            files = [{"path": media_payload.get("path"), "mime": mime_raw, "filename": media_payload.get("filename")}]
+            user_id = await asyncio.to_thread(_resolve_user_id, user_phone) if user_phone else None
+            job_id = await asyncio.to_thread(
+                job_queue.enqueue,
+                "file_extraction",
+                {"phone": user_phone, "files": files},
+                user_id=user_id,
+                phone=user_phone,
+                dedupe_key=f"{user_phone}:{media_payload.get('path')}",
+            )
+            await send_push_message(
+                user_phone,
+                f"🧐 Recibido (trabajo #{job_id}). Estoy leyendo tus documentos con Gemini Pro... Te aviso al terminar.",
+            )
             return {"status": "processed", "message": None}
 
         # Otros media (audio/imagen) -> procesar normal
-        wisdom_context = retrieve_wisdom(body, top_k=3)
-        user_profile = get_user_profile(user_phone)
+        # Memoria persistente y RAG en paralelo (el flujo de texto lo resuelve ai_router)
+        sources, timings = await context_loader.gather_timed(
+            "multimodal",
+            user=asyncio.to_thread(context_loader.load_user_row, user_phone),
+            wisdom=retrieve_wisdom(body, top_k=3),
+        )
+        print(f"⏱️ Contexto multimodal (ms): {timings}")
+        user_row = sources["user"] or context_loader.load_user_row(None)
+        state = user_row["state"]
+        file_summary = state.get("file_context") if state else ""
+        current_mode = state.get("mode") if state else "NORMAL"
+
+        if not file_summary:
+            try:
+                raw_audit = await asyncio.to_thread(get_financial_audit)
+                if raw_audit and "total_spent" in raw_audit and "Error" not in raw_audit:
+                    file_summary = raw_audit
+                    current_mode = "ONBOARDING"
+                    await asyncio.to_thread(save_user_context, user_phone, file_summary=raw_audit, mode="ONBOARDING")
+            except Exception as e:
+                print(f"⚠️ No hay CSV o error lectura: {e}")
+
+        wisdom_context = sources["wisdom"] or ""
+        user_profile = user_row["profile"]
         admin_incomplete = (
             user_profile
             and user_profile.get("role") == "admin"
@@ -863,8 +943,7 @@ async def receive_message(request: Request):
         )
 
         system_instruction = get_system_instruction(file_summary or "", current_mode or "NORMAL", wisdom_context, admin_incomplete)
-        reply_text = await asyncio.to_thread(
-            process_multimodal_request,
+        reply_text = await process_multimodal_request(
             body,
             media_payload.get("path"),
             media_payload.get("mime") or "application/octet-stream",
@@ -873,7 +952,7 @@ async def receive_message(request: Request):
         )
     else:
         # Flujo Texto Normal
-        reply_text = await asyncio.to_thread(ai_router, body, user)
+        reply_text = await ai_router(body, user)
 
     print(f"🧠 Gemini responde: {str(reply_text)[:80]}...")
 
@@ -899,9 +978,13 @@ async def receive_message(request: Request):
 async def start_scheduler():
     try:
         # Worker anti-ban
-        asyncio.create_task(mq_worker())
+        _spawn(mq_worker())
 
-        scheduler.add_job(send_morning_briefing, CronTrigger(hour=7, minute=0))
+        # Cola de trabajos durable (archivos, categorización masiva, biblioteca, briefing)
+        _spawn(job_queue.run_workers())
+        scheduler.add_job(purge_old_jobs, CronTrigger(hour=3, minute=30))
+
+        scheduler.add_job(schedule_morning_briefing, CronTrigger(hour=7, minute=0))
         
         # PRUEBA INMEDIATA (Deshabilitada para producción)
         # run_date = datetime.datetime.now() + datetime.timedelta(minutes=2)
@@ -911,9 +994,24 @@ async def start_scheduler():
         # Backup diario 03:00 AM
         scheduler.add_job(run_backup, CronTrigger(hour=3, minute=0))
 
+        # Biblioteca de libros: solo re-embebe PDFs nuevos o modificados (manifiesto wisdom_sources)
+        scheduler.add_job(sync_wisdom_library, CronTrigger(hour=4, minute=0))
+
+        # Corpus de sabiduría en RAM antes del primer mensaje
+        await asyncio.to_thread(wisdom.warm)
+
+        # Particiones mensuales de transactions (siempre N meses por delante)
+        scheduler.add_job(ensure_future_partitions, CronTrigger(hour=2, minute=30))
+
         # Omnicanalidad activada
         scheduler.add_job(check_emails, CronTrigger(minute="*/15"))
         scheduler.start()
         print("⏳ Scheduler iniciado: AFI ahora tiene vida propia.")
     except Exception as e:
         print(f"⚠️ Error iniciando scheduler: {e}")
+
+    # Fuera del event loop y después de arrancar el scheduler: un error de DB aquí no apaga los crons
+    try:
+        await asyncio.to_thread(ensure_future_partitions)
+    except Exception as e:
+        print(f"⚠️ Error creando particiones de transactions: {e}")
@@ -1,5 +1,4 @@
 import sys
-import time
 
 import pandas as pd
 
@@ -11,13 +10,15 @@ def ingest(csv_file):
     print(f"Inyectando {len(df)} registros en Postgres...")
 
     per_account = {}
-    for _, row in df.iterrows():
+    source = f"manual:{csv_file}"
+    # to_dict("records") evita el costo de iterrows; la normalización final la hace insert_transactions
+    for row in df.to_dict("records"):
         account_name = row.get("cuenta") or "Cuenta CSV"
         payload = {
             "date": row.get("fecha"),
-            "amount": float(row.get("monto", 0)),
+            "amount": row.get("monto", 0),
             "description": str(row.get("descripcion") or row.get("payee_name") or "Movimiento")[:200],
-            "import_source": f"manual:{csv_file}",
+            "import_source": source,
         }
         per_account.setdefault(account_name, []).append(payload)
 
@@ -28,10 +29,9 @@ def ingest(csv_file):
             if not account_id:
                 print(f"⚠️ No pude asegurar la cuenta {account_name}")
                 continue
-            inserted = insert_transactions(account_id, txs, import_source=f"manual:{csv_file}")
+            inserted = insert_transactions(account_id, txs, import_source=source)
             total_inserted += inserted
             print(f"   ✅ {inserted} movimientos en {account_name}")
-            time.sleep(0.01)
         except Exception as e:
             print(f"Error importando cuenta {account_name}: {e}")
 
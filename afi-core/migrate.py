@@ -0,0 +1,117 @@
+"""
+Migraciones versionadas del esquema.
+
+Cada archivo `migrations/NNNN_nombre.sql` se aplica una sola vez, en orden, y queda
+registrado en `schema_version`. Se ejecutan al arrancar (database.init_db) o por CLI:
+
+    python migrate.py            # aplica pendientes
+    python migrate.py status     # muestra versión actual y pendientes
+
+Un archivo que empiece con `-- migrate:no-transaction` se ejecuta fuera de transacción
+(necesario para CREATE INDEX CONCURRENTLY).
+"""
+import os
+import re
+import sys
+from pathlib import Path
+from typing import List, Set, Tuple
+
+MIGRATIONS_DIR = Path(os.getenv("MIGRATIONS_DIR", Path(__file__).resolve().parent / "migrations"))
+# Llave del advisory lock: evita que dos procesos migren a la vez.
+MIGRATION_LOCK_ID = 7310001
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+
+_FILENAME_RE = re.compile(r"^(\d{4})_([\w\-]+)\.sql$")
+
+
+def list_migrations() -> List[Tuple[int, str, Path]]:
+    """Devuelve (versión, nombre, ruta) ordenado por versión."""
+    migrations = []
+    if not MIGRATIONS_DIR.exists():
+        return migrations
+    for path in MIGRATIONS_DIR.iterdir():
+        match = _FILENAME_RE.match(path.name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), path))
+    return sorted(migrations)
+
+
+def _ensure_version_table(cur) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+
+
+def applied_versions(cur) -> Set[int]:
+    cur.execute("SELECT version FROM schema_version;")
+    return {row[0] for row in cur.fetchall()}
+
+
+def current_version(cur) -> int:
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version;")
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def _apply_one(cur, version: int, name: str, sql: str) -> None:
+    in_transaction = not sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+    if in_transaction:
+        cur.execute("BEGIN;")
+    try:
+        cur.execute(sql)
+        cur.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s);", (version, name))
+        if in_transaction:
+            cur.execute("COMMIT;")
+    except Exception:
+        if in_transaction:
+            cur.execute("ROLLBACK;")
+        raise
+
+
+def apply_migrations(cur) -> List[int]:
+    """
+    Aplica las migraciones pendientes usando un cursor en autocommit.
+    Devuelve la lista de versiones aplicadas en esta llamada.
+    """
+    _ensure_version_table(cur)
+    cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_ID,))
+    applied_now: List[int] = []
+    try:
+        done = applied_versions(cur)
+        for version, name, path in list_migrations():
+            if version in done:
+                continue
+            print(f"🛠️ Aplicando migración {version:04d}_{name}...")
+            _apply_one(cur, version, name, path.read_text(encoding="utf-8"))
+            applied_now.append(version)
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_ID,))
+    if applied_now:
+        print(f"✅ Esquema actualizado a la versión {applied_now[-1]:04d}.")
+    return applied_now
+
+
+def main(argv: List[str]) -> None:
+    from database import get_conn, wait_for_db
+
+    wait_for_db()
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            if argv and argv[0] == "status":
+                _ensure_version_table(cur)
+                done = applied_versions(cur)
+                print(f"📌 Versión actual: {current_version(cur):04d}")
+                pending = [f"{v:04d}_{n}" for v, n, _ in list_migrations() if v not in done]
+                print(f"⏳ Pendientes: {', '.join(pending) if pending else 'ninguna'}")
+                return
+            apply_migrations(cur)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,146 @@
+-- Esquema base consolidado (antes repartido entre database.init_db,
+-- db_ops._ensure_base_schema, sprint16_db_update.py y fix_schema_onboarding.py).
+-- Todas las sentencias son idempotentes para poder aplicarse sobre bases existentes.
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Memoria técnica por teléfono
+CREATE TABLE IF NOT EXISTS user_state (
+    phone TEXT PRIMARY KEY,
+    current_mode TEXT DEFAULT 'NORMAL',
+    file_context TEXT,
+    chat_history JSONB DEFAULT '[]'::jsonb,
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+ALTER TABLE user_state ADD COLUMN IF NOT EXISTS pending_file_data JSONB;
+
+-- Biblioteca RAG
+CREATE TABLE IF NOT EXISTS financial_wisdom (
+    id BIGSERIAL PRIMARY KEY,
+    content TEXT,
+    source VARCHAR(255),
+    metadata JSONB,
+    embedding VECTOR(768)
+);
+ALTER TABLE financial_wisdom ADD COLUMN IF NOT EXISTS source VARCHAR(255);
+ALTER TABLE financial_wisdom ADD COLUMN IF NOT EXISTS metadata JSONB;
+CREATE INDEX IF NOT EXISTS idx_financial_wisdom_embedding
+ON financial_wisdom USING ivfflat (embedding vector_cosine_ops);
+
+-- Usuarios (perfil personal)
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    phone TEXT UNIQUE NOT NULL,
+    name TEXT,
+    role TEXT DEFAULT 'user', -- 'admin' para Diego
+    profile_status TEXT DEFAULT 'incomplete', -- 'incomplete', 'active'
+    financial_goals TEXT, -- Resumen de metas (ej: 'Pagar deuda Nubank')
+    last_interaction TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Migrar esquema legado (phone como PK) a modelo con id entero
+ALTER TABLE users ADD COLUMN IF NOT EXISTS id SERIAL;
+ALTER TABLE users ALTER COLUMN phone SET NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_phone_unique ON users(phone);
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM information_schema.table_constraints tc
+        JOIN information_schema.key_column_usage kcu
+            ON tc.constraint_name = kcu.constraint_name
+        WHERE tc.table_name = 'users'
+          AND tc.constraint_type = 'PRIMARY KEY'
+          AND kcu.column_name = 'id'
+    ) THEN
+        ALTER TABLE users DROP CONSTRAINT IF EXISTS users_pkey;
+        ALTER TABLE users ADD CONSTRAINT users_pkey PRIMARY KEY (id);
+    END IF;
+END $$;
+
+-- Onboarding conversacional
+ALTER TABLE users ADD COLUMN IF NOT EXISTS onboarding_status VARCHAR(50) DEFAULT 'welcome';
+ALTER TABLE users ADD COLUMN IF NOT EXISTS archetype VARCHAR(50);
+
+-- Sesiones y OTPs para autenticación persistente
+CREATE TABLE IF NOT EXISTS sessions (
+    token TEXT PRIMARY KEY,
+    phone TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+CREATE TABLE IF NOT EXISTS otps (
+    phone TEXT PRIMARY KEY,
+    code TEXT NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Bóveda financiera
+CREATE TABLE IF NOT EXISTS currencies (
+    currency_code CHAR(3) PRIMARY KEY,
+    currency_name VARCHAR(50),
+    symbol VARCHAR(5)
+);
+
+CREATE TABLE IF NOT EXISTS master_categories (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(50) UNIQUE NOT NULL,
+    type VARCHAR(20) NOT NULL CHECK (type IN ('fixed', 'variable', 'savings'))
+);
+
+CREATE TABLE IF NOT EXISTS monthly_budgets (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    category_id INTEGER REFERENCES master_categories(id),
+    month DATE NOT NULL,
+    amount_limit DECIMAL(15,2) NOT NULL DEFAULT 0,
+    UNIQUE(user_id, category_id, month)
+);
+
+CREATE TABLE IF NOT EXISTS account_types (
+    type_id SERIAL PRIMARY KEY,
+    type_name VARCHAR(50) NOT NULL UNIQUE,
+    classification VARCHAR(20) NOT NULL DEFAULT 'ASSET'
+);
+
+CREATE TABLE IF NOT EXISTS accounts (
+    account_id SERIAL PRIMARY KEY,
+    account_name VARCHAR(100) NOT NULL UNIQUE,
+    account_type_id INT REFERENCES account_types(type_id),
+    currency_code CHAR(3) REFERENCES currencies(currency_code) DEFAULT 'COP',
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id SERIAL PRIMARY KEY,
+    account_id INT REFERENCES accounts(account_id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    amount NUMERIC(19, 4) NOT NULL,
+    description TEXT,
+    category VARCHAR(100),
+    status VARCHAR(20) DEFAULT 'CLEARED',
+    import_source VARCHAR(255),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS category_id INTEGER REFERENCES master_categories(id);
+
+-- Columnas adicionales para multi-tenant y HITL
+ALTER TABLE accounts ADD COLUMN IF NOT EXISTS user_id INTEGER DEFAULT 1;
+ALTER TABLE transactions
+    ADD COLUMN IF NOT EXISTS confidence_score FLOAT DEFAULT 1.0,
+    ADD COLUMN IF NOT EXISTS is_confirmed BOOLEAN DEFAULT FALSE,
+    ADD COLUMN IF NOT EXISTS review_needed BOOLEAN DEFAULT FALSE,
+    ADD COLUMN IF NOT EXISTS user_id INTEGER DEFAULT 1;
+
+CREATE INDEX IF NOT EXISTS idx_tx_date ON transactions(date);
+CREATE INDEX IF NOT EXISTS idx_monthly_budgets_user_month ON monthly_budgets(user_id, month);
+
+-- Datos semilla mínimos (la moneda/tipo por defecto del entorno se siembran en init_db)
+INSERT INTO currencies (currency_code, currency_name, symbol)
+VALUES ('COP', 'Peso Colombiano', '$')
+ON CONFLICT (currency_code) DO NOTHING;
+
+INSERT INTO account_types (type_name, classification)
+VALUES ('Wallet', 'ASSET')
+ON CONFLICT (type_name) DO NOTHING;
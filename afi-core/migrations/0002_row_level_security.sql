@@ -0,0 +1,21 @@
+-- Aislamiento por usuario (antes sprint18_rls.py).
+-- FORCE: el owner (afi_user) también respeta las políticas.
+-- NULLIF: tras el RESET del pool la variable queda en '' (no NULL) y ''::integer falla.
+
+ALTER TABLE transactions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE transactions FORCE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS user_isolation_tx ON transactions;
+CREATE POLICY user_isolation_tx ON transactions
+    USING (user_id = NULLIF(current_setting('app.current_user_id', true), '')::integer);
+
+ALTER TABLE accounts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE accounts FORCE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS user_isolation_acc ON accounts;
+CREATE POLICY user_isolation_acc ON accounts
+    USING (user_id = NULLIF(current_setting('app.current_user_id', true), '')::integer);
+
+ALTER TABLE monthly_budgets ENABLE ROW LEVEL SECURITY;
+ALTER TABLE monthly_budgets FORCE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS user_isolation_budget ON monthly_budgets;
+CREATE POLICY user_isolation_budget ON monthly_budgets
+    USING (user_id = NULLIF(current_setting('app.current_user_id', true), '')::integer);
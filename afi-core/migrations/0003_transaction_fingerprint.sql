@@ -0,0 +1,46 @@
+-- Huella determinista por movimiento: reimportar extractos, correos o audios no duplica.
+-- Debe coincidir con db_ops.transaction_fingerprint():
+--   md5(user|cuenta|fecha|monto(2 dec, mitad lejos de cero)|descripción normalizada|origen|ref|ordinal)
+-- Descripción normalizada: vacía/NULL -> 'Movimiento', todo espacio (\s, incluye tab y salto
+-- de línea) colapsado a uno, recortada y en minúsculas; igual que str.split() en Python.
+-- El ordinal numera movimientos idénticos legítimos, así que el backfill nunca choca
+-- con el índice único aunque ya existan duplicados.
+
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS tx_fingerprint VARCHAR(32);
+
+-- FORCE RLS filtraría todas las filas (sin app.current_user_id): se suspende solo para el backfill.
+ALTER TABLE transactions NO FORCE ROW LEVEL SECURITY;
+
+WITH numbered AS (
+    SELECT
+        transaction_id,
+        COALESCE(user_id, 1) AS uid,
+        COALESCE(account_id, 0) AS acc,
+        date,
+        ROUND(amount, 2) AS amt,
+        LOWER(BTRIM(REGEXP_REPLACE(COALESCE(NULLIF(description, ''), 'Movimiento'), '\s+', ' ', 'g'))) AS descr,
+        COALESCE(import_source, '') AS src,
+        ROW_NUMBER() OVER (
+            PARTITION BY
+                COALESCE(user_id, 1),
+                account_id,
+                date,
+                ROUND(amount, 2),
+                LOWER(BTRIM(REGEXP_REPLACE(COALESCE(NULLIF(description, ''), 'Movimiento'), '\s+', ' ', 'g'))),
+                import_source
+            ORDER BY transaction_id
+        ) - 1 AS occurrence
+    FROM transactions
+    WHERE tx_fingerprint IS NULL
+)
+UPDATE transactions t
+SET tx_fingerprint = MD5(
+    n.uid || '|' || n.acc || '|' || TO_CHAR(n.date, 'YYYY-MM-DD') || '|' || n.amt || '|'
+    || n.descr || '|' || n.src || '|' || '' || '|' || n.occurrence
+)
+FROM numbered n
+WHERE t.transaction_id = n.transaction_id;
+
+ALTER TABLE transactions FORCE ROW LEVEL SECURITY;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_transactions_fingerprint ON transactions (tx_fingerprint);
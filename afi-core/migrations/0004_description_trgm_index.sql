@@ -0,0 +1,15 @@
+-- Índice trigram sobre LOWER(description) para `LIKE '%kw%'` (categorizer.apply_category_rules).
+-- pg_trgm es contrib: si la imagen de Postgres no lo trae se omite sin romper el arranque
+-- (la categorización sigue funcionando, solo que con seq scan).
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXECUTE 'CREATE INDEX IF NOT EXISTS idx_tx_description_trgm
+                 ON transactions USING gin (LOWER(description) gin_trgm_ops)';
+    ELSE
+        RAISE NOTICE 'pg_trgm no disponible: se omite idx_tx_description_trgm';
+    END IF;
+END
+$$;
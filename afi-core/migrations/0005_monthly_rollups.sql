@@ -0,0 +1,122 @@
+-- Agregados mensuales (gasto, ingreso, conteos) por usuario/cuenta/categoría/mes.
+-- Se mantienen por triggers de sentencia con tablas de transición: un INSERT de 10k
+-- filas (COPY de un extracto) o un UPDATE masivo de categorías ajusta la rollup
+-- en una sola sentencia agregada, no fila por fila.
+-- Reconstrucción completa: `python rollups.py rebuild [user_id]`.
+-- Convención: spend es negativo (suma de montos < 0), income positivo.
+
+CREATE TABLE IF NOT EXISTS monthly_rollups (
+    user_id INTEGER NOT NULL,
+    account_id INTEGER NOT NULL DEFAULT 0,
+    category VARCHAR(100) NOT NULL DEFAULT '',
+    month DATE NOT NULL,
+    spend NUMERIC(19, 4) NOT NULL DEFAULT 0,
+    income NUMERIC(19, 4) NOT NULL DEFAULT 0,
+    spend_count INTEGER NOT NULL DEFAULT 0,
+    income_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, account_id, category, month)
+);
+
+CREATE INDEX IF NOT EXISTS idx_monthly_rollups_user_month ON monthly_rollups (user_id, month);
+
+-- Aplica un delta: sign = 1 para filas nuevas, -1 para filas que salen.
+-- Dinámico porque new_rows/old_rows solo existen según el evento y el SQL estático
+-- las resolvería al planificar.
+CREATE OR REPLACE FUNCTION monthly_rollups_apply_delta() RETURNS trigger AS $$
+DECLARE
+    delta_sql TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        delta_sql := 'SELECT 1 AS sign, user_id, account_id, category, date, amount FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        delta_sql := 'SELECT -1 AS sign, user_id, account_id, category, date, amount FROM old_rows';
+    ELSE
+        delta_sql := 'SELECT 1 AS sign, user_id, account_id, category, date, amount FROM new_rows
+                      UNION ALL
+                      SELECT -1 AS sign, user_id, account_id, category, date, amount FROM old_rows';
+    END IF;
+
+    EXECUTE format($sql$
+        INSERT INTO monthly_rollups AS r (user_id, account_id, category, month, spend, income, spend_count, income_count)
+        SELECT
+            COALESCE(user_id, 1),
+            COALESCE(account_id, 0),
+            COALESCE(category, ''),
+            date_trunc('month', date)::date,
+            SUM(sign * LEAST(amount, 0)),
+            SUM(sign * GREATEST(amount, 0)),
+            SUM(sign * (amount < 0)::int),
+            SUM(sign * (amount > 0)::int)
+        FROM (%s) AS delta
+        WHERE date IS NOT NULL AND amount IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (user_id, account_id, category, month) DO UPDATE SET
+            spend = r.spend + EXCLUDED.spend,
+            income = r.income + EXCLUDED.income,
+            spend_count = r.spend_count + EXCLUDED.spend_count,
+            income_count = r.income_count + EXCLUDED.income_count
+    $sql$, delta_sql);
+
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM monthly_rollups WHERE spend_count = 0 AND income_count = 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Postgres no admite tablas de transición en un trigger con varios eventos: uno por evento.
+DROP TRIGGER IF EXISTS trg_monthly_rollups_ins ON transactions;
+CREATE TRIGGER trg_monthly_rollups_ins
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION monthly_rollups_apply_delta();
+
+DROP TRIGGER IF EXISTS trg_monthly_rollups_upd ON transactions;
+CREATE TRIGGER trg_monthly_rollups_upd
+    AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION monthly_rollups_apply_delta();
+
+DROP TRIGGER IF EXISTS trg_monthly_rollups_del ON transactions;
+CREATE TRIGGER trg_monthly_rollups_del
+    AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION monthly_rollups_apply_delta();
+
+-- Reconstrucción desde transactions (todo o un usuario).
+CREATE OR REPLACE FUNCTION rebuild_monthly_rollups(p_user_id INTEGER DEFAULT NULL) RETURNS INTEGER AS $$
+DECLARE
+    affected INTEGER;
+BEGIN
+    DELETE FROM monthly_rollups WHERE p_user_id IS NULL OR user_id = p_user_id;
+    INSERT INTO monthly_rollups (user_id, account_id, category, month, spend, income, spend_count, income_count)
+    SELECT
+        COALESCE(user_id, 1),
+        COALESCE(account_id, 0),
+        COALESCE(category, ''),
+        date_trunc('month', date)::date,
+        SUM(LEAST(amount, 0)),
+        SUM(GREATEST(amount, 0)),
+        COUNT(*) FILTER (WHERE amount < 0),
+        COUNT(*) FILTER (WHERE amount > 0)
+    FROM transactions
+    WHERE date IS NOT NULL AND amount IS NOT NULL
+      AND (p_user_id IS NULL OR COALESCE(user_id, 1) = p_user_id)
+    GROUP BY 1, 2, 3, 4
+    HAVING COUNT(*) FILTER (WHERE amount <> 0) > 0;
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Mismo aislamiento que transactions para lecturas con contexto de usuario.
+-- Sin FORCE: el trigger escribe como owner aunque la sesión no tenga app.current_user_id.
+ALTER TABLE monthly_rollups ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS user_isolation_rollups ON monthly_rollups;
+CREATE POLICY user_isolation_rollups ON monthly_rollups
+    USING (user_id = NULLIF(current_setting('app.current_user_id', true), '')::integer);
+
+-- Carga inicial
+ALTER TABLE transactions NO FORCE ROW LEVEL SECURITY;
+SELECT rebuild_monthly_rollups();
+ALTER TABLE transactions FORCE ROW LEVEL SECURITY;
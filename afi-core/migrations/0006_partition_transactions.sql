@@ -0,0 +1,118 @@
+-- Particionado declarativo de transactions por mes (RANGE sobre date).
+-- Consultas del mes actual/anterior solo tocan una partición pequeña y archivar es
+-- un DETACH (partitions.py) en vez de un DELETE masivo.
+--
+-- Postgres exige que las claves únicas incluyan la columna de partición:
+--   PK (transaction_id, date) y huella única (tx_fingerprint, date). La huella ya incluye
+--   la fecha, así que la deduplicación de db_ops (ON CONFLICT DO NOTHING) no cambia.
+-- Filas sin partición (fechas fuera de rango o NULL) caen en transactions_default;
+-- ensure_transaction_partition() las muda al crear la partición de su mes.
+
+-- 1. Apartar la tabla actual liberando los nombres de índices/constraints
+ALTER TABLE transactions RENAME TO transactions_legacy;
+ALTER TABLE transactions_legacy NO FORCE ROW LEVEL SECURITY;
+ALTER TABLE transactions_legacy RENAME CONSTRAINT transactions_pkey TO transactions_legacy_pkey;
+DROP INDEX IF EXISTS idx_tx_date;
+DROP INDEX IF EXISTS uq_transactions_fingerprint;
+DROP INDEX IF EXISTS idx_tx_description_trgm;
+DROP TRIGGER IF EXISTS trg_monthly_rollups_ins ON transactions_legacy;
+DROP TRIGGER IF EXISTS trg_monthly_rollups_upd ON transactions_legacy;
+DROP TRIGGER IF EXISTS trg_monthly_rollups_del ON transactions_legacy;
+
+-- 2. Tabla particionada con las mismas columnas y defaults (incluido el SERIAL)
+CREATE TABLE transactions (
+    LIKE transactions_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE INCLUDING COMMENTS,
+    PRIMARY KEY (transaction_id, date),
+    FOREIGN KEY (account_id) REFERENCES accounts(account_id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES master_categories(id)
+) PARTITION BY RANGE (date);
+
+CREATE TABLE transactions_default PARTITION OF transactions DEFAULT;
+
+-- La secuencia del SERIAL pasa a la tabla nueva (si no, el DROP de la legacy la borraría)
+DO $$
+DECLARE
+    seq TEXT := pg_get_serial_sequence('transactions_legacy', 'transaction_id');
+BEGIN
+    IF seq IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY transactions.transaction_id', seq);
+    END IF;
+END
+$$;
+
+-- 3. Gestión de particiones mensuales (transactions_pYYYY_MM)
+CREATE OR REPLACE FUNCTION ensure_transaction_partition(p_month DATE) RETURNS TEXT AS $$
+DECLARE
+    lo DATE := date_trunc('month', p_month)::date;
+    hi DATE := (date_trunc('month', p_month) + INTERVAL '1 month')::date;
+    part TEXT := format('transactions_p%s', to_char(date_trunc('month', p_month), 'YYYY_MM'));
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN part;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part);
+    -- Lo que haya caído en DEFAULT para ese mes se muda antes de adjuntar (si no, ATTACH falla)
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM transactions_default WHERE date >= %L AND date < %L RETURNING *)
+         INSERT INTO %I SELECT * FROM moved',
+        lo, hi, part
+    );
+    EXECUTE format('ALTER TABLE transactions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, lo, hi);
+    RETURN part;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ensure_transaction_partitions(p_from DATE, p_to DATE) RETURNS INTEGER AS $$
+DECLARE
+    month_cursor DATE := date_trunc('month', p_from)::date;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_cursor <= p_to LOOP
+        IF to_regclass(format('transactions_p%s', to_char(month_cursor, 'YYYY_MM'))) IS NULL THEN
+            PERFORM ensure_transaction_partition(month_cursor);
+            created := created + 1;
+        END IF;
+        month_cursor := (month_cursor + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 4. Particiones para los meses con datos y los próximos 3; luego copiar
+SELECT ensure_transaction_partition(m)
+FROM (SELECT DISTINCT date_trunc('month', date)::date AS m FROM transactions_legacy WHERE date IS NOT NULL) months;
+SELECT ensure_transaction_partitions(CURRENT_DATE, (CURRENT_DATE + INTERVAL '3 months')::date);
+
+INSERT INTO transactions SELECT * FROM transactions_legacy;
+DROP TABLE transactions_legacy;
+
+-- 5. Índices (se propagan a cada partición, también a las futuras)
+CREATE INDEX IF NOT EXISTS idx_tx_date ON transactions (date);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_transactions_fingerprint ON transactions (tx_fingerprint, date);
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        EXECUTE 'CREATE INDEX IF NOT EXISTS idx_tx_description_trgm
+                 ON transactions USING gin (LOWER(description) gin_trgm_ops)';
+    END IF;
+END
+$$;
+
+-- 6. RLS y rollups, igual que antes (las políticas del padre aplican a las consultas vía padre)
+ALTER TABLE transactions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE transactions FORCE ROW LEVEL SECURITY;
+CREATE POLICY user_isolation_tx ON transactions
+    USING (user_id = NULLIF(current_setting('app.current_user_id', true), '')::integer);
+
+CREATE TRIGGER trg_monthly_rollups_ins
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION monthly_rollups_apply_delta();
+CREATE TRIGGER trg_monthly_rollups_upd
+    AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION monthly_rollups_apply_delta();
+CREATE TRIGGER trg_monthly_rollups_del
+    AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION monthly_rollups_apply_delta();
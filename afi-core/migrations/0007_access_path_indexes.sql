@@ -0,0 +1,16 @@
+-- Índices para los patrones de acceso reales (ver plan_check.py, que los vigila).
+-- Las políticas RLS filtran por user_id en cada consulta: sin índice que empiece por
+-- user_id todo query con contexto de usuario era seq scan + filtro.
+
+-- Rangos de fechas por usuario (briefing, "cuánto gasté en...", RLS) y agregados por
+-- categoría: INCLUDE permite index-only scan sin visitar el heap.
+CREATE INDEX IF NOT EXISTS idx_tx_user_date
+    ON transactions (user_id, date) INCLUDE (amount, category);
+
+-- Historial de una cuenta (extractos, conciliación)
+CREATE INDEX IF NOT EXISTS idx_tx_account_date ON transactions (account_id, date);
+
+-- Búsqueda de cuentas por usuario (email_agent, tools.create_account_tool bajo RLS)
+CREATE INDEX IF NOT EXISTS idx_accounts_user_name ON accounts (user_id, account_name);
+
+-- Búsqueda por descripción: idx_tx_description_trgm (0004/0006) cuando hay pg_trgm.
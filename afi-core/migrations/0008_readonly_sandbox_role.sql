@@ -0,0 +1,28 @@
+-- Rol de solo lectura para el SQL que genera el agente (sql_sandbox.py hace SET LOCAL ROLE).
+-- No es owner de nada: las políticas RLS le aplican siempre y solo ve las tablas analíticas
+-- del catálogo (schema_catalog.ANALYTICS_CATALOG). Sin permisos sobre las particiones
+-- individuales: se consulta vía la tabla padre.
+-- Crear roles requiere CREATEROLE; si el usuario de la app no lo tiene, se avisa y el
+-- sandbox sigue funcionando con transacción read-only + timeouts.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'afi_readonly') THEN
+        CREATE ROLE afi_readonly NOLOGIN;
+    END IF;
+    EXECUTE format('GRANT afi_readonly TO %I', current_user);
+EXCEPTION WHEN insufficient_privilege THEN
+    RAISE NOTICE 'Sin privilegio para crear/otorgar afi_readonly; el sandbox correrá sin SET ROLE';
+END
+$$;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'afi_readonly') THEN
+        GRANT USAGE ON SCHEMA public TO afi_readonly;
+        GRANT SELECT ON transactions, monthly_rollups, accounts, account_types,
+                        monthly_budgets, master_categories, currencies
+            TO afi_readonly;
+    END IF;
+END
+$$;
@@ -0,0 +1,54 @@
+-- Versión de datos por usuario: cada sentencia que cambia sus movimientos, cuentas o
+-- presupuestos la incrementa. answer_cache.py la usa para invalidar respuestas cacheadas
+-- (una respuesta calculada con la versión N no se sirve si ya hay N+1).
+
+CREATE TABLE IF NOT EXISTS data_versions (
+    user_id INTEGER PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Un bump por usuario afectado y por sentencia (no por fila), igual que monthly_rollups.
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+DECLARE
+    users_sql TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        users_sql := 'SELECT user_id FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        users_sql := 'SELECT user_id FROM old_rows';
+    ELSE
+        users_sql := 'SELECT user_id FROM new_rows UNION SELECT user_id FROM old_rows';
+    END IF;
+
+    -- ORDER BY: orden de bloqueo estable entre sentencias concurrentes
+    EXECUTE format($sql$
+        INSERT INTO data_versions AS v (user_id, version, updated_at)
+        SELECT DISTINCT COALESCE(user_id, 1), 1, CURRENT_TIMESTAMP FROM (%s) AS affected
+        ORDER BY 1
+        ON CONFLICT (user_id) DO UPDATE SET version = v.version + 1, updated_at = CURRENT_TIMESTAMP
+    $sql$, users_sql);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    tbl TEXT;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['transactions', 'accounts', 'monthly_budgets'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_data_version_ins ON %I', tbl);
+        EXECUTE format('CREATE TRIGGER trg_data_version_ins AFTER INSERT ON %I
+                        REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()', tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_data_version_upd ON %I', tbl);
+        EXECUTE format('CREATE TRIGGER trg_data_version_upd AFTER UPDATE ON %I
+                        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()', tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_data_version_del ON %I', tbl);
+        EXECUTE format('CREATE TRIGGER trg_data_version_del AFTER DELETE ON %I
+                        REFERENCING OLD TABLE AS old_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()', tbl);
+    END LOOP;
+END
+$$;
@@ -0,0 +1,13 @@
+-- Caché persistente de embeddings (embedding_cache.py). La clave es el sha256 de
+-- modelo|task_type|texto normalizado: no se guarda el texto de las preguntas.
+-- REAL[] en vez de vector(N) para no atar la tabla a la dimensión de un modelo.
+
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    cache_key CHAR(64) PRIMARY KEY,
+    model VARCHAR(100) NOT NULL,
+    task_type VARCHAR(50) NOT NULL,
+    embedding REAL[] NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_embedding_cache_created ON embedding_cache (created_at);
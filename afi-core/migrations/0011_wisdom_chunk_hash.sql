@@ -0,0 +1,23 @@
+-- Checkpoint por fragmento para la ingesta de libros (embedding_pipeline.py): cada fila de
+-- financial_wisdom guarda el sha256 de su texto y una ingesta interrumpida retoma solo
+-- los fragmentos que faltan, sin borrar el libro entero.
+
+ALTER TABLE financial_wisdom ADD COLUMN IF NOT EXISTS chunk_hash CHAR(64);
+ALTER TABLE financial_wisdom ADD COLUMN IF NOT EXISTS chunk_index INTEGER;
+
+-- ingest_books.py guardaba la fuente solo en metadata
+UPDATE financial_wisdom SET source = metadata->>'source'
+WHERE source IS NULL AND metadata->>'source' IS NOT NULL;
+
+UPDATE financial_wisdom SET chunk_hash = encode(sha256(convert_to(COALESCE(content, ''), 'UTF8')), 'hex')
+WHERE chunk_hash IS NULL;
+
+-- Un mismo fragmento repetido dentro de un libro no aporta nada al RAG
+DELETE FROM financial_wisdom fw
+USING financial_wisdom dup
+WHERE fw.source IS NOT DISTINCT FROM dup.source
+  AND fw.chunk_hash = dup.chunk_hash
+  AND fw.id > dup.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_financial_wisdom_source_chunk
+ON financial_wisdom (source, chunk_hash);
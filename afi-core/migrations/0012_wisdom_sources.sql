@@ -0,0 +1,25 @@
+-- Manifiesto de la biblioteca de libros (rag_ingest.ingest_library). Un PDF se re-procesa
+-- solo si cambió su contenido (sha256 del archivo), los parámetros de chunking o el modelo
+-- de embedding; status = 'indexing' marca un re-index a medias que la próxima corrida retoma.
+
+CREATE TABLE IF NOT EXISTS wisdom_sources (
+    source VARCHAR(255) PRIMARY KEY,
+    file_hash CHAR(64) NOT NULL,
+    file_size BIGINT,
+    page_count INTEGER,
+    chunk_size INTEGER NOT NULL,
+    chunk_overlap INTEGER NOT NULL,
+    embedding_model VARCHAR(100) NOT NULL,
+    chunk_count INTEGER,
+    status VARCHAR(20) NOT NULL DEFAULT 'indexing',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- El modelo forma parte del checkpoint: al cambiarlo, los vectores nuevos conviven con los
+-- viejos hasta que el libro termina y recién ahí se borran los del modelo anterior.
+ALTER TABLE financial_wisdom ADD COLUMN IF NOT EXISTS embedding_model VARCHAR(100);
+UPDATE financial_wisdom SET embedding_model = 'models/text-embedding-004' WHERE embedding_model IS NULL;
+
+DROP INDEX IF EXISTS idx_financial_wisdom_source_chunk;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_financial_wisdom_source_chunk_model
+ON financial_wisdom (source, chunk_hash, embedding_model);
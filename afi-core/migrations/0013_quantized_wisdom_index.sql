@@ -0,0 +1,19 @@
+-- Índice compacto de primera pasada para financial_wisdom (vector_index.py, modo 'binary'):
+-- HNSW de expresión sobre binary_quantize(embedding) (1 bit por dimensión, ~32x menos que
+-- float32). No reescribe filas: las existentes se indexan al crear el índice y las nuevas
+-- al insertarse. El `vector` float original sigue siendo el dato para el re-ranking exacto.
+-- halfvec/binary_quantize existen desde pgvector 0.7; con versiones anteriores se omite.
+
+DO $$
+DECLARE
+    ext_version TEXT;
+BEGIN
+    SELECT extversion INTO ext_version FROM pg_extension WHERE extname = 'vector';
+    IF ext_version IS NOT NULL AND string_to_array(ext_version, '.')::int[] >= ARRAY[0, 7, 0] THEN
+        EXECUTE 'CREATE INDEX IF NOT EXISTS idx_financial_wisdom_embedding_bit ON financial_wisdom
+                 USING hnsw ((binary_quantize(embedding)::bit(768)) bit_hamming_ops)';
+    ELSE
+        RAISE NOTICE 'pgvector % sin halfvec/bit: se omite idx_financial_wisdom_embedding_bit', ext_version;
+    END IF;
+END
+$$;
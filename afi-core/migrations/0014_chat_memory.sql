@@ -0,0 +1,8 @@
+-- Memoria de conversación por usuario (conversation_store.py). Reemplaza la lista global
+-- main.chat_history: los turnos recientes van en user_state.chat_history (columna que
+-- existía sin uso) y los más viejos se condensan en chat_summary.
+
+ALTER TABLE user_state ADD COLUMN IF NOT EXISTS chat_summary TEXT;
+ALTER TABLE user_state ADD COLUMN IF NOT EXISTS chat_updated_at TIMESTAMP;
+UPDATE user_state SET chat_history = '[]'::jsonb WHERE chat_history IS NULL;
+ALTER TABLE user_state ALTER COLUMN chat_history SET NOT NULL;
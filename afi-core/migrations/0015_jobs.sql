@@ -0,0 +1,38 @@
+-- Cola de trabajos en segundo plano (job_queue.py): categorización masiva, extracción de
+-- archivos, re-embedding de la biblioteca y reportes. Sobrevive a reinicios y deploys: un
+-- trabajo 'running' cuyo lease (locked_until) venció lo retoma otro worker.
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',  -- queued | running | done | failed
+    dedupe_key TEXT,
+    user_id INTEGER,
+    phone TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    progress REAL NOT NULL DEFAULT 0,
+    progress_note TEXT,
+    result JSONB,
+    error TEXT,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by TEXT,
+    locked_until TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Idempotencia al encolar: el mismo trabajo (kind + dedupe_key) no se duplica mientras está en curso
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe
+    ON jobs (kind, dedupe_key) WHERE dedupe_key IS NOT NULL AND status IN ('queued', 'running');
+
+-- Lo que busca el worker (FOR UPDATE SKIP LOCKED): pendientes listos y leases vencidos
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (run_after, id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (locked_until) WHERE status = 'running';
+
+-- "¿Ya terminó?": últimos trabajos del usuario
+CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_jobs_phone ON jobs (phone, created_at DESC);
@@ -0,0 +1,8 @@
+-- Trabajos que deben correr una sola vez por clave (p. ej. el briefing del día): a
+-- diferencia de dedupe_key, once_key también bloquea cuando el trabajo ya terminó ('done').
+-- Un trabajo 'failed' libera la clave para poder encolarlo de nuevo.
+
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS once_key TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_once
+    ON jobs (kind, once_key) WHERE once_key IS NOT NULL AND status <> 'failed';
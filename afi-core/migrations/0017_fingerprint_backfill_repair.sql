@@ -0,0 +1,54 @@
+-- Repara huellas del backfill de 0003 que no coincidían con db_ops.transaction_fingerprint():
+-- la normalización vieja recortaba solo espacios (no tab/salto de línea) y usaba '' para una
+-- descripción NULL/vacía en vez de 'Movimiento'. Al reimportar, esas filas entraban duplicadas.
+-- Solo se tocan filas cuya huella actual es exactamente la del backfill viejo (las insertadas
+-- desde Python llevan ref/ordinal propios y no coinciden), y solo si la normalización cambia.
+-- Si la huella corregida ya existe (el duplicado ya entró), la fila vieja se deja como está.
+
+ALTER TABLE transactions NO FORCE ROW LEVEL SECURITY;
+
+WITH keyed AS (
+    SELECT
+        transaction_id,
+        date,
+        tx_fingerprint,
+        COALESCE(user_id, 1) AS uid,
+        COALESCE(account_id, 0) AS acc,
+        ROUND(amount, 2) AS amt,
+        COALESCE(import_source, '') AS src,
+        LOWER(REGEXP_REPLACE(BTRIM(COALESCE(description, '')), '\s+', ' ', 'g')) AS old_descr,
+        LOWER(BTRIM(REGEXP_REPLACE(COALESCE(NULLIF(description, ''), 'Movimiento'), '\s+', ' ', 'g'))) AS new_descr,
+        account_id,
+        import_source
+    FROM transactions
+),
+numbered AS (
+    SELECT
+        k.*,
+        ROW_NUMBER() OVER (
+            PARTITION BY uid, account_id, date, amt, old_descr, import_source ORDER BY transaction_id
+        ) - 1 AS old_occ,
+        ROW_NUMBER() OVER (
+            PARTITION BY uid, account_id, date, amt, new_descr, import_source ORDER BY transaction_id
+        ) - 1 AS new_occ
+    FROM keyed k
+),
+repaired AS (
+    SELECT
+        transaction_id,
+        date,
+        MD5(uid || '|' || acc || '|' || TO_CHAR(date, 'YYYY-MM-DD') || '|' || amt || '|'
+            || new_descr || '|' || src || '|' || '' || '|' || new_occ) AS fingerprint
+    FROM numbered
+    WHERE old_descr <> new_descr
+      AND tx_fingerprint = MD5(uid || '|' || acc || '|' || TO_CHAR(date, 'YYYY-MM-DD') || '|' || amt || '|'
+                               || old_descr || '|' || src || '|' || '' || '|' || old_occ)
+)
+UPDATE transactions t
+SET tx_fingerprint = r.fingerprint
+FROM repaired r
+WHERE t.transaction_id = r.transaction_id
+  AND t.date = r.date
+  AND NOT EXISTS (SELECT 1 FROM transactions d WHERE d.tx_fingerprint = r.fingerprint);
+
+ALTER TABLE transactions FORCE ROW LEVEL SECURITY;
@@ -1,6 +1,8 @@
 import os
 import json
+import asyncio
 import google.generativeai as genai
+import llm_client
 from db_ops import execute_insert, execute_query
 
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
@@ -47,8 +49,9 @@ def create_initial_budget(user_id, income_guess):
         execute_insert("INSERT INTO monthly_budgets (user_id, category_id, month, amount_limit) VALUES (%s, %s, CURRENT_DATE, %s) ON CONFLICT (user_id, category_id, month) DO UPDATE SET amount_limit = EXCLUDED.amount_limit", (user_id, cat_map['Ahorro'], income_guess * 0.20)) # Asumiendo un 20%
 
 
-def process_onboarding(user_query, phone):
-    state = get_user_state(phone)
+async def process_onboarding(user_query, phone):
+    # Corre en el event loop de /chat/query: DB en hilos cortos, Gemini vía llm_client
+    state = await asyncio.to_thread(get_user_state, phone)
     user_id = state["id"]
     status = state["status"]
     
@@ -57,7 +60,7 @@ def process_onboarding(user_query, phone):
     # --- FLUJO DE ENTREVISTA ---
     
     if status == "welcome":
-        update_status(phone, "interview_1")
+        await asyncio.to_thread(update_status, phone, "interview_1")
         return {
             "answer": "👋 ¡Hola! Soy AFI. Veo que eres nuevo aquí. Mi base de datos está limpia y lista para escribir tu historia financiera.\n\nPara configurar tu tablero, necesito saber: **¿Cuál es tu ingreso mensual aproximado (para calibrar los presupuestos)?**",
             "viz_type": "text"
@@ -70,9 +73,9 @@ def process_onboarding(user_query, phone):
             income = int(''.join(filter(str.isdigit, user_query)))
             if income <= 0:
                 raise ValueError("Income must be positive.")
-            create_initial_budget(user_id, income)
+            await asyncio.to_thread(create_initial_budget, user_id, income)
             msg = f"Entendido. He creado un presupuesto base de ${income:,.0f} (que afinaremos luego).\n\nAhora, calibremo el psicólogo: **¿El dinero para ti es SEGURIDAD, LIBERTAD o ESTATUS?**"
-            update_status(phone, "interview_2")
+            await asyncio.to_thread(update_status, phone, "interview_2")
         except ValueError:
             msg = "No entendí el número. ¿Podrías escribir solo el monto aproximado de tus ingresos? (Ej: 5000000)"
         except Exception as e:
@@ -89,17 +92,17 @@ def process_onboarding(user_query, phone):
         DEFINE ESTRATEGIA: Una frase corta.
         SALIDA JSON: {{ "archetype": "...", "strategy": "..." }}
         """
-        model = genai.GenerativeModel("gemini-1.5-flash")
         try:
-            res = json.loads(model.generate_content(prompt).text.replace("```json",""""").replace("```","""""))
-            update_status(phone, "complete", archetype=res['archetype'])
+            response = await llm_client.generate("gemini-1.5-flash", prompt)
+            res = json.loads(response.text.replace("```json",""""").replace("```","""""))
+            await asyncio.to_thread(update_status, phone, "complete", archetype=res['archetype'])
             return {
                 "answer": f"Perfil: **{res['archetype']}**. Estrategia: {res['strategy']}.\n\n✅ **Sistema Configurado.**\nYa puedes subir tus extractos o registrar gastos por voz.",
                 "viz_type": "text"
             }
         except Exception as e:
              print(f"Error extracting archetype or strategy: {e}. Defaulting to 'Explorador'.")
-             update_status(phone, "complete", archetype="Explorador")
+             await asyncio.to_thread(update_status, phone, "complete", archetype="Explorador")
              return {"answer": "¡Listo! Perfil configurado. Ya puedes usar el sistema.", "viz_type": "text"}
 
     return None
\ No newline at end of file
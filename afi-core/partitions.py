@@ -0,0 +1,124 @@
+"""
+Mantenimiento de las particiones mensuales de `transactions` (migrations/0006).
+
+    python partitions.py ensure              # crea las de este mes y los próximos N
+    python partitions.py list                # particiones con filas estimadas
+    python partitions.py detach 2019-05      # archiva un mes (DETACH, queda como tabla suelta)
+    python partitions.py detach 2019-05 --drop
+"""
+import datetime
+import os
+import sys
+from typing import Iterable, List, Optional
+
+from database import get_conn
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+# Meses con partición ya verificada en este proceso (evita el round-trip en cada inserción)
+_ensured_months = set()
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"transactions_p{month.year:04d}_{month.month:02d}"
+
+
+def _parse_month(value: str) -> datetime.date:
+    return datetime.datetime.strptime(value[:7], "%Y-%m").date()
+
+
+def ensure_future_partitions(months_ahead: Optional[int] = None) -> int:
+    """Garantiza particiones desde el mes actual hasta `months_ahead` meses adelante. Devuelve cuántas creó."""
+    months_ahead = PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT ensure_transaction_partitions(CURRENT_DATE, (CURRENT_DATE + make_interval(months => %s))::date);",
+                (months_ahead,),
+            )
+            created = cur.fetchone()[0]
+    if created:
+        print(f"🗂️ Particiones de transactions creadas: {created}")
+    return created
+
+
+def ensure_partitions_for(dates: Iterable[datetime.date]) -> int:
+    """
+    Garantiza la partición de cada mes presente en `dates` (extractos históricos incluidos),
+    para que la carga no caiga en transactions_default. Solo los meses con datos, no todo el
+    rango entre min y max: una fecha mal parseada no crea décadas de particiones vacías.
+    Lo que ya estaba en DEFAULT para ese mes se muda al crearla (ensure_transaction_partition).
+    """
+    months = {day.replace(day=1) for day in dates if day} - _ensured_months
+    if not months:
+        return 0
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT ensure_transaction_partition(m)
+                FROM unnest(%s::date[]) AS m
+                WHERE to_regclass(format('transactions_p%%s', to_char(m, 'YYYY_MM'))) IS NULL;
+                """,
+                (sorted(months),),
+            )
+            created = cur.rowcount
+    _ensured_months.update(months)
+    if created:
+        print(f"🗂️ Particiones de transactions creadas para la carga: {created}")
+    return created
+
+
+def list_partitions() -> List[dict]:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), GREATEST(c.reltuples, 0)::bigint
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'transactions'::regclass
+                ORDER BY c.relname;
+                """
+            )
+            return [{"name": name, "bounds": bounds, "rows_estimate": rows} for name, bounds, rows in cur.fetchall()]
+
+
+def detach_partition(month: datetime.date, drop: bool = False) -> bool:
+    """
+    Archiva un mes: DETACH de su partición (instantáneo, sin DELETE fila a fila).
+    La rollup de ese mes se elimina en la misma transacción para que cuadre con transactions.
+    """
+    part = partition_name(month)
+    with get_conn() as conn:
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s);", (part,))
+            if cur.fetchone()[0] is None:
+                print(f"⚠️ No existe la partición {part}.")
+                return False
+            cur.execute("DELETE FROM monthly_rollups WHERE month = %s;", (month.replace(day=1),))
+            cur.execute(f'ALTER TABLE transactions DETACH PARTITION "{part}";')
+            # DETACH no dispara triggers de fila: se invalida a mano la caché de respuestas
+            cur.execute("UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP;")
+            if drop:
+                cur.execute(f'DROP TABLE "{part}";')
+    print(f"📦 Partición {part} {'eliminada' if drop else 'desconectada (archivada)'}.")
+    return True
+
+
+def main(argv: List[str]) -> None:
+    command = argv[0] if argv else ""
+    if command == "ensure":
+        ensure_future_partitions()
+    elif command == "list":
+        for part in list_partitions():
+            print(f"{part['name']:<28} {part['bounds']:<60} ~{part['rows_estimate']} filas")
+    elif command == "detach" and len(argv) > 1:
+        detach_partition(_parse_month(argv[1]), drop="--drop" in argv)
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,187 @@
+"""
+Chequeo de regresión de planes: corre EXPLAIN sobre las consultas canónicas de AFI y
+falla si alguna vuelve a un Seq Scan sobre tablas grandes.
+
+    python plan_check.py            # contra la DB configurada (DB_*)
+    python plan_check.py --seed     # siembra un dataset sintético antes (¡solo en DB de pruebas!)
+
+tests/test_plan_check.py lo ejecuta contra una DB desechable cuando PLAN_CHECK_DB está definido;
+en CI (.github/workflows/afi-core-tests.yml) siempre lo está, con un servicio Postgres + pgvector.
+"""
+import datetime
+import json
+import sys
+from typing import Iterable, List, Optional, Set
+
+# Tablas donde un Seq Scan es una regresión. accounts queda fuera: con unas pocas filas
+# por usuario el Seq Scan es el plan correcto y la prueba sería inestable.
+WATCHED_TABLES = {"transactions", "monthly_rollups"}
+
+SEED_USERS = 40
+SEED_ACCOUNTS_PER_USER = 3
+SEED_ROWS = 200_000
+SEED_MONTHS = 12
+SEED_ACCOUNT_PREFIX = "plancheck"
+
+
+def _seed_window() -> tuple:
+    end = datetime.date.today().replace(day=1)
+    start_index = end.year * 12 + end.month - 1 - (SEED_MONTHS - 1)
+    return datetime.date(start_index // 12, start_index % 12 + 1, 1), end
+
+
+def canonical_queries(user_id: int = 7, account_id: Optional[int] = None) -> List[dict]:
+    """Consultas representativas de los caminos de lectura reales (sql + params)."""
+    month_start, _ = _seed_window()
+    month_end = (month_start + datetime.timedelta(days=32)).replace(day=1)
+    queries = [
+        {
+            "name": "gasto_usuario_mes",
+            "sql": """
+                SELECT COALESCE(SUM(amount), 0) FROM transactions
+                WHERE user_id = %s AND date >= %s AND date < %s AND amount < 0
+            """,
+            "params": (user_id, month_start, month_end),
+        },
+        {
+            "name": "categorias_usuario_trimestre",
+            "sql": """
+                SELECT category, SUM(amount) FROM transactions
+                WHERE user_id = %s AND date >= %s AND date < %s
+                GROUP BY category
+            """,
+            "params": (user_id, month_start, month_start + datetime.timedelta(days=90)),
+        },
+        {
+            "name": "cuenta_por_nombre",
+            "sql": "SELECT account_id FROM accounts WHERE user_id = %s AND account_name = %s",
+            "params": (user_id, f"{SEED_ACCOUNT_PREFIX}-{user_id}-0"),
+        },
+        {
+            "name": "rollup_usuario_mes",
+            "sql": "SELECT category, spend FROM monthly_rollups WHERE user_id = %s AND month = %s",
+            "params": (user_id, month_start),
+        },
+    ]
+    if account_id is not None:
+        queries.append(
+            {
+                "name": "historial_cuenta",
+                "sql": """
+                    SELECT date, amount, description FROM transactions
+                    WHERE account_id = %s ORDER BY date DESC LIMIT 50
+                """,
+                "params": (account_id,),
+            }
+        )
+    return queries
+
+
+def find_seq_scans(plan: dict, watched: Iterable[str] = WATCHED_TABLES) -> List[str]:
+    """Recorre el JSON de EXPLAIN y devuelve las tablas vigiladas leídas con Seq Scan."""
+    watched = set(watched)
+    found: List[str] = []
+
+    def _walk(node: dict) -> None:
+        if node.get("Node Type") == "Seq Scan":
+            relation = node.get("Relation Name", "")
+            # Las particiones (transactions_p2024_01, transactions_default) cuentan como su padre
+            base = relation
+            if relation == "transactions_default" or relation.startswith("transactions_p"):
+                base = "transactions"
+            if base in watched:
+                found.append(relation)
+        for child in node.get("Plans", []) or []:
+            _walk(child)
+
+    _walk(plan.get("Plan", plan))
+    return found
+
+
+def explain(cur, sql: str, params: tuple) -> dict:
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    raw = cur.fetchone()[0]
+    data = json.loads(raw) if isinstance(raw, str) else raw
+    return data[0]
+
+
+def seed_dataset(cur) -> None:
+    """Siembra usuarios/cuentas/movimientos sintéticos y actualiza estadísticas. Idempotente."""
+    cur.execute("SELECT COUNT(*) FROM accounts WHERE account_name LIKE %s;", (f"{SEED_ACCOUNT_PREFIX}-%",))
+    if cur.fetchone()[0] >= SEED_USERS * SEED_ACCOUNTS_PER_USER:
+        cur.execute("ANALYZE transactions; ANALYZE accounts; ANALYZE monthly_rollups;")
+        return
+
+    start, end = _seed_window()
+    print(f"🌱 Sembrando {SEED_ROWS} movimientos sintéticos ({start} → {end})...")
+    cur.execute("SELECT ensure_transaction_partitions(%s, %s);", (start, end))
+    cur.execute(
+        """
+        INSERT INTO accounts (account_name, account_type_id, currency_code, user_id)
+        SELECT %(prefix)s || '-' || u || '-' || a, NULL, 'COP', u
+        FROM generate_series(1, %(users)s) u, generate_series(0, %(accounts)s - 1) a
+        ON CONFLICT (account_name) DO NOTHING;
+        """,
+        {"prefix": SEED_ACCOUNT_PREFIX, "users": SEED_USERS, "accounts": SEED_ACCOUNTS_PER_USER},
+    )
+    cur.execute(
+        """
+        INSERT INTO transactions (account_id, date, amount, description, category, user_id, import_source, tx_fingerprint)
+        SELECT a.account_id,
+               %(start)s::date + (random() * (%(end)s::date + 27 - %(start)s::date))::int,
+               round((random() * 200000 - 150000)::numeric, 2),
+               'Compra ' || (g %% 500),
+               (ARRAY['Comida', 'Transporte', 'Ocio', 'Hogar', 'Salud'])[1 + g %% 5],
+               a.user_id,
+               'plan_check',
+               md5('plan_check-' || g)
+        FROM generate_series(1, %(rows)s) g
+        JOIN accounts a ON a.account_name = %(prefix)s || '-' || (1 + g %% %(users)s) || '-' || (g %% %(accounts)s)
+        ON CONFLICT DO NOTHING;
+        """,
+        {
+            "start": start,
+            "end": end,
+            "rows": SEED_ROWS,
+            "prefix": SEED_ACCOUNT_PREFIX,
+            "users": SEED_USERS,
+            "accounts": SEED_ACCOUNTS_PER_USER,
+        },
+    )
+    cur.execute("ANALYZE transactions; ANALYZE accounts; ANALYZE monthly_rollups;")
+
+
+def run_checks(cur, user_id: int = 7) -> List[dict]:
+    """Devuelve una fila por consulta con sus Seq Scans sobre tablas vigiladas (vacío = OK)."""
+    cur.execute(
+        "SELECT account_id FROM accounts WHERE user_id = %s ORDER BY account_id LIMIT 1;",
+        (user_id,),
+    )
+    row = cur.fetchone()
+    results = []
+    for query in canonical_queries(user_id, account_id=row[0] if row else None):
+        plan = explain(cur, query["sql"], query["params"])
+        results.append({"name": query["name"], "seq_scans": find_seq_scans(plan), "plan": plan})
+    return results
+
+
+def regressions(results: List[dict]) -> Set[str]:
+    return {result["name"] for result in results if result["seq_scans"]}
+
+
+def main(argv: List[str]) -> int:
+    from database import get_conn
+
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            if "--seed" in argv:
+                seed_dataset(cur)
+            results = run_checks(cur)
+    for result in results:
+        status = "❌ SEQ SCAN " + ", ".join(result["seq_scans"]) if result["seq_scans"] else "✅"
+        print(f"{result['name']:<32} {status}")
+    return 1 if regressions(results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,252 @@
+"""
+Planificador central de cuota de Gemini. Todo el tráfico pasa por aquí vía llm_client.
+
+- Un par de token buckets por modelo: peticiones/minuto (RPM) y tokens/minuto (TPM).
+  Los tokens de entrada se estiman antes de la llamada (~4 caracteres por token) y se
+  ajustan después con usage_metadata cuando la respuesta lo trae.
+- Clases de prioridad: INTERACTIVE (chat, /chat/query) > ALERT (alertas, briefing) >
+  BATCH (extractos, correos, ingesta de libros). Con el bucket vacío el siguiente turno es
+  siempre de la clase más alta que esté esperando; dentro de una clase, por orden de llegada.
+  Así un extracto de 2.000 filas no le quita cuota a un chat en vivo.
+- Backoff adaptativo: un 429 pausa el modelo (QUOTA_BACKOFF_SECONDS, doblando con cada 429
+  seguido hasta QUOTA_BACKOFF_MAX_SECONDS) y reduce su ritmo a la mitad; cada éxito lo
+  recupera de a poco hasta el 100%.
+
+Cuotas en GEMINI_QUOTAS ("modelo=rpm/tpm,..."; 0 = sin límite); modelos no listados usan
+QUOTA_DEFAULT_RPM / QUOTA_DEFAULT_TPM. Profundidad de cola y esperas en quota_stats() (/metrics).
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+INTERACTIVE, ALERT, BATCH = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", ALERT: "alert", BATCH: "batch"}
+
+DEFAULT_QUOTAS = {
+    "gemini-2.5-pro": (150, 2_000_000),
+    "gemini-2.5-flash": (1000, 1_000_000),
+    "gemini-1.5-flash": (2000, 4_000_000),
+    "text-embedding-004": (1500, 0),
+}
+QUOTA_DEFAULT_RPM = float(os.getenv("QUOTA_DEFAULT_RPM", "60"))
+QUOTA_DEFAULT_TPM = float(os.getenv("QUOTA_DEFAULT_TPM", "1000000"))
+QUOTA_BURST_SECONDS = float(os.getenv("QUOTA_BURST_SECONDS", "10"))
+QUOTA_BACKOFF_SECONDS = float(os.getenv("QUOTA_BACKOFF_SECONDS", "1"))
+QUOTA_BACKOFF_MAX_SECONDS = float(os.getenv("QUOTA_BACKOFF_MAX_SECONDS", "60"))
+QUOTA_MIN_RATE_FACTOR = 0.1
+QUOTA_RECOVERY_STEP = 0.05
+# Cada cuánto revisa su turno quien no está primero en la cola
+QUOTA_POLL_SECONDS = 0.05
+CHARS_PER_TOKEN = 4
+
+
+def _parse_quotas(raw: str) -> Dict[str, tuple]:
+    quotas = {}
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        name, _, limits = item.partition("=")
+        rpm, _, tpm = limits.partition("/")
+        quotas[model_key(name)] = (float(rpm or 0), float(tpm or 0))
+    return quotas
+
+
+def model_key(model: str) -> str:
+    return str(model or "").strip().removeprefix("models/")
+
+
+class TokenBucket:
+    """Bucket que se rellena a `per_minute` * factor; 0 = sin límite."""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = max(1.0, per_minute / 60.0 * QUOTA_BURST_SECONDS)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float, factor: float) -> None:
+        if self.per_minute:
+            rate = self.per_minute * factor / 60.0
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, factor: float) -> float:
+        if not self.per_minute:
+            return 0.0
+        # Una petición más grande que la ráfaga pasa con el bucket lleno (y lo deja en negativo)
+        needed = min(amount, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / (self.per_minute * factor / 60.0)
+
+    def take(self, amount: float) -> None:
+        if self.per_minute:
+            self.tokens -= amount
+
+
+class ModelQuota:
+    def __init__(self, model: str, rpm: float, tpm: float):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.factor = 1.0
+        self.cooldown_until = 0.0
+        self.strikes = 0
+        self.waiting: list = []
+        self.granted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wait_ms_total = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.rate_limited = 0
+
+    def try_grant(self, ticket: tuple, amount: float, now: float) -> float:
+        """0 si `ticket` obtiene turno (y consume cuota); si no, segundos sugeridos de espera."""
+        if self.waiting[0] != ticket:
+            return QUOTA_POLL_SECONDS
+        if now < self.cooldown_until:
+            return self.cooldown_until - now
+        self.requests.refill(now, self.factor)
+        self.tokens.refill(now, self.factor)
+        wait = max(self.requests.wait_time(1, self.factor), self.tokens.wait_time(amount, self.factor))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(amount)
+        heapq.heappop(self.waiting)
+        return 0.0
+
+    def stats(self, now: float) -> dict:
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _ in self.waiting:
+            depth[PRIORITY_NAMES[priority]] += 1
+        return {
+            "rpm": self.requests.per_minute,
+            "tpm": self.tokens.per_minute,
+            "rate_factor": round(self.factor, 2),
+            "cooldown_s": round(max(0.0, self.cooldown_until - now), 1),
+            "queue_depth": depth,
+            "granted": dict(self.granted),
+            "wait_ms_avg": {
+                name: round(self.wait_ms_total[name] / self.granted[name], 1) if self.granted[name] else 0.0
+                for name in PRIORITY_NAMES.values()
+            },
+            "rate_limited": self.rate_limited,
+        }
+
+
+_lock = threading.Lock()
+_quotas: Dict[str, ModelQuota] = {}
+_limits = {**DEFAULT_QUOTAS, **_parse_quotas(os.getenv("GEMINI_QUOTAS", ""))}
+_sequence = itertools.count()
+
+
+def _quota(model: str) -> ModelQuota:
+    key = model_key(model)
+    quota = _quotas.get(key)
+    if quota is None:
+        rpm, tpm = _limits.get(key, (QUOTA_DEFAULT_RPM, QUOTA_DEFAULT_TPM))
+        quota = _quotas[key] = ModelQuota(key, rpm, tpm)
+    return quota
+
+
+def estimate_tokens(contents) -> int:
+    """Tokens de entrada aproximados (solo texto; archivos y protos se ajustan con usage_metadata)."""
+    if isinstance(contents, str):
+        return len(contents) // CHARS_PER_TOKEN + 1
+    if isinstance(contents, (list, tuple)):
+        return sum(estimate_tokens(part) for part in contents)
+    return 0
+
+
+def _enqueue(model: str, priority: int) -> tuple:
+    ticket = (priority, next(_sequence))
+    with _lock:
+        heapq.heappush(_quota(model).waiting, ticket)
+    return ticket
+
+
+def _poll(model: str, ticket: tuple, amount: float, queued_at: float) -> float:
+    now = time.monotonic()
+    with _lock:
+        quota = _quota(model)
+        wait = quota.try_grant(ticket, amount, now)
+        if wait <= 0:
+            name = PRIORITY_NAMES[ticket[0]]
+            quota.granted[name] += 1
+            quota.wait_ms_total[name] += (now - queued_at) * 1000
+    return wait
+
+
+def _dequeue(model: str, ticket: tuple) -> None:
+    # Cancelación/timeout mientras esperaba turno: se sale de la cola
+    with _lock:
+        waiting = _quota(model).waiting
+        if ticket in waiting:
+            waiting.remove(ticket)
+            heapq.heapify(waiting)
+
+
+def acquire(model: str, priority: int = BATCH, tokens: int = 0) -> None:
+    """Bloquea el hilo hasta que `model` tenga cuota para una petición de `tokens` tokens."""
+    ticket, queued_at = _enqueue(model, priority), time.monotonic()
+    try:
+        while True:
+            wait = _poll(model, ticket, tokens, queued_at)
+            if wait <= 0:
+                return
+            time.sleep(min(wait, QUOTA_POLL_SECONDS))
+    except BaseException:
+        _dequeue(model, ticket)
+        raise
+
+
+async def acquire_async(model: str, priority: int = INTERACTIVE, tokens: int = 0) -> None:
+    """Igual que acquire, pero la espera no ocupa un hilo."""
+    ticket, queued_at = _enqueue(model, priority), time.monotonic()
+    try:
+        while True:
+            wait = _poll(model, ticket, tokens, queued_at)
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, QUOTA_POLL_SECONDS))
+    except BaseException:
+        _dequeue(model, ticket)
+        raise
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return (
+        type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+        or "429" in str(error)
+        or "Resource has been exhausted" in str(error)
+    )
+
+
+def record_rate_limit(model: str) -> float:
+    """429 de `model`: pausa con backoff exponencial y baja el ritmo. Devuelve la pausa aplicada."""
+    with _lock:
+        quota = _quota(model)
+        delay = min(QUOTA_BACKOFF_SECONDS * 2 ** quota.strikes, QUOTA_BACKOFF_MAX_SECONDS)
+        quota.strikes += 1
+        quota.rate_limited += 1
+        quota.factor = max(QUOTA_MIN_RATE_FACTOR, quota.factor / 2)
+        quota.cooldown_until = max(quota.cooldown_until, time.monotonic() + delay)
+        factor = quota.factor
+    print(f"⏳ Cuota de {model_key(model)} agotada (429): pausa {delay:.0f}s, ritmo al {factor:.0%}")
+    return delay
+
+
+def record_success(model: str, estimated: int = 0, used: Optional[int] = None) -> None:
+    with _lock:
+        quota = _quota(model)
+        quota.strikes = 0
+        quota.factor = min(1.0, quota.factor + QUOTA_RECOVERY_STEP)
+        if used is not None and used > estimated:
+            # El historial de chat, archivos y la salida no se ven en la estimación previa
+            quota.tokens.take(used - estimated)
+
+
+def quota_stats() -> dict:
+    now = time.monotonic()
+    with _lock:
+        return {key: quota.stats(now) for key, quota in _quotas.items()}
@@ -1,149 +1,223 @@
+"""
+Sincronización de la biblioteca de libros (/app/data/books) con financial_wisdom.
+
+El manifiesto `wisdom_sources` (migrations/0012) guarda por PDF el sha256 del archivo, las
+páginas, los parámetros de chunking y el modelo de embedding. En cada corrida:
+  - sin cambios (mismo hash, parámetros y modelo, status 'ready') -> ni se abre el PDF;
+  - cambió el contenido o el chunking -> se re-fragmenta y solo se embeben los fragmentos
+    nuevos (checkpoint por hash en embedding_pipeline); los que ya no existen se borran;
+  - cambió el modelo -> re-index controlado: los vectores nuevos se agregan junto a los
+    viejos y estos se borran solo cuando el libro termina (status 'indexing' mientras tanto,
+    así una corrida interrumpida retoma donde quedó);
+  - el PDF desapareció del directorio -> se quitan sus fragmentos y su fila del manifiesto.
+"""
+import hashlib
 import os
-import time
+
 import google.generativeai as genai
-import psycopg2
-from psycopg2.extras import execute_values
 import PyPDF2
 
+from database import get_conn
+from embedding_cache import EMBEDDING_MODEL
+from embedding_pipeline import chunk_hash, embed_and_store
+from vector_index import rebuild_index
+
 # Configuración
 LIBRARY_PATH = "/app/data/books"
-DB_HOST = os.getenv("DB_HOST", "afi_db")
-DB_NAME = os.getenv("DB_NAME", "afi_brain")
-DB_USER = os.getenv("DB_USER", "afi_user")
-DB_PASS = os.getenv("DB_PASS")
 API_KEY = os.getenv("GOOGLE_API_KEY")
 
-EMBEDDING_MODEL = "models/text-embedding-004"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+MIN_CHUNK_CHARS = 50
 
 genai.configure(api_key=API_KEY)
 
-def get_conn():
-    return psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASS)
 
-def get_processed_files(cur):
-    """Consulta qué archivos ya existen en la DB para no repetirlos"""
-    try:
-        cur.execute("SELECT DISTINCT source FROM financial_wisdom;")
-        return {row[0] for row in cur.fetchall()}
-    except psycopg2.errors.UndefinedTable:
-        return set()
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_pdf(file_path):
+    """(texto completo, páginas) del PDF, sin caracteres nulos (rompen Postgres)."""
+    full_text = ""
+    with open(file_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        for page in reader.pages:
+            text = page.extract_text()
+            if text:
+                full_text += text.replace("\x00", "") + "\n"
+        pages = len(reader.pages)
+    return full_text, pages
+
+
+def chunk_document(full_text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    chunks = []
+    for i in range(0, len(full_text), chunk_size - overlap):
+        chunk = full_text[i:i + chunk_size].strip()
+        if len(chunk) > MIN_CHUNK_CHARS:
+            chunks.append(chunk)
+    return chunks
+
+
+def load_manifest():
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT source, file_hash, chunk_size, chunk_overlap, embedding_model, status FROM wisdom_sources;"
+            )
+            return {
+                row[0]: {"file_hash": row[1], "chunk_size": row[2], "chunk_overlap": row[3],
+                         "embedding_model": row[4], "status": row[5]}
+                for row in cur.fetchall()
+            }
+
+
+def reindex_reason(entry, file_hash, model=EMBEDDING_MODEL):
+    """Por qué hay que (re)procesar un PDF, o None si el manifiesto está al día."""
+    if entry is None:
+        return "nuevo"
+    if entry["file_hash"] != file_hash:
+        return "contenido modificado"
+    if (entry["chunk_size"], entry["chunk_overlap"]) != (CHUNK_SIZE, CHUNK_OVERLAP):
+        return "parámetros de chunking"
+    if entry["embedding_model"] != model:
+        return "modelo de embedding"
+    if entry["status"] != "ready":
+        return "re-index interrumpido"
+    return None
 
-def clear_file_data(cur, filename):
-    """Borra datos de un archivo específico para re-procesarlo limpio"""
-    cur.execute("DELETE FROM financial_wisdom WHERE source = %s;", (filename,))
 
-def embed_with_retry(text, retries=5):
-    delay = 1
-    for i in range(retries):
-        try:
-            result = genai.embed_content(
-                model=EMBEDDING_MODEL,
-                content=text,
-                task_type="retrieval_document"
+def _upsert_source(cur, source, file_hash, file_size, pages, status, chunk_count=None, model=EMBEDDING_MODEL):
+    cur.execute(
+        """
+        INSERT INTO wisdom_sources (source, file_hash, file_size, page_count, chunk_size, chunk_overlap,
+                                    embedding_model, chunk_count, status, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (source) DO UPDATE SET
+            file_hash = EXCLUDED.file_hash, file_size = EXCLUDED.file_size, page_count = EXCLUDED.page_count,
+            chunk_size = EXCLUDED.chunk_size, chunk_overlap = EXCLUDED.chunk_overlap,
+            embedding_model = EXCLUDED.embedding_model,
+            chunk_count = COALESCE(EXCLUDED.chunk_count, wisdom_sources.chunk_count),
+            status = EXCLUDED.status, updated_at = CURRENT_TIMESTAMP;
+        """,
+        (source, file_hash, file_size, pages, CHUNK_SIZE, CHUNK_OVERLAP, model, chunk_count, status),
+    )
+
+
+def finalize_source(source, chunks, file_hash, file_size, pages, model=EMBEDDING_MODEL):
+    """Libro completo: borra fragmentos obsoletos (otro texto u otro modelo), fija chunk_index y marca 'ready'."""
+    hashes = [chunk_hash(chunk) for chunk in chunks]
+    with get_conn() as conn:
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                DELETE FROM financial_wisdom
+                WHERE source = %s AND NOT (embedding_model = %s AND chunk_hash = ANY(%s));
+                """,
+                (source, model, hashes),
             )
-            return result['embedding']
-        except Exception as e:
-            if "429" in str(e) or "Resource has been exhausted" in str(e):
-                print(f"   ⏳ API Saturada. Esperando {delay}s...")
-                time.sleep(delay)
-                delay *= 2
-            else:
-                print(f"   ❌ Error en embedding: {e}")
-                return None
-    return None
+            removed = cur.rowcount
+            cur.execute(
+                """
+                UPDATE financial_wisdom fw SET chunk_index = h.ord - 1
+                FROM unnest(%s::text[]) WITH ORDINALITY AS h(chunk_hash, ord)
+                WHERE fw.source = %s AND fw.embedding_model = %s AND fw.chunk_hash = h.chunk_hash
+                  AND fw.chunk_index IS DISTINCT FROM h.ord - 1;
+                """,
+                (hashes, source, model),
+            )
+            _upsert_source(cur, source, file_hash, file_size, pages, "ready", chunk_count=len(set(hashes)), model=model)
+        conn.commit()
+    return removed
+
+
+def remove_missing_sources(present):
+    """PDFs del manifiesto que ya no están en el directorio: fuera del corpus."""
+    with get_conn() as conn:
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            cur.execute("SELECT source FROM wisdom_sources WHERE NOT (source = ANY(%s));", (list(present),))
+            missing = [row[0] for row in cur.fetchall()]
+            if missing:
+                cur.execute("DELETE FROM financial_wisdom WHERE source = ANY(%s);", (missing,))
+                cur.execute("DELETE FROM wisdom_sources WHERE source = ANY(%s);", (missing,))
+        conn.commit()
+    for source in missing:
+        print(f"🗑️  '{source}' ya no está en la biblioteca: fragmentos eliminados.")
+    return missing
+
 
-def ingest_library():
-    print("🚀 Iniciando Ingesta Inteligente (Con Resume)...")
-    
-    conn = get_conn()
-    cur = conn.cursor()
-
-    # Asegurar tabla
-    cur.execute("""
-        CREATE EXTENSION IF NOT EXISTS vector;
-        CREATE TABLE IF NOT EXISTS financial_wisdom (
-            id SERIAL PRIMARY KEY,
-            content TEXT,
-            source VARCHAR(255),
-            embedding vector(768)
-        );
-    """)
-    conn.commit()
-
-    # 1. RECUPERAR ESTADO ACTUAL
-    processed_files = get_processed_files(cur)
-    print(f"📊 Estado Actual: {len(processed_files)} libros ya en base de datos.")
+def ingest_library(progress=None):
+    """Sincroniza LIBRARY_PATH con financial_wisdom; `progress(fracción, nota)` opcional por libro."""
+    print("🚀 Sincronizando biblioteca (manifiesto wisdom_sources)...")
 
     if not os.path.exists(LIBRARY_PATH):
         print(f"⚠️ La ruta {LIBRARY_PATH} no existe.")
         return
 
-    pdf_files = [f for f in os.listdir(LIBRARY_PATH) if f.endswith(".pdf")]
-    
+    pdf_files = sorted(f for f in os.listdir(LIBRARY_PATH) if f.endswith(".pdf"))
+
     if not pdf_files:
+        # Directorio vacío (¿volumen sin montar?): no se toca el corpus
         print("⚠️ Carpeta vacía.")
         return
 
-    for filename in pdf_files:
-        # 2. CHECK DE RESUME
-        if filename in processed_files:
-            print(f"⏭️  Saltando '{filename}' (Ya procesado).")
+    manifest = load_manifest()
+    total = {"stored": 0, "failed": 0, "removed": 0, "seconds": 0.0, "skipped_files": 0}
+    for position, filename in enumerate(pdf_files):
+        if progress:
+            progress(position / len(pdf_files), filename)
+        path = os.path.join(LIBRARY_PATH, filename)
+        file_hash = file_sha256(path)
+        reason = reindex_reason(manifest.get(filename), file_hash)
+        if reason is None:
+            total["skipped_files"] += 1
             continue
-        
-        # Si llegamos aquí, el archivo es nuevo O se quedó a medias.
-        # Por seguridad, borramos cualquier rastro previo de este archivo específico
-        # para evitar duplicados si falló al 50%.
-        clear_file_data(cur, filename)
-        conn.commit()
 
-        print(f"\n📖 Procesando Nuevo Libro: {filename}")
-        file_path = os.path.join(LIBRARY_PATH, filename)
-        
+        print(f"\n📖 Procesando '{filename}' ({reason})")
         try:
-            full_text = ""
-            with open(file_path, "rb") as f:
-                reader = PyPDF2.PdfReader(f)
-                for page in reader.pages:
-                    text = page.extract_text()
-                    if text: full_text += text + "\n"
+            full_text, pages = read_pdf(path)
         except Exception as e:
             print(f"   ❌ Error leyendo PDF: {e}")
             continue
 
-        if not full_text: continue
-
-        # Chunking
-        chunk_size = 1000
-        overlap = 100
-        chunks = [full_text[i:i + chunk_size].strip() for i in range(0, len(full_text), chunk_size - overlap) if len(full_text[i:i+chunk_size].strip()) > 50]
-
-        print(f"   🧩 {len(chunks)} fragmentos detectados.")
-
-        batch_data = []
-        batch_size = 50 
-        
-        for i, chunk in enumerate(chunks):
-            # Sanitize chunk to remove null characters (0x00)
-            chunk = chunk.replace('\x00', '')
-            vector = embed_with_retry(chunk)
-            if vector:
-                batch_data.append((chunk, filename, vector))
-            
-            if len(batch_data) >= batch_size or i == len(chunks) - 1:
-                if batch_data:
-                    execute_values(cur, 
-                        "INSERT INTO financial_wisdom (content, source, embedding) VALUES %s", 
-                        batch_data
-                    )
-                    conn.commit() # COMMIT PARCIAL: Guarda el progreso
-                    print(f"   💾 Guardando... {int((i+1)/len(chunks)*100)}%", end="\r")
-                    batch_data = []
-        
-        print(f"\n   ✅ Libro '{filename}' completado y asegurado.")
-
-    cur.close()
-    conn.close()
-    print("\n🏁 Biblioteca Sincronizada.")
+        chunks = chunk_document(full_text)
+        if not chunks:
+            continue
+
+        file_size = os.path.getsize(path)
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                _upsert_source(cur, filename, file_hash, file_size, pages, "indexing")
+
+        stats = embed_and_store(filename, chunks)
+        for key in ("stored", "failed", "seconds"):
+            total[key] += stats[key]
+        if stats["failed"]:
+            print(f"   ⚠️ '{filename}' queda en 'indexing'; la próxima corrida retoma los fragmentos faltantes.")
+            continue
+        total["removed"] += finalize_source(filename, chunks, file_hash, file_size, pages)
+
+    removed_sources = remove_missing_sources(pdf_files)
+
+    rate = total["stored"] / total["seconds"] if total["seconds"] else 0.0
+    print(f"\n🏁 Biblioteca Sincronizada: {total['skipped_files']} libros sin cambios, "
+          f"{total['stored']} fragmentos nuevos, {total['removed']} obsoletos eliminados, "
+          f"{total['failed']} fallidos ({rate:.1f} frag/s).")
+
+    # El índice vectorial se entrena/construye sobre el corpus ya cargado (vector_index.py)
+    if total["stored"] or total["removed"] or removed_sources:
+        try:
+            rebuild_index()
+        except Exception as e:
+            print(f"⚠️ No se pudo reconstruir el índice vectorial: {e}")
+    return total
+
 
 if __name__ == "__main__":
-    ingest_library()
\ No newline at end of file
+    ingest_library()
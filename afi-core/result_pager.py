@@ -0,0 +1,170 @@
+"""
+Ejecución paginada del SQL generado por el agente.
+
+El SQL del modelo se ejecuta dentro del sandbox (sql_sandbox) con un cursor de servidor
+(DECLARE ... CURSOR) y solo se traen `page_size + 1` filas: la memoria de afi-core queda
+acotada por página, no por lo que devuelva la consulta. Si hay más filas se emite un `page_token` opaco; la página
+siguiente re-ejecuta la consulta con OFFSET (no se retiene ninguna conexión del pool
+entre requests). Los tokens viven en memoria con TTL y un tope de entradas.
+
+Como cada página es una ejecución aparte, el orden tiene que ser determinista: sin ORDER BY
+(o con empates) Postgres puede devolver las filas en otro orden y "Cargar más" repetiría o
+saltaría filas. Por eso se ordena por todas las columnas de salida (posicionales): como
+ORDER BY externo si el SQL no trae uno, o como desempate al final del ORDER BY del modelo.
+"""
+import datetime
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from database import get_conn
+from sql_sandbox import enter_sandbox, preflight, timed_query
+
+QUERY_PAGE_SIZE = int(os.getenv("QUERY_PAGE_SIZE", "200"))
+# Tope absoluto de filas navegables por consulta (todas las páginas)
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "5000"))
+PAGE_TOKEN_TTL = float(os.getenv("PAGE_TOKEN_TTL", "900"))
+PAGE_TOKEN_MAX = int(os.getenv("PAGE_TOKEN_MAX", "500"))
+
+# Tipos sin operador de orden (btree): no sirven de desempate
+_UNSORTABLE_TYPES = {114, 142, 600, 601, 602, 603, 604, 628, 718}  # json, xml, tipos geométricos
+
+_tokens: "OrderedDict[str, dict]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _clean_sql(sql: str) -> str:
+    return sql.strip().rstrip(";").strip()
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def _top_level_mask(query: str) -> str:
+    """El SQL con lo que está entre paréntesis o comillas borrado (mismas posiciones)."""
+    masked, depth, quote = [], 0, None
+    for char in query:
+        if quote:
+            masked.append(" ")
+            if char == quote:
+                quote = None
+            continue
+        if char in ("'", '"'):
+            quote = char
+            masked.append(" ")
+        elif char == "(":
+            depth += 1
+            masked.append(" ")
+        elif char == ")":
+            depth = max(depth - 1, 0)
+            masked.append(" ")
+        else:
+            masked.append(char if depth == 0 else " ")
+    return "".join(masked)
+
+
+def _deterministic(query: str, sortable: List[int]) -> Tuple[str, str]:
+    """(consulta, ORDER BY externo): desempate por las columnas de salida `sortable` (1-based)."""
+    if not sortable:
+        return query, ""
+    positions = ", ".join(str(pos) for pos in sortable)
+    masked = _top_level_mask(query)
+    order_by = list(re.finditer(r"\border\s+by\b", masked, re.IGNORECASE))
+    if not order_by:
+        return query, f" ORDER BY {positions}"
+    # El desempate va al final del ORDER BY del modelo, antes de su LIMIT/OFFSET/FETCH
+    tail = re.search(r"\b(limit|offset|fetch|for)\b", masked[order_by[-1].end():], re.IGNORECASE)
+    cut = order_by[-1].end() + tail.start() if tail else len(query)
+    return f"{query[:cut].rstrip()}, {positions} {query[cut:]}".rstrip(), ""
+
+
+def fetch_page(sql: str, user_id: Optional[int], offset: int = 0, limit: int = QUERY_PAGE_SIZE) -> Tuple[List[str], List[dict], bool]:
+    """
+    Trae a lo sumo `limit` filas desde `offset` con un cursor de servidor, dentro del
+    sandbox (rol read-only, timeouts, EXPLAIN previo). Devuelve (columnas, filas, hay_más).
+    Lanza sql_sandbox.QueryRejected si el plan estimado es demasiado caro.
+    """
+    query = _clean_sql(sql)
+    with get_conn(user_id=user_id) as conn:
+        # SET LOCAL y cursores con nombre necesitan transacción; el pool la cierra al devolver la conexión
+        conn.autocommit = False
+        with timed_query(query):
+            with conn.cursor() as cur:
+                enter_sandbox(cur)
+                preflight(cur, query)
+                # LIMIT 0: solo planifica, pero trae columnas y tipos para el orden determinista.
+                # Sin parámetros psycopg2 no colapsa %%: el SQL va tal cual (como en preflight)
+                cur.execute(f"SELECT * FROM ({query}) AS afi_q LIMIT 0")
+                sortable = [pos for pos, desc in enumerate(cur.description or [], start=1)
+                            if desc[1] not in _UNSORTABLE_TYPES]
+            ordered, outer_order = _deterministic(query, sortable)
+            # El SQL del modelo va sin parámetros propios: sus % (LIKE '%x%') se escapan para psycopg2
+            wrapped = f"SELECT * FROM ({ordered.replace('%', '%%')}) AS afi_q{outer_order} OFFSET %s LIMIT %s"
+            with conn.cursor(name=f"afi_page_{secrets.token_hex(4)}") as cur:
+                cur.itersize = limit + 1
+                cur.execute(wrapped, (offset, limit + 1))
+                rows = cur.fetchmany(limit + 1)
+                columns = [desc[0] for desc in cur.description] if cur.description else []
+    has_more = len(rows) > limit
+    records = [{col: _json_value(val) for col, val in zip(columns, row)} for row in rows[:limit]]
+    return columns, records, has_more
+
+
+def _purge_expired(now: float) -> None:
+    for token in [t for t, state in _tokens.items() if state["expires"] <= now]:
+        del _tokens[token]
+    while len(_tokens) > PAGE_TOKEN_MAX:
+        _tokens.popitem(last=False)
+
+
+def _issue_token(sql: str, user_id: Optional[int], offset: int) -> str:
+    token = secrets.token_urlsafe(16)
+    now = time.monotonic()
+    with _lock:
+        _purge_expired(now)
+        _tokens[token] = {"sql": sql, "user_id": user_id, "offset": offset, "expires": now + PAGE_TOKEN_TTL}
+    return token
+
+
+def run_paged_query(sql: str, user_id: Optional[int], offset: int = 0) -> dict:
+    """Ejecuta una página y arma el bloque de respuesta (data, columns, page_token, has_more)."""
+    limit = max(0, min(QUERY_PAGE_SIZE, QUERY_MAX_ROWS - offset))
+    columns, records, has_more = fetch_page(sql, user_id, offset=offset, limit=limit)
+    next_offset = offset + len(records)
+    truncated = has_more and next_offset >= QUERY_MAX_ROWS
+    page_token = _issue_token(sql, user_id, next_offset) if has_more and not truncated else None
+    return {
+        "data": records,
+        "columns": columns,
+        "page_token": page_token,
+        "has_more": page_token is not None,
+        "offset": offset,
+        "truncated": truncated,
+    }
+
+
+def token_alive(page_token: str) -> bool:
+    with _lock:
+        _purge_expired(time.monotonic())
+        return page_token in _tokens
+
+
+def next_page(page_token: str, user_id: Optional[int]) -> Optional[dict]:
+    """Página siguiente de un token vigente del mismo usuario; None si expiró o no le pertenece."""
+    now = time.monotonic()
+    with _lock:
+        _purge_expired(now)
+        state = _tokens.get(page_token)
+    if not state or state["user_id"] != user_id:
+        return None
+    return run_paged_query(state["sql"], state["user_id"], offset=state["offset"])
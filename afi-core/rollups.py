@@ -0,0 +1,132 @@
+"""
+Lecturas sobre `monthly_rollups` (gasto/ingreso por usuario, cuenta, categoría y mes).
+
+La tabla la mantienen triggers sobre `transactions` (migrations/0005), así que estas
+consultas leen a lo sumo unas filas por categoría y mes, sin importar el tamaño del
+historial. Reconstrucción manual (p.ej. tras restaurar un backup):
+
+    python rollups.py rebuild            # todos los usuarios
+    python rollups.py rebuild 3          # solo el usuario 3
+"""
+import datetime
+import sys
+from typing import Dict, List, Optional
+
+from database import get_conn
+
+
+def _month_start(value: Optional[datetime.date] = None) -> datetime.date:
+    value = value or datetime.date.today()
+    return value.replace(day=1)
+
+
+def _shift_month(month: datetime.date, delta: int) -> datetime.date:
+    index = month.year * 12 + (month.month - 1) + delta
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def _user_filter(user_id: Optional[int]) -> str:
+    return "" if user_id is None else "AND user_id = %(user_id)s"
+
+
+def month_totals(user_id: Optional[int] = None, month: Optional[datetime.date] = None) -> dict:
+    """Gasto (positivo), ingreso y número de movimientos del mes."""
+    with get_conn(user_id=user_id) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT COALESCE(SUM(spend), 0), COALESCE(SUM(income), 0),
+                       COALESCE(SUM(spend_count + income_count), 0)
+                FROM monthly_rollups
+                WHERE month = %(month)s {_user_filter(user_id)};
+                """,
+                {"month": _month_start(month), "user_id": user_id},
+            )
+            spend, income, count = cur.fetchone()
+    return {"spend": abs(float(spend)), "income": float(income), "tx_count": int(count)}
+
+
+def net_balance(user_id: Optional[int] = None) -> float:
+    """Suma histórica de todos los movimientos (saldo neto aproximado)."""
+    with get_conn(user_id=user_id) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT COALESCE(SUM(spend + income), 0) FROM monthly_rollups WHERE TRUE {_user_filter(user_id)};",
+                {"user_id": user_id},
+            )
+            return float(cur.fetchone()[0])
+
+
+def category_spend(user_id: Optional[int] = None, period: str = "current_month") -> Dict[str, float]:
+    """Gasto por categoría (montos negativos) para 'current_month', 'last_month' o todo el historial."""
+    month = _month_start()
+    if period == "last_month":
+        month = _shift_month(month, -1)
+    month_filter = "AND month = %(month)s" if period in ("current_month", "last_month") else ""
+    with get_conn(user_id=user_id) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT NULLIF(category, ''), SUM(spend)
+                FROM monthly_rollups
+                WHERE spend_count > 0 {month_filter} {_user_filter(user_id)}
+                GROUP BY 1;
+                """,
+                {"month": month, "user_id": user_id},
+            )
+            return {row[0] or "Sin Categoría": float(row[1]) for row in cur.fetchall()}
+
+
+def budget_vs_actual(user_id: Optional[int] = None, month: Optional[datetime.date] = None) -> List[dict]:
+    """Presupuesto (monthly_budgets) contra gasto real del mes, por categoría maestra."""
+    month = _month_start(month)
+    with get_conn(user_id=user_id) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT mc.name, b.amount_limit, COALESCE(ABS(SUM(r.spend)), 0)
+                FROM monthly_budgets b
+                JOIN master_categories mc ON mc.id = b.category_id
+                LEFT JOIN monthly_rollups r
+                    ON r.user_id = b.user_id AND r.month = b.month AND LOWER(r.category) = LOWER(mc.name)
+                WHERE b.month = %(month)s {"" if user_id is None else "AND b.user_id = %(user_id)s"}
+                GROUP BY mc.name, b.amount_limit
+                ORDER BY mc.name;
+                """,
+                {"month": month, "user_id": user_id},
+            )
+            return [
+                {"category": name, "budget": float(limit), "spent": float(spent), "remaining": float(limit) - float(spent)}
+                for name, limit, spent in cur.fetchall()
+            ]
+
+
+def rebuild(user_id: Optional[int] = None) -> int:
+    """Recalcula la rollup desde `transactions`. Devuelve filas de rollup generadas."""
+    if user_id is not None:
+        with get_conn(user_id=user_id) as conn:
+            conn.autocommit = False
+            with conn.cursor() as cur:
+                cur.execute("SELECT rebuild_monthly_rollups(%s);", (user_id,))
+                return cur.fetchone()[0]
+
+    # Con FORCE RLS cada usuario solo ve sus movimientos: se reconstruye uno por uno
+    # (incluye al usuario 1, el DEFAULT de transactions.user_id).
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM users UNION SELECT user_id FROM monthly_rollups UNION SELECT 1 ORDER BY 1;")
+            user_ids = [row[0] for row in cur.fetchall()]
+    return sum(rebuild(uid) for uid in user_ids)
+
+
+def main(argv: List[str]) -> None:
+    if not argv or argv[0] != "rebuild":
+        print(__doc__)
+        return
+    user_id = int(argv[1]) if len(argv) > 1 else None
+    rows = rebuild(user_id)
+    print(f"✅ Rollups mensuales reconstruidas: {rows} filas.")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -2,6 +2,7 @@ import os
 import json
 import psycopg2
 import google.generativeai as genai
+import llm_client
 
 # Configuración
 DB_HOST = "afi_db"
@@ -53,8 +54,7 @@ def run_architect():
 
     # 2. CONSULTAR A GEMINI
     try:
-        model = genai.GenerativeModel("gemini-2.5-pro")
-        response = model.generate_content(prompt)
+        response = llm_client.generate_sync("gemini-2.5-pro", prompt)
         
         # Limpieza básica por si el modelo devuelve Markdown
         sql_script = response.text.replace("```sql", "").replace("```", "").strip()
@@ -0,0 +1,161 @@
+"""
+Catálogo de esquema compacto para el agente text-to-SQL.
+
+En vez de volcar todo `information_schema` (incluidas sessions/otps/user_state) en cada
+pregunta, se expone solo una lista curada de tablas analíticas con descripciones cortas.
+El bloque se cachea por versión de esquema (`schema_version`): una migración nueva lo
+invalida, y la versión se re-verifica como mucho cada SCHEMA_CATALOG_TTL segundos.
+"""
+import os
+import threading
+import time
+from typing import Dict
+
+from database import get_conn
+
+SCHEMA_CATALOG_TTL = float(os.getenv("SCHEMA_CATALOG_TTL", "300"))
+
+# Tablas/columnas que el agente puede consultar. Orden = orden en el prompt.
+ANALYTICS_CATALOG: Dict[str, dict] = {
+    "transactions": {
+        "description": "movimientos (particionada por mes en date)",
+        "columns": {
+            "transaction_id": "",
+            "account_id": "FK accounts",
+            "date": "",
+            "amount": "<0 gasto, >0 ingreso",
+            "description": "comercio/concepto",
+            "category": "texto libre",
+            "category_id": "FK master_categories",
+            "status": "",
+            "import_source": "archivo/origen",
+            "user_id": "",
+        },
+    },
+    "monthly_rollups": {
+        "description": "totales mensuales precalculados; preferir para agregados por mes/categoría",
+        "columns": {
+            "user_id": "",
+            "account_id": "0 = sin cuenta",
+            "category": "'' = sin categoría",
+            "month": "primer día del mes",
+            "spend": "suma de gastos, negativa",
+            "income": "suma de ingresos",
+            "spend_count": "",
+            "income_count": "",
+        },
+    },
+    "accounts": {
+        "description": "cuentas del usuario",
+        "columns": {
+            "account_id": "",
+            "account_name": "",
+            "account_type_id": "FK account_types",
+            "currency_code": "",
+            "user_id": "",
+        },
+    },
+    "account_types": {
+        "description": "tipos de cuenta",
+        "columns": {"type_id": "", "type_name": "", "classification": "ASSET/LIABILITY"},
+    },
+    "monthly_budgets": {
+        "description": "presupuesto por categoría maestra y mes",
+        "columns": {
+            "user_id": "",
+            "category_id": "FK master_categories",
+            "month": "primer día del mes",
+            "amount_limit": "",
+        },
+    },
+    "master_categories": {
+        "description": "categorías de presupuesto",
+        "columns": {"id": "", "name": "", "type": "fixed/variable/savings"},
+    },
+}
+
+_TYPE_ALIASES = {
+    "integer": "int",
+    "bigint": "int",
+    "smallint": "int",
+    "character varying": "text",
+    "character": "text",
+    "numeric": "num",
+    "double precision": "float",
+    "timestamp without time zone": "ts",
+    "timestamp with time zone": "ts",
+    "boolean": "bool",
+}
+
+_lock = threading.Lock()
+_cache = {"version": None, "block": None, "checked_at": 0.0}
+_stats = {"hits": 0, "rebuilds": 0, "version_checks": 0}
+
+
+def _schema_version(cur) -> int:
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version;")
+    return cur.fetchone()[0]
+
+
+def build_schema_block(cur) -> str:
+    """Una línea por tabla: `tabla: descripción | col tipo (nota), ...` solo con columnas que existen."""
+    cur.execute(
+        """
+        SELECT table_name, column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = ANY(%s);
+        """,
+        (list(ANALYTICS_CATALOG),),
+    )
+    existing: Dict[str, Dict[str, str]] = {}
+    for table_name, column_name, data_type in cur.fetchall():
+        existing.setdefault(table_name, {})[column_name] = _TYPE_ALIASES.get(data_type, data_type)
+
+    lines = []
+    for table, meta in ANALYTICS_CATALOG.items():
+        columns = existing.get(table)
+        if not columns:
+            continue
+        parts = []
+        for column, note in meta["columns"].items():
+            if column not in columns:
+                continue
+            parts.append(f"{column} {columns[column]}" + (f" ({note})" if note else ""))
+        lines.append(f"{table}: {meta['description']} | " + ", ".join(parts))
+    return "\n".join(lines)
+
+
+def get_schema_block(force: bool = False) -> str:
+    """Bloque de esquema para el prompt, servido desde caché mientras no cambie schema_version."""
+    now = time.monotonic()
+    with _lock:
+        if not force and _cache["block"] is not None and now - _cache["checked_at"] < SCHEMA_CATALOG_TTL:
+            _stats["hits"] += 1
+            return _cache["block"]
+
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            version = _schema_version(cur)
+            with _lock:
+                _stats["version_checks"] += 1
+                if not force and _cache["block"] is not None and _cache["version"] == version:
+                    _cache["checked_at"] = now
+                    _stats["hits"] += 1
+                    return _cache["block"]
+            block = build_schema_block(cur)
+
+    with _lock:
+        _cache.update(version=version, block=block, checked_at=now)
+        _stats["rebuilds"] += 1
+    return block
+
+
+def invalidate() -> None:
+    """Fuerza la reconstrucción en la próxima llamada (p.ej. tras migrar en este proceso)."""
+    with _lock:
+        _cache.update(version=None, block=None, checked_at=0.0)
+
+
+def catalog_stats() -> dict:
+    with _lock:
+        return dict(_stats, version=_cache["version"])
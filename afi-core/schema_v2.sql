@@ -1,3 +1,4 @@
+-- LEGADO: script destructivo de reinicio. El esquema vivo se define en migrations/ (ver migrate.py).
 -- 1. Limpieza (Borrar todo lo anterior para empezar limpio)
 DROP TABLE IF EXISTS transactions CASCADE;
 DROP TABLE IF EXISTS accounts CASCADE;
@@ -1,6 +1,7 @@
 import os
 import psycopg2
 from database import get_conn
+from migrate import apply_migrations
 
 def run_sprint16_updates():
     print("🚀 Starting Sprint 16 Database Updates...")
@@ -27,32 +28,8 @@ def run_sprint16_updates():
                 # 2. Budget Engine (Schema Upgrade)
                 print("🏗️ Building Budget Engine Schema...")
                 
-                # Master Categories
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS master_categories (
-                        id SERIAL PRIMARY KEY,
-                        name VARCHAR(50) UNIQUE NOT NULL,
-                        type VARCHAR(20) NOT NULL
-                    );
-                """)
-                
-                # Monthly Budgets
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS monthly_budgets (
-                        id SERIAL PRIMARY KEY,
-                        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                        category_id INTEGER REFERENCES master_categories(id),
-                        month DATE NOT NULL,
-                        amount_limit DECIMAL(15,2) NOT NULL DEFAULT 0,
-                        UNIQUE(user_id, category_id, month)
-                    );
-                """)
-                
-                # Link Transactions to Master Categories
-                cur.execute("""
-                    ALTER TABLE transactions 
-                    ADD COLUMN IF NOT EXISTS category_id INTEGER REFERENCES master_categories(id);
-                """)
+                # Tablas y columnas del presupuesto viven en migrations/0001_base_schema.sql
+                apply_migrations(cur)
                 
                 print("✅ Budget Engine Schema applied.")
 
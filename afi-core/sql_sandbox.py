@@ -0,0 +1,123 @@
+"""
+Sandbox de ejecución para el SQL generado por el modelo.
+
+Dentro de la transacción de la consulta (todo con SET LOCAL, se deshace al devolver la
+conexión al pool):
+  1. SET LOCAL ROLE afi_readonly (migrations/0008): sin escritura, RLS siempre activo.
+  2. transaction_read_only, statement_timeout y work_mem acotados.
+  3. EXPLAIN previo: si el costo o las filas estimadas superan el umbral, se rechaza
+     sin ejecutar (QueryRejected).
+El LIMIT lo inyecta result_pager (paginación). Métricas por consulta en sandbox_stats().
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from psycopg2 import sql as pgsql
+from psycopg2.errors import QueryCanceled
+
+SQL_SANDBOX_ROLE = os.getenv("SQL_SANDBOX_ROLE", "afi_readonly")
+SQL_SANDBOX_TIMEOUT_MS = int(os.getenv("SQL_SANDBOX_TIMEOUT_MS", "5000"))
+SQL_SANDBOX_WORK_MEM = os.getenv("SQL_SANDBOX_WORK_MEM", "16MB")
+SQL_SANDBOX_MAX_COST = float(os.getenv("SQL_SANDBOX_MAX_COST", "500000"))
+SQL_SANDBOX_MAX_ROWS = float(os.getenv("SQL_SANDBOX_MAX_ROWS", "2000000"))
+SLOW_QUERY_LOG_SIZE = 20
+
+
+class QueryRejected(ValueError):
+    """El plan estimado supera los límites del sandbox; la consulta no se ejecuta."""
+
+
+_lock = threading.Lock()
+_role_available: Optional[bool] = None
+_stats = {
+    "queries": 0,
+    "rejected": 0,
+    "timeouts": 0,
+    "errors": 0,
+    "exec_ms_total": 0.0,
+    "exec_ms_max": 0.0,
+}
+_slow_queries: deque = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+
+def _check_role(cur) -> bool:
+    """¿Puede la sesión asumir el rol sandbox? Se consulta una vez por proceso."""
+    global _role_available
+    if _role_available is None:
+        if not SQL_SANDBOX_ROLE:
+            _role_available = False
+        else:
+            cur.execute(
+                "SELECT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = %s) AND pg_has_role(current_user, %s, 'MEMBER');",
+                (SQL_SANDBOX_ROLE, SQL_SANDBOX_ROLE),
+            )
+            _role_available = bool(cur.fetchone()[0])
+        if not _role_available:
+            print(f"⚠️ Rol sandbox '{SQL_SANDBOX_ROLE}' no disponible: solo read-only + timeouts.")
+    return _role_available
+
+
+def enter_sandbox(cur) -> None:
+    """Aplica rol y límites a la transacción actual (requiere autocommit=False)."""
+    if _check_role(cur):
+        cur.execute(pgsql.SQL("SET LOCAL ROLE {}").format(pgsql.Identifier(SQL_SANDBOX_ROLE)))
+    cur.execute("SET LOCAL transaction_read_only = on;")
+    cur.execute("SELECT set_config('statement_timeout', %s, true), set_config('work_mem', %s, true);",
+                (str(SQL_SANDBOX_TIMEOUT_MS), SQL_SANDBOX_WORK_MEM))
+
+
+def preflight(cur, query: str) -> dict:
+    """EXPLAIN sin ejecutar; lanza QueryRejected si el costo o las filas estimadas se pasan."""
+    cur.execute("EXPLAIN (FORMAT JSON) " + query)
+    plan = cur.fetchone()[0][0]["Plan"]
+    estimate = {"cost": float(plan.get("Total Cost", 0)), "rows": float(plan.get("Plan Rows", 0))}
+    if estimate["cost"] > SQL_SANDBOX_MAX_COST or estimate["rows"] > SQL_SANDBOX_MAX_ROWS:
+        with _lock:
+            _stats["rejected"] += 1
+        raise QueryRejected(
+            f"Consulta demasiado costosa (costo estimado {estimate['cost']:,.0f}, "
+            f"filas estimadas {estimate['rows']:,.0f})."
+        )
+    return estimate
+
+
+def record_execution(query: str, elapsed_ms: float, error: Optional[Exception] = None) -> None:
+    with _lock:
+        _stats["queries"] += 1
+        _stats["exec_ms_total"] += elapsed_ms
+        _stats["exec_ms_max"] = max(_stats["exec_ms_max"], elapsed_ms)
+        if isinstance(error, QueryCanceled):
+            _stats["timeouts"] += 1
+        elif error is not None:
+            _stats["errors"] += 1
+        if error is not None or elapsed_ms >= SQL_SANDBOX_TIMEOUT_MS / 2:
+            _slow_queries.append(
+                {"sql": query[:300], "ms": round(elapsed_ms, 1), "error": type(error).__name__ if error else None}
+            )
+
+
+@contextmanager
+def timed_query(query: str):
+    """Mide la ejecución y la registra en las métricas del sandbox (también si falla)."""
+    start = time.perf_counter()
+    try:
+        yield
+    except QueryRejected:
+        raise
+    except Exception as e:
+        record_execution(query, (time.perf_counter() - start) * 1000, e)
+        raise
+    record_execution(query, (time.perf_counter() - start) * 1000)
+
+
+def sandbox_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["exec_ms_avg"] = round(stats["exec_ms_total"] / stats["queries"], 2) if stats["queries"] else 0.0
+        stats["slow_queries"] = list(_slow_queries)
+        stats["role"] = SQL_SANDBOX_ROLE if _role_available else None
+    return stats
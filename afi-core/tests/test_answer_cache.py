@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import answer_cache
+
+RESULT = {"answer": "Gastaste 100", "viz_type": "metric", "data": [{"total": 100}]}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    answer_cache.clear()
+    answer_cache._stats.update({key: 0 for key in answer_cache._stats})
+    yield
+    answer_cache.clear()
+
+
+def test_exact_hit_ignores_case_accents_and_punctuation():
+    answer_cache.store(1, "¿Cuánto gasté este mes?", "", 3, RESULT)
+    assert answer_cache.lookup(1, "cuanto gaste este mes", "", 3) == RESULT
+    # Otro usuario, otro contexto de conversación u otra versión de datos: no se comparte
+    assert answer_cache.lookup(2, "cuanto gaste este mes", "", 3) is None
+    assert answer_cache.lookup(1, "cuanto gaste este mes", "USER: y en mayo?", 3) is None
+    assert answer_cache.lookup(1, "cuanto gaste este mes", "", 4) is None
+
+
+def test_semantic_hit_above_threshold_only():
+    answer_cache.store(1, "cuánto gasté este mes", "", 3, RESULT, embedding=[1.0, 0.0, 0.0])
+    assert answer_cache.lookup(1, "cuál fue mi gasto del mes", "", 3, embedding=[0.99, 0.05, 0.0]) == RESULT
+    assert answer_cache.lookup(1, "cuánto ingresé este mes", "", 3, embedding=[0.6, 0.8, 0.0]) is None
+    stats = answer_cache.answer_cache_stats()
+    assert stats["hits_semantic"] == 1
+    assert stats["misses"] == 1
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    monkeypatch.setattr(answer_cache, "ANSWER_CACHE_MAX", 2)
+    for question in ("a", "b", "c"):
+        answer_cache.store(1, question, "", 1, RESULT)
+    assert answer_cache.lookup(1, "a", "", 1) is None
+    assert answer_cache.lookup(1, "c", "", 1) == RESULT
+
+    monkeypatch.setattr(answer_cache, "ANSWER_CACHE_TTL", -1)
+    answer_cache.store(1, "d", "", 1, RESULT)
+    assert answer_cache.lookup(1, "d", "", 1) is None
+
+
+def test_semantic_hit_requires_same_key_terms():
+    """Embeddings casi iguales pero otro mes u otra categoría: otra respuesta."""
+    answer_cache.store(1, "¿cuánto gasté en enero?", "", 3, RESULT, embedding=[1.0, 0.0, 0.0])
+    answer_cache.store(1, "¿cuánto gasté en restaurantes?", "", 3, RESULT, embedding=[0.0, 1.0, 0.0])
+    assert answer_cache.lookup(1, "¿cuánto gasté en febrero?", "", 3, embedding=[0.999, 0.01, 0.0]) is None
+    assert answer_cache.lookup(1, "¿cuánto gasté en transporte?", "", 3, embedding=[0.01, 0.999, 0.0]) is None
+    assert answer_cache.lookup(1, "cuánto he gastado en enero", "", 3, embedding=[0.999, 0.01, 0.0]) == RESULT
+
+
+def test_lookup_returns_copy():
+    """Quien recibe la respuesta puede modificarla sin tocar la entrada compartida."""
+    answer_cache.store(1, "saldo", "", 1, RESULT)
+    first = answer_cache.lookup(1, "saldo", "", 1)
+    first["timestamp"] = "2026-01-01"
+    first["data"][0]["total"] = 0
+    assert answer_cache.lookup(1, "saldo", "", 1) == RESULT
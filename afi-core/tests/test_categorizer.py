@@ -0,0 +1,78 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import categorizer
+import db_ops
+
+
+@pytest.fixture
+def mock_cursor():
+    with patch("categorizer.get_conn") as mock_get_conn:
+        mock_conn = MagicMock()
+        cursor = MagicMock()
+        mock_get_conn.return_value = mock_conn
+        mock_conn.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value.__enter__.return_value = cursor
+        yield cursor
+
+
+def test_like_pattern_escapes_wildcards():
+    """Un keyword con % o _ se busca literal."""
+    assert categorizer._like_pattern("50%_OFF") == "%50\\%\\_off%"
+
+
+def test_apply_rules_single_statement_with_per_rule_counts(mock_cursor):
+    """Todas las reglas viajan en una sola sentencia y los conteos vuelven por regla."""
+    mock_cursor.fetchall.return_value = [(0, 7), (2, 3)]
+
+    result = categorizer.apply_category_rules(
+        [("uber", "Transporte"), {"keyword": "", "category": "X"}, ("rappi", "Comida", 5), ("netflix", "Ocio")]
+    )
+
+    assert mock_cursor.execute.call_count == 1
+    sql, params = mock_cursor.execute.call_args[0]
+    assert "UPDATE transactions" in sql
+    assert params["patterns"] == ["%uber%", "%rappi%", "%netflix%"]
+    assert params["priorities"] == [0, 5, 0]
+    assert result["updated"] == 10
+    assert [r["matches"] for r in result["rules"]] == [7, 0, 3]
+
+
+def test_dry_run_does_not_update(mock_cursor):
+    """La vista previa solo cuenta."""
+    mock_cursor.fetchall.return_value = [(0, 4)]
+
+    result = categorizer.apply_category_rules([("uber", "Transporte")], dry_run=True)
+
+    sql = mock_cursor.execute.call_args[0][0]
+    assert "UPDATE" not in sql
+    assert result == {
+        "updated": 4,
+        "dry_run": True,
+        "rules": [{"keyword": "uber", "category": "Transporte", "priority": 0, "matches": 4}],
+    }
+
+
+def test_bulk_categorize_delegates_to_engine():
+    with patch("db_ops.apply_category_rules", return_value={"updated": 12}) as mock_apply:
+        assert db_ops.bulk_categorize("Comida", ["rappi", "", "ifood"], user_id=7) == 12
+    mock_apply.assert_called_once_with([("rappi", "Comida"), ("ifood", "Comida")], user_id=7)
+
+
+def test_user_id_filters_preview_and_update(mock_cursor):
+    """afi_user salta el RLS: el filtro por usuario va explícito en el SQL."""
+    mock_cursor.fetchall.return_value = []
+
+    categorizer.apply_category_rules([("uber", "Transporte")], dry_run=True, user_id=7)
+    preview_sql, preview_params = mock_cursor.execute.call_args[0]
+    categorizer.apply_category_rules([("uber", "Transporte")], user_id=7)
+    apply_sql, apply_params = mock_cursor.execute.call_args[0]
+
+    assert preview_sql.count("AND t.user_id = %(user_id)s") == 2
+    assert apply_sql.count("AND t.user_id = %(user_id)s") == 2
+    assert preview_params["user_id"] == apply_params["user_id"] == 7
@@ -0,0 +1,58 @@
+import asyncio
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import context_loader
+
+
+def test_sources_run_in_parallel_and_failures_return_none():
+    async def source(delay, value):
+        await asyncio.sleep(delay)
+        return value
+
+    async def broken():
+        raise RuntimeError("db caída")
+
+    results, timings = asyncio.run(
+        context_loader.gather_timed("test", slow=source(0.2, "a"), fast=source(0.05, "b"), broken=broken())
+    )
+    assert results == {"slow": "a", "fast": "b", "broken": None}
+    # El total queda en la fuente más lenta, no en la suma
+    assert timings["total"] < 300
+    assert timings["slow"] >= 190
+    assert "test.slow" in context_loader.context_stats()
+
+
+def _conn_returning(row):
+    cur = MagicMock()
+    cur.fetchone.return_value = row
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cur
+    ctx = MagicMock()
+    ctx.__enter__.return_value = conn
+    return ctx, cur
+
+
+def test_load_user_row_maps_identity_profile_state_and_memory():
+    turns = [{"role": "user", "text": "hola"}, {"role": "model", "text": "¡Hola!"}]
+    row = (7, "573001", "Ana", "user", "active", "Ahorrar", "573001", "ctx", "NORMAL", turns, "resumen")
+    ctx, cur = _conn_returning(row)
+    with patch("context_loader.get_conn", return_value=ctx):
+        context = context_loader.load_user_row("573001")
+
+    assert cur.execute.call_count == 1
+    assert context["user_id"] == 7
+    assert context["profile"] == {"phone": "573001", "name": "Ana", "role": "user", "status": "active", "goals": "Ahorrar"}
+    assert context["state"] == {"file_context": "ctx", "mode": "NORMAL"}
+    assert context["memory"] == {"summary": "resumen", "turns": turns, "overflow": 0}
+
+
+def test_load_user_row_unknown_phone_is_empty():
+    ctx, _ = _conn_returning((None,) * 11)
+    with patch("context_loader.get_conn", return_value=ctx):
+        context = context_loader.load_user_row("000")
+    assert context["user_id"] is None and context["profile"] is None and context["state"] is None
+    assert context["memory"]["turns"] == []
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+import types
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import conversation_store
+
+
+def _turns(n, size=400):
+    return [{"role": "user" if i % 2 == 0 else "model", "text": f"{i} " + "x" * size} for i in range(n)]
+
+
+def test_window_respects_token_budget_and_starts_on_user_turn():
+    turns = _turns(40)
+    old, recent = conversation_store.split_window(turns, budget=1000)
+    assert old + recent == turns
+    assert sum(len(t["text"]) // 4 + 1 for t in recent) <= 1000
+    assert recent[0]["role"] == "user"
+    # El tamaño de la ventana no depende de cuán larga sea la conversación
+    assert len(conversation_store.split_window(_turns(400), budget=1000)[1]) == len(recent)
+    assert conversation_store.split_window(_turns(2), budget=1000) == ([], _turns(2))
+
+
+def test_same_user_serializes_while_other_users_run_in_parallel():
+    events = []
+
+    async def turn(phone, name):
+        async with conversation_store.user_lock(phone):
+            events.append(f"{name}:start")
+            await asyncio.sleep(0.02)
+            events.append(f"{name}:end")
+
+    async def burst():
+        await asyncio.gather(turn("a", "a1"), turn("a", "a2"), turn("b", "b1"))
+
+    asyncio.run(burst())
+    assert events.index("a1:end") < events.index("a2:start")
+    assert events.index("b1:start") < events.index("a1:end")
+
+
+def test_compact_releases_user_lock_while_summarizing():
+    """El siguiente mensaje del usuario no espera al resumen BATCH; un segundo compact no corre."""
+    events = []
+    turns = _turns(40)
+
+    async def slow_generate(model, prompt, priority=None):
+        events.append("llm:start")
+        await asyncio.sleep(0.05)
+        events.append("llm:end")
+        return types.SimpleNamespace(text="resumen")
+
+    async def next_turn():
+        await asyncio.sleep(0.01)
+        async with conversation_store.user_lock("573001"):
+            events.append("turn")
+
+    async def scenario():
+        return await asyncio.gather(
+            conversation_store.compact("573001"), conversation_store.compact("573001"), next_turn()
+        )
+
+    with patch("conversation_store._read_all", return_value=(turns, "")), \
+            patch("conversation_store._store_summary") as mock_store, \
+            patch("conversation_store.llm_client.generate", side_effect=slow_generate):
+        first, second, _ = asyncio.run(scenario())
+
+    assert (first, second) == (True, False)
+    assert events == ["llm:start", "turn", "llm:end"]
+    assert mock_store.call_args[0][2] == len(conversation_store.split_window(turns)[0])
+    assert "573001" not in conversation_store._compacting
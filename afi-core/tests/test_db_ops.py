@@ -0,0 +1,143 @@
+import datetime
+import os
+import sys
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import db_ops
+from bulk_loader import CsvRowStream, copy_transactions
+
+
+@pytest.fixture
+def mock_db_conn():
+    """Mock de conexión y cursor para evitar Postgres real."""
+    with patch("db_ops.get_conn") as mock_get_conn, patch("db_ops.ensure_partitions_for"):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_get_conn.return_value = mock_conn
+        mock_conn.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        yield mock_cursor
+
+
+def _tx(i, amount=-1000):
+    return {"date": "2024-01-15", "amount": amount, "description": f"Compra {i}"}
+
+
+def test_csv_stream_serializes_rows_in_chunks():
+    """El stream produce CSV válido por bloques y None como NULL."""
+    rows = [(1, datetime.date(2024, 1, 1), Decimal("-10.50"), 'Café "Juan", centro', None, "CLEARED", "x.csv")] * 3
+    stream = CsvRowStream(rows)
+    chunks = []
+    while True:
+        chunk = stream.read(16)
+        if not chunk:
+            break
+        chunks.append(chunk)
+
+    lines = "".join(chunks).splitlines()
+    assert stream.rows_written == 3
+    assert lines[0] == '1,2024-01-01,-10.50,"Café ""Juan"", centro",,CLEARED,x.csv'
+
+
+def test_copy_transactions_stages_and_merges():
+    """COPY llena la staging y un único INSERT ... SELECT la fusiona."""
+    cur = MagicMock()
+    cur.fetchall.return_value = [("f1",), ("f2",)]
+
+    inserted = copy_transactions(cur, [(1, "2024-01-01", 5, "a", None, "CLEARED", None)] * 2)
+
+    assert inserted == ["f1", "f2"]
+    assert "CREATE TEMP TABLE tx_stage" in cur.execute.call_args_list[0][0][0]
+    assert "COPY tx_stage" in cur.copy_expert.call_args[0][0]
+    assert "INSERT INTO transactions" in cur.execute.call_args_list[-1][0][0]
+    assert "RETURNING tx_fingerprint" in cur.execute.call_args_list[-1][0][0]
+
+
+def test_insert_transactions_small_batch_uses_values(mock_db_conn):
+    """Lotes pequeños (voz, correos) siguen con INSERT ... VALUES."""
+    fingerprint = db_ops.transaction_fingerprint(
+        db_ops.DEFAULT_TX_USER_ID, 1, datetime.date(2024, 1, 15), Decimal("-1000"), "Compra 1", None
+    )
+    with patch("db_ops.execute_values", return_value=[(fingerprint,)]) as mock_values, patch(
+        "db_ops.bulk_load_transactions"
+    ) as mock_copy:
+        inserted = db_ops.insert_transactions(1, [_tx(1), _tx(2, amount="abc"), _tx(3, amount=0)])
+
+    assert inserted == 1
+    mock_copy.assert_not_called()
+    rows = mock_values.call_args[0][2]
+    assert rows[0][2] == Decimal("-1000")
+    assert "ON CONFLICT DO NOTHING" in mock_values.call_args[0][1]
+
+
+def test_insert_transactions_ensures_partitions_for_loaded_months(mock_db_conn):
+    """Extractos históricos: la partición del mes existe antes de insertar."""
+    with patch("db_ops.execute_values", return_value=[]), patch("db_ops.ensure_partitions_for") as mock_ensure:
+        db_ops.insert_transactions(1, [_tx(1), dict(_tx(2), date="2019-05-03")])
+
+    mock_ensure.assert_called_once_with({datetime.date(2024, 1, 15), datetime.date(2019, 5, 3)})
+
+
+def test_insert_transactions_large_batch_uses_copy(mock_db_conn):
+    """Extractos grandes se cargan con COPY."""
+    txs = [_tx(i) for i in range(db_ops.BULK_COPY_MIN_ROWS)]
+    with patch("db_ops.execute_values") as mock_values, patch(
+        "db_ops.bulk_load_transactions", side_effect=lambda rows, user_id=None: [row[-1] for row in rows]
+    ) as mock_copy:
+        inserted = db_ops.insert_transactions(1, txs, import_source="extracto.csv")
+
+    assert inserted == len(txs)
+    mock_values.assert_not_called()
+    assert len(mock_copy.call_args[0][0]) == len(txs)
+
+
+def test_insert_new_transactions_returns_only_inserted_rows(mock_db_conn):
+    """Reimportar: lo que ON CONFLICT saltó no vuelve (no se repiten alertas)."""
+    txs = [_tx(1), _tx(2)]
+    second = db_ops.transaction_fingerprint(
+        db_ops.DEFAULT_TX_USER_ID, 1, datetime.date(2024, 1, 15), Decimal("-1000"), "Compra 2", "x.csv"
+    )
+    with patch("db_ops.execute_values", return_value=[(second,)]) as mock_values:
+        new_txs = db_ops.insert_new_transactions(1, txs, import_source="x.csv")
+
+    assert new_txs == [txs[1]]
+    assert "RETURNING tx_fingerprint" in mock_values.call_args[0][1]
+    with patch("db_ops.execute_values", return_value=[]):
+        assert db_ops.insert_new_transactions(1, txs, import_source="x.csv") == []
+
+
+def test_fingerprint_normalizes_description_and_amount():
+    """Mayúsculas, espacios y ceros de más no cambian la huella."""
+    day = datetime.date(2024, 1, 15)
+    a = db_ops.transaction_fingerprint(1, 2, day, Decimal("-1000"), "Café  JUAN ", "x.csv")
+    b = db_ops.transaction_fingerprint(1, 2, day, Decimal("-1000.0000"), "café juan", "x.csv")
+    assert a == b
+    assert a != db_ops.transaction_fingerprint(1, 2, day, Decimal("-1000"), "café juan", "y.csv")
+
+
+def test_fingerprint_matches_backfill_normalization():
+    """Mismas reglas que migrations/0003: todo espacio, ROUND mitad lejos de cero, vacía -> 'Movimiento'."""
+    day = datetime.date(2024, 1, 15)
+    assert db_ops.transaction_fingerprint(1, 2, day, Decimal("-5"), "\tuber\n eats", None) == \
+        db_ops.transaction_fingerprint(1, 2, day, Decimal("-5"), "uber eats", None)
+    assert db_ops.transaction_fingerprint(1, 2, day, Decimal("12.345"), "x", None) == \
+        db_ops.transaction_fingerprint(1, 2, day, Decimal("12.35"), "x", None)
+    assert db_ops.transaction_fingerprint(1, 2, day, Decimal("-5"), None, None) == \
+        db_ops.transaction_fingerprint(1, 2, day, Decimal("-5"), "Movimiento", None)
+
+
+def test_insert_transactions_keeps_identical_rows_with_ordinal(mock_db_conn):
+    """Dos movimientos idénticos en el mismo lote son legítimos: huellas distintas, estables entre corridas."""
+    with patch("db_ops.execute_values", return_value=[(1,), (1,)]) as mock_values:
+        db_ops.insert_transactions(1, [_tx(1), _tx(1)], import_source="x.csv")
+        first = [row[-1] for row in mock_values.call_args[0][2]]
+        db_ops.insert_transactions(1, [_tx(1), _tx(1)], import_source="x.csv")
+        second = [row[-1] for row in mock_values.call_args[0][2]]
+
+    assert len(set(first)) == 2
+    assert first == second
@@ -0,0 +1,104 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+from psycopg2 import extensions
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from db_pool import ConnectionPoolManager, PoolTimeout
+
+
+def _fake_conn():
+    conn = MagicMock()
+    conn.closed = 0
+    conn.autocommit = True
+    conn.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_IDLE
+    return conn
+
+
+@pytest.fixture
+def fake_pool():
+    """Pool psycopg2 simulado que entrega siempre la misma conexión."""
+    conn = _fake_conn()
+    with patch("db_pool.pg_pool.ThreadedConnectionPool") as pool_cls:
+        pool = MagicMock()
+        pool.getconn.return_value = conn
+        pool_cls.return_value = pool
+        yield pool, conn
+
+
+def _executed_sql(conn):
+    cursor = conn.cursor.return_value.__enter__.return_value
+    return [args[0] for args, _ in cursor.execute.call_args_list]
+
+
+def test_user_id_is_set_on_checkout_and_reset_on_return(fake_pool):
+    """La identidad RLS se fija al prestar y se limpia al devolver."""
+    pool, conn = fake_pool
+    manager = ConnectionPoolManager(1, 2, timeout=1, healthcheck_after=60)
+
+    with manager.acquire(user_id=7):
+        pass
+
+    calls = _executed_sql(conn)
+    assert any("set_config('app.current_user_id'" in sql for sql in calls)
+    assert calls[-1].startswith("RESET app.current_user_id")
+    pool.putconn.assert_called_once_with(conn)
+
+
+def test_close_returns_connection_once(fake_pool):
+    """close() devuelve la conexión al pool una sola vez."""
+    pool, _conn = fake_pool
+    manager = ConnectionPoolManager(1, 2, timeout=1, healthcheck_after=60)
+
+    pooled = manager.acquire()
+    pooled.close()
+    pooled.close()
+
+    assert pool.putconn.call_count == 1
+    assert manager.stats()["in_use"] == 0
+
+
+def test_open_transaction_is_rolled_back_on_return(fake_pool):
+    """Una transacción abierta no se filtra al siguiente usuario del pool."""
+    _pool, conn = fake_pool
+    manager = ConnectionPoolManager(1, 2, timeout=1, healthcheck_after=60)
+
+    pooled = manager.acquire()
+    conn.autocommit = False
+    conn.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_INTRANS
+    pooled.close()
+
+    conn.rollback.assert_called()
+    assert conn.autocommit is True
+
+
+def test_saturated_pool_times_out(fake_pool):
+    """Con el pool lleno, acquire falla tras el timeout y lo contabiliza."""
+    manager = ConnectionPoolManager(1, 1, timeout=0.01, healthcheck_after=60)
+
+    held = manager.acquire()
+    with pytest.raises(PoolTimeout):
+        manager.acquire()
+    held.close()
+
+    stats = manager.stats()
+    assert stats["timeouts"] == 1
+    assert stats["peak_in_use"] == 1
+
+
+def test_broken_connection_is_discarded(fake_pool):
+    """Una conexión cerrada por el servidor se descarta y se pide otra."""
+    pool, conn = fake_pool
+    broken = _fake_conn()
+    broken.closed = 2
+    pool.getconn.side_effect = [broken, conn]
+    manager = ConnectionPoolManager(1, 2, timeout=1, healthcheck_after=60)
+
+    with manager.acquire() as pooled:
+        assert pooled._conn is conn
+
+    pool.putconn.assert_any_call(broken, close=True)
+    assert manager.stats()["discarded"] == 1
@@ -0,0 +1,50 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import embedding_cache
+
+
+@pytest.fixture
+def mock_cursor():
+    embedding_cache.clear_memory()
+    embedding_cache._stats.update({key: 0 for key in embedding_cache._stats})
+    with patch("embedding_cache.get_conn") as mock_get_conn:
+        mock_conn = MagicMock()
+        cursor = MagicMock()
+        mock_get_conn.return_value = mock_conn
+        mock_conn.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value.__enter__.return_value = cursor
+        cursor.fetchone.return_value = None
+        yield cursor
+
+
+def test_key_normalizes_text_but_separates_model_and_task():
+    key = embedding_cache.cache_key("  Hola   AFI ", "retrieval_query")
+    assert key == embedding_cache.cache_key("hola afi", "retrieval_query")
+    assert key != embedding_cache.cache_key("hola afi", "retrieval_document")
+    assert key != embedding_cache.cache_key("hola afi", "retrieval_query", model="models/otro")
+
+
+def test_api_called_once_then_served_from_memory(mock_cursor):
+    with patch("llm_client.genai.embed_content", return_value={"embedding": [0.1, 0.2]}) as mock_embed:
+        assert embedding_cache.embed_text("Hola") == [0.1, 0.2]
+        assert embedding_cache.embed_text("hola ") == [0.1, 0.2]
+    assert mock_embed.call_count == 1
+    # Persistido para otros procesos
+    assert any("INSERT INTO embedding_cache" in args[0] for args, _ in mock_cursor.execute.call_args_list)
+    stats = embedding_cache.embedding_cache_stats()
+    assert stats["api_calls"] == 1 and stats["memory_hits"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_db_hit_skips_api(mock_cursor):
+    mock_cursor.fetchone.return_value = ([0.5, 0.5],)
+    with patch("llm_client.genai.embed_content") as mock_embed:
+        assert embedding_cache.embed_text("gracias") == [0.5, 0.5]
+    mock_embed.assert_not_called()
+    assert embedding_cache.embedding_cache_stats()["db_hits"] == 1
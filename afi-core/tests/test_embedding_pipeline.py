@@ -0,0 +1,44 @@
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import embedding_pipeline
+import quota_scheduler
+
+
+def test_embed_batch_retries_rate_limit_through_quota_scheduler():
+    calls = [Exception("429 Resource has been exhausted"), {"embedding": [[0.1], [0.2]]}]
+    with patch("llm_client.genai.embed_content", side_effect=calls) as mock_embed, \
+            patch("quota_scheduler.QUOTA_BACKOFF_SECONDS", 0), \
+            patch("quota_scheduler.record_rate_limit", wraps=quota_scheduler.record_rate_limit) as mock_429:
+        assert embedding_pipeline.embed_batch(["a", "b"], model="models/embed-test") == [[0.1], [0.2]]
+    assert mock_embed.call_count == 2
+    mock_429.assert_called_once_with("models/embed-test")
+
+    with patch("llm_client.genai.embed_content", side_effect=ValueError("400 bad request")):
+        with pytest.raises(ValueError):
+            embedding_pipeline.embed_batch(["a"], model="models/embed-test")
+
+
+def test_resume_embeds_only_missing_chunks_in_batches():
+    chunks = ["uno", "dos", "tres", "cuatro", "dos"]
+    done = {embedding_pipeline.chunk_hash("uno")}
+    sent = []
+
+    def fake_embed(texts, model):
+        sent.append(list(texts))
+        return [[0.0]] * len(texts)
+
+    with patch("embedding_pipeline.stored_hashes", return_value=done), \
+            patch("embedding_pipeline.embed_batch", side_effect=fake_embed), \
+            patch("embedding_pipeline._store_batch", side_effect=lambda source, batch, emb, meta, model: len(batch)) as mock_store:
+        stats = embedding_pipeline.embed_and_store("libro.pdf", chunks, batch_size=2, workers=2)
+
+    assert sorted(text for batch in sent for text in batch) == ["cuatro", "dos", "tres"]
+    assert all(len(batch) <= 2 for batch in sent)
+    assert stats["skipped"] == 2 and stats["stored"] == 3 and stats["failed"] == 0
+    assert mock_store.call_count == 2
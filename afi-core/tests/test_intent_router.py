@@ -0,0 +1,51 @@
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import intent_router
+
+
+def test_routine_questions_match_with_period():
+    assert intent_router.match("¿Cuánto gasté hoy?") == {"intent": "spend_day", "period": "current_month", "day": "hoy"}
+    assert intent_router.match("cuánto gasté el mes pasado")["period"] == "last_month"
+    assert intent_router.match("¿Cuál es mi saldo?")["intent"] == "balance"
+    assert intent_router.match("Gastos por categoría del mes pasado") == {
+        "intent": "spend_by_category", "period": "last_month"
+    }
+    assert intent_router.match("Hola AFI, muéstrame el gráfico del mes por favor")["intent"] == "spending_chart"
+
+
+def test_open_ended_or_filtered_questions_go_to_llm():
+    # Un filtro extra (categoría, comercio) cambia la respuesta: no hay plantilla para eso
+    assert intent_router.match("¿Cuánto gasté este mes en restaurantes?") is None
+    assert intent_router.match("¿Qué hago con mi dinero?") is None
+    assert intent_router.match("saldo de la tarjeta de crédito") is None
+
+
+def test_category_answer_sorted_for_dashboard():
+    spend = {"Mercado": -200.0, "Transporte": -500.0}
+    with patch("intent_router.category_spend", return_value=spend) as mock_spend:
+        result = intent_router.answer_ui(intent_router.match("gastos por categoria"), 7)
+
+    mock_spend.assert_called_once_with(7, "current_month")
+    assert result["viz_type"] == "bar_chart"
+    assert result["data"] == [{"categoria": "Transporte", "gasto": 500.0}, {"categoria": "Mercado", "gasto": 200.0}]
+    assert "Transporte: $500" in result["answer"]
+
+
+def test_db_error_falls_back_to_llm():
+    with patch("intent_router.net_balance", side_effect=RuntimeError("db caída")):
+        assert intent_router.answer_text(intent_router.match("saldo"), 7) is None
+
+
+def test_anonymous_request_skips_fast_path():
+    # Sin user_id el pool (afi_user) salta el RLS: debe seguir al agente SQL con su sandbox
+    with patch("intent_router.net_balance") as mock_balance, patch("intent_router.get_conn") as mock_conn:
+        assert intent_router.answer_ui(intent_router.match("saldo"), None) is None
+        assert intent_router.answer_ui(intent_router.match("cuanto gaste hoy"), None) is None
+        assert intent_router.answer_text(intent_router.match("gastos del mes"), None) is None
+
+    mock_balance.assert_not_called()
+    mock_conn.assert_not_called()
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import job_queue
+from job_queue import Job, JobFailed, LeaseLost
+
+
+def _conn_with(cursor):
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cursor
+    ctx = MagicMock()
+    ctx.__enter__.return_value = conn
+    return ctx
+
+
+def _job(kind="t_kind", attempts=1, max_attempts=3):
+    return Job((11, kind, {"n": 1}, attempts, max_attempts, "573001", 7))
+
+
+def test_enqueue_with_same_dedupe_key_returns_running_job():
+    cur = MagicMock()
+    # INSERT ... ON CONFLICT DO NOTHING no devuelve fila -> se busca el trabajo en curso
+    cur.fetchone.side_effect = [None, (5,)]
+    with patch("job_queue.get_conn", return_value=_conn_with(cur)):
+        job_id = job_queue.enqueue("bulk_categorize", {"category_name": "Mercado"}, dedupe_key="7:mercado")
+
+    assert job_id == 5
+    insert_sql = cur.execute.call_args_list[0][0][0]
+    assert "ON CONFLICT DO NOTHING" in insert_sql
+    select_sql, params = cur.execute.call_args_list[1][0]
+    assert "status IN ('queued', 'running')" in select_sql
+    assert params == {"kind": "bulk_categorize", "dedupe": "7:mercado", "once": None}
+
+
+def test_once_key_also_matches_finished_jobs():
+    cur = MagicMock()
+    cur.fetchone.side_effect = [None, (8,)]
+    with patch("job_queue.get_conn", return_value=_conn_with(cur)):
+        assert job_queue.enqueue("morning_briefing", once_key="2026-10-17") == 8
+
+    select_sql, params = cur.execute.call_args_list[1][0]
+    assert "once_key = %(once)s AND status <> 'failed'" in select_sql
+    assert params["once"] == "2026-10-17"
+
+
+def test_complete_and_fail_require_lease_owner():
+    cur = MagicMock()
+    cur.rowcount = 0
+    job = _job()
+    job.locked_by = "w1"
+    with patch("job_queue.get_conn", return_value=_conn_with(cur)):
+        with pytest.raises(LeaseLost):
+            job_queue.complete(job, {"ok": True})
+        with pytest.raises(LeaseLost):
+            job_queue.fail(job, "boom")
+
+    complete_sql, complete_params = cur.execute.call_args_list[0][0]
+    assert "locked_by = %s AND status = 'running'" in complete_sql
+    assert complete_params[1:] == (11, "w1")
+    assert cur.execute.call_args_list[1][0][1]["worker"] == "w1"
+
+
+def test_claim_uses_skip_locked_and_reclaims_expired_leases():
+    cur = MagicMock()
+    cur.fetchone.return_value = (3, "t_kind", {}, 1, 3, None, None)
+    with patch("job_queue.get_conn", return_value=_conn_with(cur)):
+        job = job_queue.claim(["t_kind"], "w1")
+
+    sql = cur.execute.call_args[0][0]
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "locked_until < CURRENT_TIMESTAMP" in sql
+    assert job.id == 3 and job.attempts == 1
+    assert job_queue.claim([], "w1") is None
+
+
+def test_errors_retry_until_max_attempts_and_job_failed_is_final():
+    calls = []
+
+    def handler(payload, job):
+        raise RuntimeError("transitorio")
+
+    def final(payload, job):
+        raise JobFailed("archivo ilegible")
+
+    job_queue.register("t_retry", handler)
+    job_queue.register("t_final", final)
+    with patch("job_queue.fail", side_effect=lambda job, error, retry=True: calls.append((job.kind, retry)) or retry), \
+            patch("job_queue.complete") as mock_complete:
+        asyncio.run(job_queue._execute(_job("t_retry"), "w1"))
+        asyncio.run(job_queue._execute(_job("t_final"), "w1"))
+        # Lease vencido sin intentos restantes: no se vuelve a ejecutar
+        asyncio.run(job_queue._execute(_job("t_retry", attempts=4), "w1"))
+
+    assert calls == [("t_retry", True), ("t_final", False), ("t_retry", False)]
+    mock_complete.assert_not_called()
+
+
+def test_success_stores_result_and_reports_progress():
+    def handler(payload, job):
+        job.progress(0.5, "mitad")
+        return {"updated": payload["n"]}
+
+    job_queue.register("t_ok", handler)
+    job = _job("t_ok")
+    with patch("job_queue.complete") as mock_complete:
+        asyncio.run(job_queue._execute(job, "w1"))
+
+    mock_complete.assert_called_once_with(job, {"updated": 1})
+    assert job._progress == (0.5, "mitad")
+
+
+def test_per_kind_concurrency_limit():
+    job_queue.register("t_limited", lambda payload, job: None, concurrency=1)
+    assert "t_limited" in job_queue._available_kinds()
+    job_queue._count_running("t_limited", 1)
+    try:
+        assert "t_limited" not in job_queue._available_kinds()
+    finally:
+        job_queue._count_running("t_limited", -1)
+
+
+def test_status_report_for_agent():
+    job_queue.register("t_report", lambda payload, job: None, label="Categorización masiva")
+    cur = MagicMock()
+    cur.fetchall.return_value = [
+        (12, "t_report", "running", 0.4, "banco.pdf", None, 1, 3),
+        (9, "t_report", "failed", 0.0, None, "RuntimeError: sin conexión", 3, 3),
+    ]
+    with patch("job_queue.get_conn", return_value=_conn_with(cur)):
+        text = job_queue.status_report(user_id=7)
+
+    assert "#12 Categorización masiva: ⚙️ en proceso (40%, banco.pdf)" in text
+    assert "#9 Categorización masiva: ❌ falló — RuntimeError: sin conexión" in text
+    assert cur.execute.call_args[0][1] == (7, 5)
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import llm_client
+
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+    llm_client._stats.update({key: 0 for key in llm_client._stats})
+
+
+def test_generate_caps_concurrency_without_threads():
+    active, peak = 0, 0
+
+    async def slow_generate(contents, request_options=None):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return contents
+
+    model = MagicMock()
+    model.generate_content_async = slow_generate
+
+    async def burst():
+        return await asyncio.gather(*(llm_client.generate("gemini-2.5-flash", f"p{i}") for i in range(40)))
+
+    with patch("llm_client.genai.GenerativeModel", return_value=model), \
+            patch("llm_client.LLM_MAX_CONCURRENCY", 5), patch("llm_client._async_limits", {}):
+        results = asyncio.run(burst())
+
+    assert results == [f"p{i}" for i in range(40)]
+    assert peak == 5
+    stats = llm_client.llm_client_stats()
+    assert stats["calls"] == 40 and stats["in_flight"] == 0 and stats["max_in_flight"] == 5
+
+
+def test_timeout_raises_llm_timeout_and_is_counted():
+    async def hang(*_, **__):
+        await asyncio.sleep(1)
+
+    model = MagicMock()
+    model.generate_content_async = hang
+    with patch("llm_client.genai.GenerativeModel", return_value=model):
+        with pytest.raises(llm_client.LLMTimeout):
+            asyncio.run(llm_client.generate("gemini-2.5-flash", "hola", timeout=0.05))
+    stats = llm_client.llm_client_stats()
+    assert stats["timeouts"] == 1 and stats["errors"] == 0 and stats["in_flight"] == 0
@@ -1,7 +1,8 @@
+import asyncio
 import os
 import sys
 import types
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -52,7 +53,9 @@ class _DummyCronTrigger:
         pass
 
 
-sys.modules.setdefault("fastapi", types.SimpleNamespace(FastAPI=_DummyFastAPI, Request=MagicMock()))
+sys.modules.setdefault(
+    "fastapi", types.SimpleNamespace(FastAPI=_DummyFastAPI, Request=MagicMock(), HTTPException=Exception)
+)
 sys.modules.setdefault("pydantic", types.SimpleNamespace(BaseModel=_DummyBaseModel))
 
 _google_mod = types.ModuleType("google")
@@ -74,6 +77,11 @@ sys.modules.setdefault(
         get_financial_audit=lambda: None,
         create_category_tool=lambda *_, **__: None,
         categorize_payees_tool=lambda *_, **__: None,
+        create_account_tool=lambda *_, **__: None,
+        find_and_import_history_tool=lambda *_, **__: None,
+        complete_onboarding_tool=lambda *_, **__: None,
+        confirm_import_tool=lambda *_, **__: None,
+        generate_spending_chart_tool=lambda *_, **__: None,
     ),
 )
 
@@ -95,18 +103,27 @@ MOCK_CSV_DATA = '{"total_spent":100,"summary":"Gastos: Uber $500, D1 $200"}'
 @pytest.fixture
 def mock_dependencies():
     """Mockea dependencias externas del router."""
-    with patch("main.get_user_context") as mock_get_ctx, patch(
+    mock_get_ctx = MagicMock()
+    with patch(
+        "main.context_loader.load_user_row",
+        side_effect=lambda phone: {
+            "user_id": None,
+            "profile": None,
+            "state": mock_get_ctx(phone),
+            "memory": {"summary": "", "turns": [], "overflow": 0},
+        },
+    ), patch(
         "main.save_user_context"
     ) as mock_save_ctx, patch("main.get_financial_audit") as mock_audit, patch(
         "main.genai.GenerativeModel"
     ) as mock_model_cls, patch(
         "main.init_db"
-    ) as mock_init, patch("main.genai.embed_content") as mock_embed:
+    ) as mock_init, patch("main.genai.embed_content_async", new_callable=AsyncMock) as mock_embed, patch("main.conversation_store.append_turns") as mock_append:
         mock_chat = MagicMock()
         mock_response = MagicMock()
         mock_response.text = "Respuesta de IA"
         mock_response.parts = []  # evita loop de tool-calls
-        mock_chat.send_message.return_value = mock_response
+        mock_chat.send_message_async = AsyncMock(return_value=mock_response)
 
         mock_model_instance = MagicMock()
         mock_model_instance.start_chat.return_value = mock_chat
@@ -120,6 +137,7 @@ def mock_dependencies():
             "model_cls": mock_model_cls,
             "chat": mock_chat,
             "embed": mock_embed,
+            "append": mock_append,
         }
 
 
@@ -132,9 +150,12 @@ def test_cold_start_with_csv(mock_dependencies):
     mocks["get_ctx"].return_value = None
     mocks["audit"].return_value = MOCK_CSV_DATA
 
-    response = main.ai_router("Hola", USER_CTX)
+    response = asyncio.run(main.ai_router("Hola", USER_CTX))
 
     assert response == "Respuesta de IA"
+    mocks["append"].assert_called_once_with(
+        TEST_PHONE, [{"role": "user", "text": "Hola"}, {"role": "model", "text": "Respuesta de IA"}]
+    )
     mocks["audit"].assert_called_once()
     mocks["save_ctx"].assert_called_once_with(TEST_PHONE, file_summary=MOCK_CSV_DATA, mode="ONBOARDING")
 
@@ -152,7 +173,7 @@ def test_warm_start_memory_hit(mock_dependencies):
     mocks = mock_dependencies
     mocks["get_ctx"].return_value = {"file_context": "Memoria Persistente", "mode": "NORMAL"}
 
-    main.ai_router("Hola", USER_CTX)
+    asyncio.run(main.ai_router("Hola", USER_CTX))
 
     mocks["audit"].assert_not_called()
     mocks["save_ctx"].assert_not_called()
@@ -171,9 +192,52 @@ def test_empty_state_no_csv(mock_dependencies):
     mocks["get_ctx"].return_value = None
     mocks["audit"].side_effect = Exception("No file")
 
-    main.ai_router("Hola", USER_CTX)
+    asyncio.run(main.ai_router("Hola", USER_CTX))
 
     call_args = mocks["model_cls"].call_args
     system_instruction = call_args[1]["system_instruction"]
     assert "MEMORIA DEL USUARIO" in system_instruction
     mocks["save_ctx"].assert_not_called()
+
+
+def test_routine_question_skips_gemini(mock_dependencies):
+    """
+    Caso: Pregunta rutinaria ("¿cuánto gasté este mes?") de un usuario en modo NORMAL.
+    Debe: Responder con la plantilla de intent_router, sin llamar a Gemini, y guardar el turno.
+    """
+    mocks = mock_dependencies
+    mocks["get_ctx"].return_value = {"file_context": "Memoria Persistente", "mode": "NORMAL"}
+
+    with patch("main.intent_router.answer_text", return_value="💸 Gastos de este mes: $100") as mock_answer:
+        response = asyncio.run(main.ai_router("¿Cuánto gasté este mes?", USER_CTX))
+
+    assert response == "💸 Gastos de este mes: $100"
+    assert mock_answer.call_args[0][0]["intent"] == "spend_month"
+    mocks["model_cls"].assert_not_called()
+    mocks["embed"].assert_not_called()
+    mocks["append"].assert_called_once()
+
+
+def test_parallel_tool_calls_answered_in_one_message(mock_dependencies):
+    """
+    Caso: Gemini pide dos herramientas en la misma respuesta.
+    Debe: Ejecutarlas juntas y devolver ambos resultados en un solo mensaje de seguimiento.
+    """
+    mocks = mock_dependencies
+    mocks["get_ctx"].return_value = {"file_context": "Memoria Persistente", "mode": "NORMAL"}
+
+    calls = [MagicMock(), MagicMock()]
+    calls[0].name, calls[1].name = "get_financial_audit", "generate_spending_chart_tool"
+    tool_response = MagicMock()
+    tool_response.parts = [MagicMock(function_call=call) for call in calls]
+    final = MagicMock(text="Listo", parts=[])
+    mocks["chat"].send_message_async = AsyncMock(side_effect=[tool_response, final])
+
+    run_calls = AsyncMock(return_value=[("get_financial_audit", "{}"), ("generate_spending_chart_tool", "ok")])
+    with patch.object(main.TOOLS, "run_calls", run_calls):
+        response = asyncio.run(main.ai_router("Analiza y grafica", USER_CTX))
+
+    assert response == "Listo"
+    run_calls.assert_awaited_once()
+    assert run_calls.call_args[0][0] == calls
+    assert mocks["chat"].send_message_async.await_count == 2
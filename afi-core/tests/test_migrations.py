@@ -0,0 +1,83 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import migrate
+
+
+def _executed_sql(mock_cursor):
+    return [args[0] for args, _ in mock_cursor.execute.call_args_list]
+
+
+@pytest.fixture
+def migrations_dir(tmp_path):
+    """Directorio temporal con migraciones de prueba."""
+    (tmp_path / "0002_second.sql").write_text("ALTER TABLE t ADD COLUMN b INT;")
+    (tmp_path / "0001_first.sql").write_text("CREATE TABLE t (a INT);")
+    (tmp_path / "README.md").write_text("no es migración")
+    with patch.object(migrate, "MIGRATIONS_DIR", tmp_path):
+        yield tmp_path
+
+
+def test_list_migrations_sorted_and_filtered(migrations_dir):
+    """Solo archivos NNNN_nombre.sql, en orden de versión."""
+    versions = [(v, n) for v, n, _ in migrate.list_migrations()]
+    assert versions == [(1, "first"), (2, "second")]
+
+
+def test_apply_only_pending_versions(migrations_dir):
+    """Las versiones registradas en schema_version no se re-ejecutan."""
+    cur = MagicMock()
+    cur.fetchall.return_value = [(1,)]
+
+    applied = migrate.apply_migrations(cur)
+
+    calls = _executed_sql(cur)
+    assert applied == [2]
+    assert "CREATE TABLE t (a INT);" not in calls
+    assert "ALTER TABLE t ADD COLUMN b INT;" in calls
+    assert calls.index("BEGIN;") < calls.index("ALTER TABLE t ADD COLUMN b INT;") < calls.index("COMMIT;")
+    assert any("pg_advisory_unlock" in sql for sql in calls)
+
+
+def test_failed_migration_rolls_back_and_releases_lock(migrations_dir):
+    """Un error revierte la migración y libera el advisory lock."""
+    cur = MagicMock()
+    cur.fetchall.return_value = []
+
+    def _execute(sql, params=None):
+        if sql.startswith("CREATE TABLE t"):
+            raise RuntimeError("boom")
+
+    cur.execute.side_effect = _execute
+
+    with pytest.raises(RuntimeError):
+        migrate.apply_migrations(cur)
+
+    calls = _executed_sql(cur)
+    assert "ROLLBACK;" in calls
+    assert not any("INSERT INTO schema_version" in sql for sql in calls)
+    assert any("pg_advisory_unlock" in sql for sql in calls)
+
+
+def test_no_transaction_marker_skips_begin(migrations_dir):
+    """Las migraciones marcadas se ejecutan fuera de transacción."""
+    (migrations_dir / "0003_concurrent.sql").write_text(
+        "-- migrate:no-transaction\nCREATE INDEX CONCURRENTLY i ON t(a);"
+    )
+    cur = MagicMock()
+    cur.fetchall.return_value = [(1,), (2,)]
+
+    migrate.apply_migrations(cur)
+
+    assert "BEGIN;" not in _executed_sql(cur)
+
+
+def test_repo_migrations_are_numbered_consecutively():
+    """Las migraciones del repo no tienen huecos ni versiones repetidas."""
+    versions = [v for v, _, _ in migrate.list_migrations()]
+    assert versions == list(range(1, len(versions) + 1))
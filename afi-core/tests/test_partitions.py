@@ -0,0 +1,50 @@
+import datetime
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import partitions
+
+
+def test_partition_name_and_parse():
+    assert partitions.partition_name(datetime.date(2024, 3, 1)) == "transactions_p2024_03"
+    assert partitions._parse_month("2019-05") == datetime.date(2019, 5, 1)
+
+
+def test_detach_clears_rollup_and_detaches_in_one_transaction():
+    """Archivar un mes = DETACH de su partición + limpiar su rollup, sin DELETE sobre transactions."""
+    with patch("partitions.get_conn") as mock_get_conn:
+        conn = MagicMock()
+        cursor = MagicMock()
+        mock_get_conn.return_value = conn
+        conn.__enter__.return_value = conn
+        conn.cursor.return_value.__enter__.return_value = cursor
+        cursor.fetchone.return_value = ("transactions_p2019_05",)
+
+        assert partitions.detach_partition(datetime.date(2019, 5, 1)) is True
+
+    assert conn.autocommit is False
+    sql = [args[0] for args, _ in cursor.execute.call_args_list]
+    assert sql[1] == "DELETE FROM monthly_rollups WHERE month = %s;"
+    assert sql[2] == 'ALTER TABLE transactions DETACH PARTITION "transactions_p2019_05";'
+    assert not any("DROP TABLE" in s for s in sql)
+
+
+def test_ensure_partitions_for_only_months_with_data():
+    """Solo los meses presentes en la carga, y una sola vez por proceso."""
+    with patch("partitions.get_conn") as mock_get_conn, patch.object(partitions, "_ensured_months", set()):
+        conn = MagicMock()
+        cursor = MagicMock()
+        mock_get_conn.return_value = conn
+        conn.__enter__.return_value = conn
+        conn.cursor.return_value.__enter__.return_value = cursor
+        cursor.rowcount = 2
+
+        days = [datetime.date(2019, 5, 3), datetime.date(2019, 5, 20), datetime.date(2021, 1, 9)]
+        assert partitions.ensure_partitions_for(days) == 2
+        assert partitions.ensure_partitions_for(days) == 0
+
+    assert cursor.execute.call_count == 1
+    assert cursor.execute.call_args[0][1] == ([datetime.date(2019, 5, 1), datetime.date(2021, 1, 1)],)
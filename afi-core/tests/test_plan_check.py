@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import plan_check
+
+PLAN_CHECK_DB = os.getenv("PLAN_CHECK_DB")
+
+
+def test_find_seq_scans_flags_partitions_of_watched_tables():
+    plan = {
+        "Plan": {
+            "Node Type": "Aggregate",
+            "Plans": [
+                {
+                    "Node Type": "Append",
+                    "Plans": [
+                        {"Node Type": "Index Only Scan", "Relation Name": "transactions_p2024_01"},
+                        {"Node Type": "Seq Scan", "Relation Name": "transactions_p2024_02"},
+                        {"Node Type": "Seq Scan", "Relation Name": "transactions_default"},
+                        {"Node Type": "Seq Scan", "Relation Name": "account_types"},
+                    ],
+                }
+            ],
+        }
+    }
+    assert plan_check.find_seq_scans(plan) == ["transactions_p2024_02", "transactions_default"]
+
+
+def test_regressions_lists_queries_with_seq_scans():
+    results = [{"name": "a", "seq_scans": []}, {"name": "b", "seq_scans": ["transactions_p2024_01"]}]
+    assert plan_check.regressions(results) == {"b"}
+
+
+@pytest.mark.skipif(not PLAN_CHECK_DB, reason="PLAN_CHECK_DB no definido (DB desechable para sembrar)")
+def test_canonical_queries_use_indexes_on_seeded_db():
+    """Migra y siembra una DB desechable; ninguna consulta canónica debe caer en Seq Scan."""
+    import psycopg2
+
+    import database
+    from migrate import apply_migrations
+
+    conn = psycopg2.connect(
+        host=database.DB_HOST, user=database.DB_USER, password=database.DB_PASS, dbname=PLAN_CHECK_DB
+    )
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            apply_migrations(cur)
+            plan_check.seed_dataset(cur)
+            results = plan_check.run_checks(cur)
+    finally:
+        conn.close()
+
+    assert plan_check.regressions(results) == set(), [(r["name"], r["seq_scans"]) for r in results]
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import quota_scheduler
+from quota_scheduler import ALERT, BATCH, INTERACTIVE
+
+
+@pytest.fixture(autouse=True)
+def fresh_quotas():
+    with patch("quota_scheduler._quotas", {}), patch("quota_scheduler._limits", {"test-model": (600, 0)}), \
+            patch("quota_scheduler.QUOTA_BURST_SECONDS", 0):
+        yield
+
+
+def test_interactive_jumps_ahead_of_queued_batch():
+    # 600 RPM sin ráfaga: un turno cada 0.1 s
+    order = []
+
+    async def call(name, priority, delay=0.0):
+        await asyncio.sleep(delay)
+        await quota_scheduler.acquire_async("models/test-model", priority)
+        order.append(name)
+
+    async def burst():
+        await asyncio.gather(
+            *(call(f"batch{i}", BATCH) for i in range(4)),
+            call("alert", ALERT, 0.01),
+            call("chat", INTERACTIVE, 0.02),
+        )
+
+    asyncio.run(burst())
+    # batch0 usa el bucket inicial; el resto de los lotes queda detrás del chat y la alerta
+    assert order[:3] == ["batch0", "chat", "alert"]
+    stats = quota_scheduler.quota_stats()["test-model"]
+    assert stats["granted"] == {"interactive": 1, "alert": 1, "batch": 4}
+    assert sum(stats["queue_depth"].values()) == 0
+
+
+def test_rate_limit_pauses_and_slows_model_then_recovers():
+    assert quota_scheduler.is_rate_limited(Exception("429 Resource has been exhausted"))
+    assert not quota_scheduler.is_rate_limited(ValueError("400 bad request"))
+
+    assert quota_scheduler.record_rate_limit("test-model") == 1
+    assert quota_scheduler.record_rate_limit("test-model") == 2
+    stats = quota_scheduler.quota_stats()["test-model"]
+    assert stats["rate_factor"] == 0.25 and stats["rate_limited"] == 2 and stats["cooldown_s"] > 1
+
+    quota_scheduler.record_success("test-model")
+    assert quota_scheduler.quota_stats()["test-model"]["rate_factor"] == 0.3
+    assert quota_scheduler.record_rate_limit("test-model") == 1
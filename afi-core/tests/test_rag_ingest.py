@@ -0,0 +1,43 @@
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("PyPDF2")
+import rag_ingest  # noqa: E402
+
+READY = {
+    "file_hash": "abc",
+    "chunk_size": rag_ingest.CHUNK_SIZE,
+    "chunk_overlap": rag_ingest.CHUNK_OVERLAP,
+    "embedding_model": "models/text-embedding-004",
+    "status": "ready",
+}
+
+
+def test_reindex_reason_from_manifest():
+    model = "models/text-embedding-004"
+    assert rag_ingest.reindex_reason(None, "abc", model) == "nuevo"
+    assert rag_ingest.reindex_reason(READY, "abc", model) is None
+    assert rag_ingest.reindex_reason(READY, "def", model) == "contenido modificado"
+    assert rag_ingest.reindex_reason(dict(READY, chunk_size=500), "abc", model) == "parámetros de chunking"
+    assert rag_ingest.reindex_reason(READY, "abc", "models/otro") == "modelo de embedding"
+    assert rag_ingest.reindex_reason(dict(READY, status="indexing"), "abc", model) == "re-index interrumpido"
+
+
+def test_unchanged_pdf_is_not_opened(tmp_path):
+    (tmp_path / "libro.pdf").write_bytes(b"%PDF-1.4 contenido")
+    manifest = {"libro.pdf": dict(READY, file_hash=rag_ingest.file_sha256(tmp_path / "libro.pdf"),
+                                  embedding_model=rag_ingest.EMBEDDING_MODEL)}
+    with patch.object(rag_ingest, "LIBRARY_PATH", str(tmp_path)), \
+            patch("rag_ingest.load_manifest", return_value=manifest), \
+            patch("rag_ingest.read_pdf") as mock_read, \
+            patch("rag_ingest.remove_missing_sources", return_value=[]), \
+            patch("rag_ingest.rebuild_index") as mock_rebuild:
+        total = rag_ingest.ingest_library()
+    mock_read.assert_not_called()
+    mock_rebuild.assert_not_called()
+    assert total["skipped_files"] == 1
@@ -0,0 +1,92 @@
+import datetime
+import os
+import sys
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import result_pager
+
+
+@pytest.fixture
+def mock_cursor():
+    result_pager._tokens.clear()
+    with patch("result_pager.get_conn") as mock_get_conn, patch("result_pager.enter_sandbox"), patch(
+        "result_pager.preflight"
+    ):
+        mock_conn = MagicMock()
+        cursor = MagicMock()
+        mock_get_conn.return_value = mock_conn
+        mock_conn.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value.__enter__.return_value = cursor
+        cursor.description = [("date", 1082), ("amount", 1700)]
+        yield cursor
+    result_pager._tokens.clear()
+
+
+def _rows(n):
+    return [(datetime.date(2024, 1, 1), Decimal("-10.5"))] * n
+
+
+def test_first_page_is_bounded_and_issues_token(mock_cursor):
+    """Solo se piden page_size + 1 filas al cursor de servidor, sin importar el SQL."""
+    mock_cursor.fetchmany.return_value = _rows(4)
+    with patch.object(result_pager, "QUERY_PAGE_SIZE", 3):
+        page = result_pager.run_paged_query("SELECT date, amount FROM transactions;", 7)
+
+    sql, params = mock_cursor.execute.call_args[0]
+    assert sql == "SELECT * FROM (SELECT date, amount FROM transactions) AS afi_q ORDER BY 1, 2 OFFSET %s LIMIT %s"
+    assert params == (0, 4)
+    assert page["data"] == [{"date": "2024-01-01", "amount": -10.5}] * 3
+    assert page["has_more"] is True and page["page_token"]
+
+
+def test_next_page_continues_from_offset_for_same_user(mock_cursor):
+    mock_cursor.fetchmany.return_value = _rows(4)
+    with patch.object(result_pager, "QUERY_PAGE_SIZE", 3):
+        token = result_pager.run_paged_query("SELECT 1", 7)["page_token"]
+        assert result_pager.next_page(token, 8) is None
+
+        mock_cursor.fetchmany.return_value = _rows(2)
+        page = result_pager.next_page(token, 7)
+
+    assert mock_cursor.execute.call_args[0][1] == (3, 4)
+    assert page["offset"] == 3 and page["has_more"] is False and page["page_token"] is None
+
+
+def test_row_cap_truncates(mock_cursor):
+    mock_cursor.fetchmany.return_value = _rows(4)
+    with patch.object(result_pager, "QUERY_PAGE_SIZE", 3), patch.object(result_pager, "QUERY_MAX_ROWS", 3):
+        page = result_pager.run_paged_query("SELECT 1", None)
+
+    assert page["truncated"] is True and page["page_token"] is None
+
+
+def test_model_order_by_gets_positional_tiebreak():
+    """El ORDER BY del modelo se respeta; las columnas de salida desempatan antes de su LIMIT."""
+    query = "SELECT date, amount FROM transactions WHERE description LIKE '%order by%' ORDER BY date DESC LIMIT 50"
+    ordered, outer = result_pager._deterministic(query, [1, 2])
+    assert ordered == ("SELECT date, amount FROM transactions WHERE description LIKE '%order by%' "
+                       "ORDER BY date DESC, 1, 2 LIMIT 50")
+    assert outer == ""
+
+    # ORDER BY dentro de una subconsulta o ventana no cuenta: orden externo
+    nested = "SELECT * FROM (SELECT date FROM transactions ORDER BY date) t"
+    assert result_pager._deterministic(nested, [1]) == (nested, " ORDER BY 1")
+    # Sin columnas ordenables (json): se deja como está
+    assert result_pager._deterministic("SELECT json_agg(t) FROM t", []) == ("SELECT json_agg(t) FROM t", "")
+
+
+def test_percent_in_sql_is_escaped_only_when_params_are_sent(mock_cursor):
+    """El probe va sin parámetros (SQL literal); el SELECT paginado sí lleva params y escapa %."""
+    mock_cursor.fetchmany.return_value = _rows(1)
+    query = "SELECT date, amount FROM transactions WHERE amount % 2 = 0 AND description LIKE '10%'"
+    result_pager.run_paged_query(query, 7)
+
+    probe_call, page_call = mock_cursor.execute.call_args_list[-2:]
+    assert probe_call[0] == (f"SELECT * FROM ({query}) AS afi_q LIMIT 0",)
+    assert "amount %% 2" in page_call[0][0] and "LIKE '10%%'" in page_call[0][0]
+    assert page_call[0][1] == (0, result_pager.QUERY_PAGE_SIZE + 1)
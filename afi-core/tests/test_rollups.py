@@ -0,0 +1,54 @@
+import datetime
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import rollups
+
+
+@pytest.fixture
+def mock_cursor():
+    with patch("rollups.get_conn") as mock_get_conn:
+        mock_conn = MagicMock()
+        cursor = MagicMock()
+        mock_get_conn.return_value = mock_conn
+        mock_conn.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value.__enter__.return_value = cursor
+        yield cursor
+
+
+def test_shift_month_crosses_year():
+    assert rollups._shift_month(datetime.date(2024, 1, 1), -1) == datetime.date(2023, 12, 1)
+    assert rollups._shift_month(datetime.date(2024, 12, 1), 1) == datetime.date(2025, 1, 1)
+
+
+def test_category_spend_reads_rollups_for_month(mock_cursor):
+    """El gráfico lee monthly_rollups del mes pedido, no transactions."""
+    mock_cursor.fetchall.return_value = [("Comida", -1500), (None, -200)]
+
+    data = rollups.category_spend(user_id=3, period="last_month")
+
+    sql, params = mock_cursor.execute.call_args[0]
+    assert "FROM monthly_rollups" in sql and "transactions" not in sql
+    assert params["month"] == rollups._shift_month(rollups._month_start(), -1)
+    assert params["user_id"] == 3
+    assert data == {"Comida": -1500.0, "Sin Categoría": -200.0}
+
+
+def test_month_totals_returns_positive_spend(mock_cursor):
+    mock_cursor.fetchone.return_value = (-4000, 9000, 12)
+    assert rollups.month_totals() == {"spend": 4000.0, "income": 9000.0, "tx_count": 12}
+
+
+def test_rebuild_all_iterates_users(mock_cursor):
+    """Con FORCE RLS la reconstrucción total va usuario por usuario."""
+    mock_cursor.fetchall.return_value = [(1,), (2,)]
+    mock_cursor.fetchone.return_value = (5,)
+
+    assert rollups.rebuild() == 10
+    calls = [args for args, _ in mock_cursor.execute.call_args_list]
+    assert ("SELECT rebuild_monthly_rollups(%s);", (2,)) in calls
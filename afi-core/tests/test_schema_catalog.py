@@ -0,0 +1,59 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import schema_catalog
+
+COLUMNS = [
+    ("transactions", "amount", "numeric"),
+    ("transactions", "date", "date"),
+    ("transactions", "tx_fingerprint", "character varying"),
+    ("accounts", "account_name", "character varying"),
+]
+
+
+@pytest.fixture
+def mock_cursor():
+    schema_catalog.invalidate()
+    with patch("schema_catalog.get_conn") as mock_get_conn:
+        mock_conn = MagicMock()
+        cursor = MagicMock()
+        mock_get_conn.return_value = mock_conn
+        mock_conn.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value.__enter__.return_value = cursor
+        cursor.fetchone.return_value = (7,)
+        cursor.fetchall.return_value = COLUMNS
+        yield cursor
+    schema_catalog.invalidate()
+
+
+def test_block_only_lists_allowlisted_columns(mock_cursor):
+    """Columnas internas (tx_fingerprint) y tablas fuera del catálogo no llegan al prompt."""
+    block = schema_catalog.build_schema_block(mock_cursor)
+
+    assert block.splitlines()[0].startswith("transactions: ")
+    assert "date date" in block and "amount num (<0 gasto, >0 ingreso)" in block
+    assert "tx_fingerprint" not in block
+    assert "sessions" not in block and "monthly_budgets" not in block
+
+
+def test_cached_until_schema_version_changes(mock_cursor):
+    first = schema_catalog.get_schema_block()
+    # Dentro del TTL: ni siquiera consulta la versión
+    assert schema_catalog.get_schema_block() == first
+    assert mock_cursor.execute.call_count == 2
+
+    # TTL vencido y misma versión: una sola consulta barata, sin reconstruir
+    with patch.object(schema_catalog, "SCHEMA_CATALOG_TTL", 0):
+        schema_catalog.get_schema_block()
+        assert mock_cursor.execute.call_count == 3
+
+        # Nueva migración: se reconstruye
+        mock_cursor.fetchone.return_value = (8,)
+        schema_catalog.get_schema_block()
+        assert mock_cursor.execute.call_count == 5
+    assert schema_catalog.catalog_stats()["version"] == 8
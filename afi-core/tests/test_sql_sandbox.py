@@ -0,0 +1,68 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+from psycopg2.errors import QueryCanceled
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import sql_sandbox
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    with patch.object(sql_sandbox, "_role_available", None), patch.dict(
+        sql_sandbox._stats, {key: 0 for key in sql_sandbox._stats}
+    ):
+        yield
+
+
+def _plan_cursor(cost, rows):
+    cur = MagicMock()
+    cur.fetchone.return_value = ([{"Plan": {"Total Cost": cost, "Plan Rows": rows}}],)
+    return cur
+
+
+def test_preflight_rejects_expensive_plans():
+    with pytest.raises(sql_sandbox.QueryRejected):
+        sql_sandbox.preflight(_plan_cursor(sql_sandbox.SQL_SANDBOX_MAX_COST + 1, 1), "SELECT 1")
+    assert sql_sandbox.preflight(_plan_cursor(10, 5), "SELECT 1") == {"cost": 10.0, "rows": 5.0}
+    assert sql_sandbox.sandbox_stats()["rejected"] == 1
+
+
+def test_enter_sandbox_sets_role_and_local_limits():
+    cur = MagicMock()
+    cur.fetchone.return_value = (True,)
+
+    sql_sandbox.enter_sandbox(cur)
+
+    executed = [str(args[0]) for args, _ in cur.execute.call_args_list]
+    assert any("SET LOCAL ROLE" in sql for sql in executed)
+    assert "SET LOCAL transaction_read_only = on;" in executed
+    limits = cur.execute.call_args_list[-1][0]
+    assert "statement_timeout" in limits[0] and ", true)" in limits[0]
+    assert limits[1] == (str(sql_sandbox.SQL_SANDBOX_TIMEOUT_MS), sql_sandbox.SQL_SANDBOX_WORK_MEM)
+
+
+def test_enter_sandbox_without_role_still_read_only():
+    cur = MagicMock()
+    cur.fetchone.return_value = (False,)
+
+    sql_sandbox.enter_sandbox(cur)
+
+    executed = [str(args[0]) for args, _ in cur.execute.call_args_list]
+    assert not any("SET LOCAL ROLE" in sql for sql in executed)
+    assert "SET LOCAL transaction_read_only = on;" in executed
+
+
+def test_timed_query_counts_timeouts():
+    with pytest.raises(QueryCanceled):
+        with sql_sandbox.timed_query("SELECT pg_sleep(60)"):
+            raise QueryCanceled("timeout")
+    with sql_sandbox.timed_query("SELECT 1"):
+        pass
+
+    stats = sql_sandbox.sandbox_stats()
+    assert stats["queries"] == 2 and stats["timeouts"] == 1
+    assert stats["slow_queries"][-1]["error"] == "QueryCanceled"
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import sys
+import time
+import types
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import tool_registry
+from tool_registry import ToolRegistry
+
+
+def categorize_payees_tool(category_name, keywords_list, dry_run=False):
+    return {"category": category_name, "keywords": keywords_list, "dry_run": dry_run}
+
+
+def generate_spending_chart_tool(period="current_month", user_id=None):
+    return {"period": period, "user_id": user_id}
+
+
+def slow_tool(seconds=0.2):
+    time.sleep(seconds)
+    return "ok"
+
+
+def _call(name, **args):
+    return types.SimpleNamespace(name=name, args=args)
+
+
+def test_arguments_are_normalized_from_signature():
+    registry = ToolRegistry([categorize_payees_tool, generate_spending_chart_tool])
+    kwargs = registry.tools["categorize_payees_tool"].arguments(
+        {"category_name": "Mercado", "keywords_list": "d1", "dry_run": "false", "extra": 1}
+    )
+    assert kwargs == {"category_name": "Mercado", "keywords_list": ["d1"], "dry_run": False}
+    # user_id lo pone el turno, no el modelo
+    kwargs = registry.tools["generate_spending_chart_tool"].arguments({"user_id": 99}, user_id=7)
+    assert kwargs == {"period": "current_month", "user_id": 7}
+
+
+def test_read_only_calls_run_concurrently_in_order():
+    with patch.object(tool_registry, "READ_ONLY_TOOLS", frozenset({"slow_tool", "generate_spending_chart_tool"})):
+        registry = ToolRegistry([slow_tool, generate_spending_chart_tool])
+    calls = [_call("slow_tool"), _call("slow_tool"), _call("generate_spending_chart_tool", period="last_month")]
+
+    start = time.perf_counter()
+    results = asyncio.run(registry.run_calls(calls, user_id=3))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.35
+    assert results == [
+        ("slow_tool", "ok"),
+        ("slow_tool", "ok"),
+        ("generate_spending_chart_tool", {"period": "last_month", "user_id": 3}),
+    ]
+    assert registry.stats()["slow_tool"]["calls"] == 2
+
+
+def test_timeout_and_unknown_tool_return_errors_to_model():
+    with patch.dict(tool_registry._timeouts, {"slow_tool": 0.05}):
+        registry = ToolRegistry([slow_tool])
+    results = asyncio.run(registry.run_calls([_call("slow_tool", seconds=0.3), _call("missing_tool")]))
+
+    assert "tardó más de" in results[0][1]
+    assert results[1] == ("missing_tool", "Error: Tool not found")
+    stats = registry.stats()
+    assert stats["slow_tool"]["timeouts"] == 1
+    assert stats["missing_tool"]["errors"] == 1
+
+
+def test_writes_run_one_at_a_time_in_order():
+    """Crear la cuenta termina antes de importar a ella; las lecturas del medio no se adelantan."""
+    events = []
+
+    def create_account_tool(account_name):
+        events.append(("start", "create"))
+        time.sleep(0.1)
+        events.append(("end", "create"))
+        return "creada"
+
+    def confirm_import_tool(target_account_name):
+        events.append(("start", "import"))
+        return "importado"
+
+    def get_financial_audit():
+        events.append(("start", "audit"))
+        return "audit"
+
+    registry = ToolRegistry([create_account_tool, confirm_import_tool, get_financial_audit])
+    assert registry.tools["get_financial_audit"].read_only
+    assert not registry.tools["create_account_tool"].read_only
+    calls = [_call("create_account_tool", account_name="Nu"), _call("get_financial_audit"),
+             _call("confirm_import_tool", target_account_name="Nu")]
+    results = asyncio.run(registry.run_calls(calls))
+
+    assert events == [("start", "create"), ("end", "create"), ("start", "audit"), ("start", "import")]
+    assert [name for name, _ in results] == ["create_account_tool", "get_financial_audit", "confirm_import_tool"]
+
+
+def test_write_timeout_asks_not_to_retry_and_skips_later_writes():
+    def confirm_import_tool(target_account_name):
+        return "importado"
+
+    with patch.dict(tool_registry._timeouts, {"slow_tool": 0.05}):
+        registry = ToolRegistry([slow_tool, confirm_import_tool])
+    results = asyncio.run(registry.run_calls([_call("slow_tool", seconds=0.3),
+                                              _call("confirm_import_tool", target_account_name="Nu")]))
+
+    assert "NO la repitas" in results[0][1]
+    assert results[1][0] == "confirm_import_tool" and "no se ejecutó" in results[1][1]
+    assert "confirm_import_tool" not in registry.stats()
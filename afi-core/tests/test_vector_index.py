@@ -0,0 +1,46 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import vector_index
+import verify_rag
+
+
+def test_index_ddl_and_default_lists():
+    ddl = vector_index.index_ddl("hnsw", m=24, ef_construction=100)
+    assert "USING hnsw (embedding vector_cosine_ops) WITH (m = 24, ef_construction = 100)" in ddl
+    assert "WITH (lists = 50)" in vector_index.index_ddl("ivfflat", lists=50)
+    assert vector_index.default_lists(5_000) == 10
+    assert vector_index.default_lists(4_000_000) == 2000
+    with pytest.raises(ValueError):
+        vector_index.index_ddl("annoy")
+
+
+def test_exact_top_k_and_recall():
+    matrix = np.array([[1, 0], [0, 1], [0.9, 0.1], [-1, 0]], dtype=np.float32)
+    queries = np.array([[1, 0.05]], dtype=np.float32)
+    assert verify_rag.exact_top_k(matrix, queries, 2).tolist() == [[0, 2]]
+    assert verify_rag.recall_at_k([{0, 2}], [[0, 3]]) == 0.5
+
+
+def test_quantized_search_reranks_with_exact_distance():
+    sql = vector_index.search_sql("binary")
+    # Primera pasada por el índice binario, orden final por la distancia float exacta
+    assert "binary_quantize(embedding)::bit(768) <~> binary_quantize(%(q)s::vector)" in sql
+    assert "LIMIT %(candidates)s) AS candidates ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s" in sql
+    assert "halfvec(768)" in vector_index.search_sql("halfvec")
+    assert "candidates" not in vector_index.search_sql("none")
+    assert "USING hnsw ((binary_quantize(embedding)::bit(768)) bit_hamming_ops)" in vector_index.quantized_index_ddl("binary")
+    assert vector_index.supports_quantization((0, 7, 4)) and not vector_index.supports_quantization((0, 6, 2))
+
+
+def test_memory_binary_first_pass_with_rerank_keeps_exact_order():
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((200, 64)).astype(np.float32)
+    queries = matrix[:5] + 0.01
+    rows = verify_rag.memory_quantized_top_k(matrix, queries, 3, "binary", rerank_factor=20)
+    assert rows[:, 0].tolist() == [0, 1, 2, 3, 4]
@@ -0,0 +1,52 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import wisdom
+
+ROWS = [
+    ("Regla del 4%", "retiro.pdf", [1.0, 0.0, 0.0]),
+    ("Fondo de emergencia", None, [0.0, 2.0, 0.0]),
+    ("Interés compuesto", "inversion.pdf", [0.7, 0.7, 0.0]),
+    ("Vector roto", "x.pdf", [1.0, 0.0]),
+    ("Sin embedding", "x.pdf", None),
+]
+
+
+def test_search_ranks_by_cosine_and_skips_bad_vectors():
+    index = wisdom.WisdomIndex()
+    index.build(ROWS)
+    assert index.matrix.shape == (3, 3) and index.matrix.flags["C_CONTIGUOUS"]
+
+    results = index.search([0.9, 0.1, 0.0], top_k=2)
+    assert [r["content"] for r in results] == ["Regla del 4%", "Interés compuesto"]
+    assert results[0]["score"] > results[1]["score"]
+    # Dimensión incompatible: sin resultados en vez de excepción
+    assert index.search([1.0, 0.0], top_k=2) == []
+
+
+def test_refresh_reloads_only_when_signature_changes():
+    index = wisdom.WisdomIndex(dtype=np.float16)
+    with patch("wisdom.get_conn") as mock_get_conn:
+        conn = MagicMock()
+        cursor = MagicMock()
+        mock_get_conn.return_value = conn
+        conn.__enter__.return_value = conn
+        conn.cursor.return_value.__enter__.return_value = cursor
+        cursor.fetchone.return_value = (3, 10)
+        cursor.fetchall.return_value = ROWS[:3]
+
+        assert index.refresh() is True
+        index.checked_at = 0.0
+        assert index.refresh() is False
+        cursor.fetchone.return_value = (4, 11)
+        index.checked_at = 0.0
+        assert index.refresh() is True
+
+    assert cursor.fetchall.call_count == 2
+    assert index.stats()["dtype"] == "float16"
+    assert wisdom.format_snippets(index.search([0, 1, 0], top_k=1), "General") == "[General] Fondo de emergencia"
@@ -1,46 +1,50 @@
+import asyncio
 import json
 import os
 from typing import List, Optional
 
 import google.generativeai as genai
-import pandas as pd
-
-from db_ops import get_conn, get_schema_info, execute_query
+from psycopg2.errors import QueryCanceled
+
+import answer_cache
+import context_loader
+import intent_router
+import llm_client
+from db_ops import execute_query
+from embedding_cache import EMBEDDING_MODEL, embed_text_async
+from result_pager import next_page, run_paged_query, token_alive
+from schema_catalog import get_schema_block
+from sql_sandbox import QueryRejected
+import wisdom
 
 # Configuración
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 # Compatibilidad: fijamos familia 2.5; se puede sobreescribir con GENAI_MODEL.
 MODEL_NAME = os.getenv("GENAI_MODEL", "gemini-2.5-pro")
-EMBEDDING_MODEL = "models/text-embedding-004"
 
-def get_wisdom_context(query: str) -> str:
-    """Recupera fragmentos relevantes de los libros ingestados."""
-    try:
-        # Generar embedding de la pregunta
-        resp = genai.embed_content(model=EMBEDDING_MODEL, content=query, task_type="retrieval_query")
-        vec = resp['embedding']
-        vec_literal = "[" + ",".join(f"{float(x):.6f}" for x in vec) + "]"
-        
-        conn = get_conn()
-        cur = conn.cursor()
-        # Búsqueda Vectorial (Los 2 fragmentos más cercanos)
-        # Nota: Usamos la columna 'source' que arreglamos en el paso anterior
-        cur.execute("SELECT content, source FROM financial_wisdom ORDER BY embedding <-> %s::vector LIMIT 2", (vec_literal,))
-        rows = cur.fetchall()
-        conn.close()
-        
-        if rows:
-            snippets = []
-            for content, source in rows:
-                source_name = source or "Sabiduría General"
-                snippets.append(f"[{source_name}] {content}")
-            return "\n\n".join(snippets)
+async def embed_question(query: str) -> Optional[List[float]]:
+    """Embedding de la pregunta; se calcula una vez y lo comparten el RAG y la caché de respuestas."""
+    return await embed_text_async(query, task_type="retrieval_query", model=EMBEDDING_MODEL)
+
+
+def get_wisdom_context(query: str, embedding: Optional[List[float]] = None) -> str:
+    """Recupera fragmentos relevantes de los libros ingestados (índice en memoria, ver wisdom.py)."""
+    # Sin embedding (la API falló en embed_question) se responde sin RAG
+    if embedding is None:
         return ""
+    try:
+        # Los 2 fragmentos más cercanos
+        return wisdom.format_snippets(wisdom.retrieve(query, top_k=2, embedding=embedding), "Sabiduría General")
     except Exception as e:
         print(f"⚠️ RAG Warning: {e}")
         return ""
 
 
+def _rls_user_id(user_id: Optional[int]) -> Optional[int]:
+    # users.id (lo resuelve main a partir del teléfono); el sandbox aplica RLS con él
+    return int(user_id) if user_id else None
+
+
 def _format_history(history: List[dict]) -> str:
     if not history:
         return ""
@@ -53,37 +57,76 @@ def _format_history(history: List[dict]) -> str:
     return "\n".join(formatted)
 
 
-def process_query(user_query: str, user_id: Optional[str] = None, history: Optional[List[dict]] = None) -> dict:
+def _cacheable(result: dict) -> bool:
+    # Errores, rechazos y timeouts del sandbox no se cachean: el próximo intento puede salir bien
+    uncacheable = result.pop("uncacheable", False)
+    return result.get("viz_type") != "error" and not uncacheable
+
+
+async def process_query(user_query: str, user_id: Optional[int] = None, history: Optional[List[dict]] = None) -> dict:
     """
-    Traduce lenguaje natural a SQL + instrucción de visualización usando Gemini.
-    Incluye contexto breve de conversación (últimos 2 mensajes) y Sabiduría Financiera (RAG).
+    Punto de entrada de /chat/query: consulta answer_cache antes de ir a Gemini.
+    La versión de datos del usuario forma parte de la clave, así que cualquier cambio en sus
+    movimientos invalida lo cacheado sin tener que purgar nada.
+    Corre en el event loop: Gemini va por llm_client (async) y la DB por hilos cortos.
+    Las preguntas rutinarias se resuelven antes, sin LLM (intent_router).
     """
-    print(f"🧠 Analizando pregunta: {user_query}")
+    uid = _rls_user_id(user_id)
+    # Preguntas rutinarias (gasto del mes, saldo, por categoría): plantilla SQL fija, sin Gemini
+    intent = intent_router.match(user_query)
+    if intent:
+        fast = await asyncio.to_thread(intent_router.answer_ui, intent, uid)
+        if fast:
+            print(f"⚡ Camino rápido ({intent['intent']}): {user_query}")
+            return fast
 
-    # 1. Recuperar Sabiduría (RAG)
-    wisdom = get_wisdom_context(user_query)
-    
-    schema = get_schema_info()
     context_str = _format_history(history or [])
-
-    # 2. Verificar datos de presupuesto y ajustar el prompt
-    budget_context = ""
+    try:
+        version = await asyncio.to_thread(answer_cache.get_data_version, uid)
+    except Exception as e:
+        print(f"⚠️ Answer cache deshabilitada: {e}")
+        return await _answer_query(user_query, uid, context_str, await embed_question(user_query))
+
+    cached = answer_cache.lookup(uid, user_query, context_str, version, count_miss=False)
+    embedding = None
+    if cached is None:
+        embedding = await embed_question(user_query)
+        cached = answer_cache.lookup(uid, user_query, context_str, version, embedding=embedding)
+    # Un page_token expirado haría fallar "Cargar más": en ese caso se recalcula
+    if cached is not None and (not cached.get("page_token") or await asyncio.to_thread(token_alive, cached["page_token"])):
+        print(f"⚡ Respuesta desde caché: {user_query}")
+        return cached
+
+    if embedding is None:
+        embedding = await embed_question(user_query)
+    result = await _answer_query(user_query, uid, context_str, embedding)
+    if _cacheable(result):
+        answer_cache.store(uid, user_query, context_str, version, result, embedding=embedding)
+    return result
+
+
+def _budget_context(user_query: str) -> str:
+    """Instrucciones de presupuestos si la pregunta es de presupuesto y hay metas cargadas."""
+    # Check if the user's query is budget-related (antes de ir a la DB)
+    if not any(kw in user_query.lower() for kw in ["presupuesto", "budget", "meta", "gasto", "limite"]):
+        return ""
     try:
         # Check if monthly_budgets table has any entries
         budget_entries = execute_query("SELECT COUNT(*) FROM monthly_budgets", fetch_one=True)
         if budget_entries and budget_entries[0] > 0:
-            # Check if the user's query is budget-related
-            if any(kw in user_query.lower() for kw in ["presupuesto", "budget", "meta", "gasto", "limite"]):
-                budget_context = """
+            return """
                 **CONTEXTO ADICIONAL: PRESPUESTOS MENSUALES**
                 Tienes acceso a la tabla 'monthly_budgets' que define las metas de gasto por categoría y usuario.
-                Si el usuario pregunta por 'presupuesto', 'metas' o 'límites de gasto', compara `sum(transactions.amount)` (gastos, que son negativos) agrupados por `category_id` con `monthly_budgets.amount_limit`.
-                Considera la fecha `monthly_budgets.month` para filtrar por el mes actual.
+                Si el usuario pregunta por 'presupuesto', 'metas' o 'límites de gasto', compara el gasto real de `monthly_rollups.spend` (negativo) con `monthly_budgets.amount_limit`, uniendo `master_categories.name` con `monthly_rollups.category` (sin distinguir mayúsculas).
+                Considera la fecha `monthly_budgets.month` (= `monthly_rollups.month`) para filtrar por el mes actual.
                 """
     except Exception as e:
         print(f"⚠️ Error al verificar presupuestos: {e}")
+    return ""
 
 
+def _build_prompt(user_query: str, context_str: str, wisdom: str, schema: str, budget_context: str) -> str:
+    """Prompt del agente SQL a partir del contexto ya reunido (RAG + esquema + presupuestos)."""
     prompt = f"""
     ACTÚA COMO: CFO Personal Experto (AFI) y Data Analyst.
     
@@ -101,9 +144,13 @@ def process_query(user_query: str, user_id: Optional[str] = None, history: Optio
     CONTEXTO PREVIO:
     {context_str}
 
-    ESQUEMA DB (Postgres):
+    ESQUEMA DB (Postgres, solo estas tablas):
     {schema}
 
+    RENDIMIENTO: Para totales por mes y/o categoría (gasto, ingreso, tendencia mensual, resumen ejecutivo)
+    consulta `monthly_rollups` en vez de agregar `transactions`. Usa `transactions` solo para detalle
+    de movimientos o rangos de días.
+
     PREGUNTA ACTUAL: "{user_query}"
 
     OBJETIVO TÉCNICO:
@@ -119,10 +166,29 @@ def process_query(user_query: str, user_id: Optional[str] = None, history: Optio
         "explanation": "Texto explicativo (aquí va tu consejo con personalidad)"
     }}
     """
+    return prompt
+
+
+async def _answer_query(user_query: str, user_id: Optional[int], context_str: str,
+                        embedding: Optional[List[float]] = None) -> dict:
+    """
+    Traduce lenguaje natural a SQL + instrucción de visualización usando Gemini.
+    Incluye contexto breve de conversación (últimos 2 mensajes) y Sabiduría Financiera (RAG).
+    """
+    print(f"🧠 Analizando pregunta: {user_query}")
+    # 1. Sabiduría (RAG), esquema y presupuestos en paralelo (context_loader mide cada fuente)
+    sources, timings = await context_loader.gather_timed(
+        "process_query",
+        wisdom=asyncio.to_thread(get_wisdom_context, user_query, embedding),
+        schema=asyncio.to_thread(get_schema_block),
+        budget=asyncio.to_thread(_budget_context, user_query),
+    )
+    print(f"⏱️ Contexto process_query (ms): {timings}")
+    prompt = _build_prompt(user_query, context_str, sources["wisdom"] or "", sources["schema"] or "",
+                           sources["budget"] or "")
 
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
-        response = model.generate_content(prompt)
+        response = await llm_client.generate(MODEL_NAME, prompt)
         json_text = (response.text or "").replace("```json", "").replace("```", "").strip()
         result = json.loads(json_text)
 
@@ -140,24 +206,31 @@ def process_query(user_query: str, user_id: Optional[str] = None, history: Optio
             }
 
         print(f"⚡ Ejecutando SQL: {sql_query}")
-        # Convert user_id to int if present, assuming get_conn handles the type or expects int
-        uid_int = int(user_id) if user_id else None
-        conn = get_conn(user_id=uid_int)
-        df = pd.read_sql_query(sql_query, conn)
-        conn.close()
-
-        if df.empty:
+        # Cursor de servidor + página acotada: nunca se materializa el resultado completo.
+        # El with del pager devuelve la conexión al pool (y limpia el RLS) aunque la query falle.
+        try:
+            page = await asyncio.to_thread(run_paged_query, sql_query, user_id)
+        except QueryRejected as e:
+            print(f"🛑 SQL rechazado por el sandbox: {e}")
+            return {"answer": "Esa consulta es demasiado pesada. ¿Puedes acotarla (por mes, cuenta o categoría)?", "viz_type": "text", "uncacheable": True}
+        except QueryCanceled:
+            return {"answer": "La consulta tardó demasiado y la detuve. Intenta con un rango de fechas más corto.", "viz_type": "text", "uncacheable": True}
+
+        if not page["data"]:
             return {"answer": "No encontré datos con esa consulta, pero recuerda: " + result.get("explanation", ""), "viz_type": "none"}
 
         return {
             "answer": result.get("explanation", "Datos recuperados."),
             "viz_type": viz_type,
             "title": result.get("title", "Resultado"),
-            "data": df.to_dict(orient="records"),
-            "columns": list(df.columns),
             "sql": sql_query,
+            **page,
         }
 
     except Exception as e:
         print(f"❌ Error en Agente SQL: {e}")
-        return {"answer": f"Error procesando tu solicitud: {e}", "viz_type": "error"}
\ No newline at end of file
+        return {"answer": f"Error procesando tu solicitud: {e}", "viz_type": "error"}
+
+def fetch_next_page(page_token: str, user_id: Optional[int] = None) -> Optional[dict]:
+    """Página siguiente de un resultado de process_query (None si el token expiró)."""
+    return next_page(page_token, _rls_user_id(user_id))
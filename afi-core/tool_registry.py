@@ -0,0 +1,206 @@
+"""
+Registro declarativo de las herramientas de function-calling (tools.TOOLS_SCHEMA).
+
+- Cada función de TOOLS_SCHEMA se registra con su firma: los argumentos de Gemini (protos
+  MapComposite/RepeatedComposite) se pasan a tipos nativos, se descartan los que la función
+  no declara, se completan con sus defaults y se ajustan al tipo del default (bool, int,
+  float) o a lista para los parámetros `*_list`. Si la función acepta `user_id`, se inyecta
+  el del usuario del turno (RLS); el modelo nunca lo elige.
+- Timeout por herramienta: DEFAULT_TOOL_TIMEOUTS, sobreescribible con TOOL_TIMEOUTS
+  ("nombre=segundos,..."); el resto usa TOOL_TIMEOUT_SECONDS. Al vencer, el modelo recibe
+  un mensaje de error y el turno sigue (el hilo no se puede matar: termina por su cuenta).
+- Herramientas de solo lectura (READ_ONLY_TOOLS) vs. las que escriben (todas las demás).
+  `run_calls` respeta el orden de las function_call de una respuesta: cada herramienta que
+  escribe corre sola y en su turno (crear la cuenta antes de importar a ella); las de solo
+  lectura consecutivas corren a la vez (un hilo cada una) y tardan lo de la más lenta.
+- Si una herramienta que escribe vence su timeout, su hilo sigue y la escritura puede
+  completarse: al modelo se le pide no repetirla, y las escrituras siguientes de esa misma
+  respuesta no se ejecutan (podrían depender de ella).
+
+Llamadas, errores, timeouts y latencia por herramienta en ToolRegistry.stats() (/metrics).
+"""
+import asyncio
+import inspect
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "20"))
+DEFAULT_TOOL_TIMEOUTS = {
+    "get_financial_audit": 15,
+    "categorize_payees_tool": 30,
+    "generate_spending_chart_tool": 20,
+}
+
+
+def _parse_timeouts(raw: str) -> Dict[str, float]:
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        name, _, seconds = item.partition("=")
+        timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+# Sin efectos: se pueden ejecutar en paralelo y reintentar sin riesgo
+READ_ONLY_TOOLS = frozenset({
+    "get_financial_audit",
+    "generate_spending_chart_tool",
+    "job_status_tool",
+})
+
+_timeouts = {**DEFAULT_TOOL_TIMEOUTS, **_parse_timeouts(os.getenv("TOOL_TIMEOUTS", ""))}
+
+
+def to_python(val):
+    """Convierte objetos protobuf (MapComposite/RepeatedComposite) a tipos nativos."""
+    if isinstance(val, dict) or hasattr(val, "items"):
+        try:
+            return {k: to_python(v) for k, v in val.items()}
+        except Exception:
+            pass
+    if isinstance(val, (list, tuple)):
+        return [to_python(v) for v in val]
+    try:
+        # RepeatedComposite itera pero no es list
+        if hasattr(val, "__iter__") and not isinstance(val, (str, bytes)):
+            return [to_python(v) for v in list(val)]
+    except Exception:
+        pass
+    return val
+
+
+def _coerce(name: str, value, default):
+    if value is None:
+        return value
+    if name.endswith("_list"):
+        return value if isinstance(value, list) else [value]
+    if isinstance(default, bool) and isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "si", "sí", "yes")
+    # bool primero: isinstance(True, int) también es cierto
+    for kind in (bool, int, float):
+        if isinstance(default, kind) and not isinstance(value, kind):
+            try:
+                return kind(value)
+            except (TypeError, ValueError):
+                return default
+    return value
+
+
+class Tool:
+    def __init__(self, func, timeout: float, read_only: bool = False):
+        self.func = func
+        self.name = func.__name__
+        self.timeout = timeout
+        self.read_only = read_only
+        params = inspect.signature(func).parameters
+        self.wants_user = "user_id" in params
+        self.params = {name: p.default for name, p in params.items() if name != "user_id"}
+
+    def arguments(self, raw_args, user_id: Optional[int] = None) -> dict:
+        try:
+            args = to_python(raw_args) or {}
+        except Exception:
+            args = {}
+        if not isinstance(args, dict):
+            args = {}
+        kwargs = {}
+        for name, default in self.params.items():
+            default = None if default is inspect.Parameter.empty else default
+            kwargs[name] = _coerce(name, args.get(name, default), default)
+        if self.wants_user:
+            kwargs["user_id"] = user_id
+        return kwargs
+
+
+class ToolRegistry:
+    def __init__(self, funcs: Sequence):
+        self.tools = {
+            func.__name__: Tool(func, _timeouts.get(func.__name__, TOOL_TIMEOUT_SECONDS), func.__name__ in READ_ONLY_TOOLS)
+            for func in funcs
+        }
+        self._lock = threading.Lock()
+        self._stats: Dict[str, dict] = {}
+
+    def _record(self, name: str, ms: float, outcome: str) -> None:
+        with self._lock:
+            entry = self._stats.setdefault(name, {"calls": 0, "errors": 0, "timeouts": 0, "ms_total": 0.0, "ms_max": 0.0})
+            entry["calls"] += 1
+            if outcome != "ok":
+                entry[outcome] += 1
+            entry["ms_total"] += ms
+            entry["ms_max"] = max(entry["ms_max"], ms)
+
+    async def _execute(self, name: str, raw_args, user_id: Optional[int]) -> Tuple[object, str]:
+        """(resultado para el modelo, outcome: ok | errors | timeouts)."""
+        tool = self.tools.get(name)
+        if tool is None:
+            self._record(name, 0.0, "errors")
+            return "Error: Tool not found", "errors"
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            kwargs = tool.arguments(raw_args, user_id)
+            return await asyncio.wait_for(asyncio.to_thread(tool.func, **kwargs), timeout=tool.timeout), outcome
+        except asyncio.TimeoutError:
+            outcome = "timeouts"
+            print(f"⏳ Herramienta {name} superó {tool.timeout:.0f}s")
+            if not tool.read_only:
+                return (f"Error: la herramienta {name} tardó más de {tool.timeout:.0f}s y la acción puede seguir en "
+                        f"curso. NO la repitas: avisa al usuario que lo verifique en un momento."), outcome
+            return f"Error: la herramienta {name} tardó más de {tool.timeout:.0f}s. Avisa al usuario y sigue sin ese dato.", outcome
+        except Exception as e:
+            outcome = "errors"
+            return f"Error ejecutando herramienta {name}: {e}", outcome
+        finally:
+            self._record(name, (time.perf_counter() - start) * 1000, outcome)
+
+    async def run(self, name: str, raw_args, user_id: Optional[int] = None):
+        result, _ = await self._execute(name, raw_args, user_id)
+        return result
+
+    def _read_only(self, name: str) -> bool:
+        tool = self.tools.get(name)
+        # Una herramienta desconocida no ejecuta nada: no frena al resto
+        return tool is None or tool.read_only
+
+    async def run_calls(self, calls: Sequence, user_id: Optional[int] = None) -> List[Tuple[str, object]]:
+        """
+        [(nombre, resultado)] en el orden de `calls` (function_call de Gemini). Las de solo
+        lectura consecutivas van en paralelo; cada una que escribe, sola y en orden.
+        """
+        results: List[Tuple[str, object]] = []
+        batch: List = []
+        write_pending = None
+
+        async def flush():
+            outputs = await asyncio.gather(*(self.run(call.name, call.args, user_id) for call in batch))
+            results.extend((call.name, output) for call, output in zip(batch, outputs))
+            batch.clear()
+
+        for call in calls:
+            if self._read_only(call.name):
+                batch.append(call)
+                continue
+            await flush()
+            if write_pending:
+                results.append((call.name, f"Error: no se ejecutó {call.name} porque {write_pending} sigue en curso. "
+                                            f"Pídele al usuario que lo intente de nuevo en un momento."))
+                continue
+            output, outcome = await self._execute(call.name, call.args, user_id)
+            if outcome == "timeouts":
+                write_pending = call.name
+            results.append((call.name, output))
+        await flush()
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "calls": e["calls"], "errors": e["errors"], "timeouts": e["timeouts"],
+                    "ms_avg": round(e["ms_total"] / e["calls"], 1), "ms_max": round(e["ms_max"], 1),
+                    **({"timeout_s": self.tools[name].timeout} if name in self.tools else {}),
+                }
+                for name, e in self._stats.items()
+            }
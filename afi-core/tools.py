@@ -1,12 +1,14 @@
 import json
 import os
-import threading
 
 import pandas as pd
 
+import job_queue
+from categorizer import apply_category_rules, format_rule_report
 from db_ops import bulk_categorize, ensure_account, insert_transactions, execute_query
 from database import clear_pending_data, get_pending_data
 from profile_manager import update_financial_goals
+from rollups import category_spend
 from viz_generator import create_spending_chart
 
 CSV_FILE = "/app/consolidado_historia.csv"
@@ -34,26 +36,66 @@ def create_category_tool(name, group="Gastos Variables"):
     return f"Categoría '{name}' lista. Se usará al etiquetar transacciones."
 
 
-def categorize_payees_tool(category_name, keywords_list):
-    """Movimientos masivos por keywords en segundo plano."""
-    print(f"🔧 TOOL: Iniciando movimiento masivo para '{category_name}'")
-
-    def _run_bulk_bg():
+def categorize_payees_tool(category_name, keywords_list, dry_run=False, user_id=None):
+    """
+    Movimientos masivos por keywords en segundo plano (cola de trabajos durable).
+    Con dry_run=True no modifica nada: responde cuántas transacciones movería cada keyword.
+    """
+    if user_id is None:
+        # Sin usuario el UPDATE tocaría los movimientos de todos
+        return "No pude identificar tu usuario para recategorizar tus transacciones."
+    if dry_run:
         try:
-            updated = bulk_categorize(category_name, keywords_list or [])
-            print(f"✅ Background job terminado para {category_name}: {updated} filas actualizadas.")
+            rules = [(kw, category_name) for kw in keywords_list or []]
+            return format_rule_report(apply_category_rules(rules, dry_run=True, user_id=user_id))
         except Exception as e:
-            print(f"❌ Error en background job: {e}")
+            print(f"⚠️ Error en vista previa de categorización: {e}")
+            return f"Error calculando vista previa: {e}"
 
+    print(f"🔧 TOOL: Encolando movimiento masivo para '{category_name}'")
+    keywords = sorted({str(kw) for kw in keywords_list or [] if kw})
     try:
-        t = threading.Thread(target=_run_bulk_bg, daemon=True)
-        t.start()
-        return f"Orden recibida. Moviendo transacciones a '{category_name}' en segundo plano. Puedes seguir conversando."
+        # Misma categoría + keywords mientras sigue en curso -> mismo trabajo (no se duplica)
+        job_id = job_queue.enqueue(
+            "bulk_categorize",
+            {"category_name": category_name, "keywords": keywords},
+            user_id=user_id,
+            dedupe_key=f"{user_id}:{category_name}:{'|'.join(keywords).lower()}",
+        )
+        return (f"Orden #{job_id} recibida. Moviendo transacciones a '{category_name}' en segundo plano. "
+                f"Puedes seguir conversando; pregúntame '¿ya terminó?' cuando quieras.")
     except Exception as e:
-        print(f"⚠️ Error lanzando background job: {e}")
+        print(f"⚠️ Error encolando movimiento masivo: {e}")
         return f"Error lanzando movimiento masivo: {e}"
 
 
+def _run_bulk_categorize(payload, job):
+    if job.user_id is None:
+        raise job_queue.JobFailed("trabajo sin usuario: no se recategoriza a ciegas")
+    # Idempotente: volver a aplicar las reglas deja las mismas filas en la categoría
+    updated = bulk_categorize(payload["category_name"], payload.get("keywords") or [], user_id=job.user_id)
+    print(f"✅ Movimiento masivo terminado para {payload['category_name']}: {updated} filas actualizadas.")
+    return {"updated": updated}
+
+
+job_queue.register("bulk_categorize", _run_bulk_categorize, label="Categorización masiva", concurrency=1)
+
+
+def job_status_tool(job_id=0, user_id=None):
+    """
+    Estado de los trabajos en segundo plano del usuario (categorizaciones masivas, lectura
+    de archivos, reportes). Úsala cuando pregunte "¿ya terminó?". job_id opcional.
+    """
+    if user_id is None:
+        # Sin usuario no se listan trabajos ajenos
+        return "No pude identificar tu usuario para consultar tus trabajos."
+    try:
+        return job_queue.status_report(user_id=user_id, job_id=job_id or None)
+    except Exception as e:
+        print(f"⚠️ Error consultando trabajos: {e}")
+        return f"No pude consultar el estado de los trabajos: {e}"
+
+
 def create_account_tool(account_name, account_type="checking", user_id=None):
     """
     Crea una cuenta en Postgres.
@@ -142,25 +184,11 @@ def generate_spending_chart_tool(period="current_month", user_id=None):
     """
     print(f"🎨 Generando gráfico para User {user_id} ({period})")
     try:
-        sql = """
-            SELECT category, SUM(amount) as total
-            FROM transactions
-            WHERE amount < 0
-        """
-        params = []
-        
-        if period == "current_month":
-            sql += " AND date >= date_trunc('month', CURRENT_DATE)"
-        elif period == "last_month":
-            sql += " AND date >= date_trunc('month', CURRENT_DATE - INTERVAL '1 month') AND date < date_trunc('month', CURRENT_DATE)"
-            
-        sql += " GROUP BY category"
-        
-        rows = execute_query(sql, tuple(params), user_id=user_id)
-        if not rows:
+        # Lee la rollup mensual (unas filas por categoría) en vez de agregar transactions
+        data = category_spend(user_id=user_id, period=period)
+        if not data:
             return "No tienes gastos registrados en este periodo para graficar."
-            
-        data = {row[0] or "Sin Categoría": float(row[1]) for row in rows}
+
         filepath = create_spending_chart(data)
         
         if filepath:
@@ -181,4 +209,5 @@ TOOLS_SCHEMA = [
     complete_onboarding_tool,
     create_account_tool,
     generate_spending_chart_tool,
+    job_status_tool,
 ]
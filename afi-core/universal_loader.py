@@ -1,18 +1,14 @@
 import os
 import pandas as pd
-import psycopg2
 import re
 from datetime import datetime, timedelta
 import glob
 import hashlib
 import httpx
 import google.generativeai as genai
+import llm_client
 
-# Configuración DB
-DB_HOST = "afi_db"
-DB_NAME = os.getenv("POSTGRES_DB", "afi_brain")
-DB_USER = os.getenv("POSTGRES_USER", "afi_user")
-DB_PASS = os.getenv("DB_PASS") or os.getenv("POSTGRES_PASSWORD")
+from db_ops import ensure_account, insert_new_transactions
 
 CSV_DIR = "/app/data/csv/CSV" # Ruta dentro del contenedor
 
@@ -33,13 +29,6 @@ MESES_ES = {
     'jul': '07', 'ago': '08', 'sep': '09', 'oct': '10', 'nov': '11', 'dic': '12'
 }
 
-def get_db_connection():
-    try:
-        return psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASS)
-    except Exception as e:
-        print(f"❌ Error DB: {e}")
-        return None
-
 def parse_date_spanish(date_str):
     # Formatos tipo: 04Dic2024, 13Ago2025
     for mes, num in MESES_ES.items():
@@ -103,7 +92,6 @@ def check_and_alert_transaction(amount, description, account_name, date_obj):
         print(f"🚨 Analizando posible alerta: {description} (${amount})")
 
         # 2. Consultar a Gemini
-        model = genai.GenerativeModel("gemini-1.5-flash")
         prompt = f"""
         El usuario gastó ${amount:,.0f} en '{description}' (Cuenta: {account_name}).
         
@@ -114,7 +102,7 @@ def check_and_alert_transaction(amount, description, account_name, date_obj):
         SI lo es: Escribe un mensaje de ALERTA corto y amable para WhatsApp (Max 2 frases). Pregunta si reconoce el cargo.
         NO lo es: Responde "OK".
         """
-        response = model.generate_content(prompt)
+        response = llm_client.generate_sync("gemini-1.5-flash", prompt, priority=llm_client.ALERT)
         text = response.text.strip()
 
         if "OK" in text and len(text) < 10:
@@ -220,51 +208,30 @@ def process_file(file_path):
         print("   ⚠️ No se pudieron extraer registros válidos.")
         return
 
-    conn = get_db_connection()
-    if not conn: return
-    cur = conn.cursor()
-    
+    # Agrupar por cuenta: una sola resolución de cuenta por archivo/cuenta, no por fila
+    per_account = {}
+    for fecha, desc, monto, cuenta in records:
+        per_account.setdefault(cuenta, []).append({"date": fecha, "amount": monto, "description": desc})
+
     count = 0
-    for rec in records:
-        fecha, desc, monto, cuenta = rec
-        
-        # 1. Asegurar Cuenta
-        # Buscamos el ID de tipo 'Bank Account' (asumimos ID 1 o buscamos)
-        cur.execute("SELECT type_id FROM account_types WHERE type_name = 'Bank Account'")
-        res = cur.fetchone()
-        type_id = res[0] if res else 1 # Fallback a 1 si falla
-        
-        # Insertar cuenta si no existe (con los campos correctos)
-        cur.execute("""
-            INSERT INTO accounts (account_name, account_type_id, currency_code) 
-            VALUES (%s, %s, 'COP') 
-            ON CONFLICT (account_name) DO NOTHING
-        """, (cuenta, type_id))
-        
-        # 2. Obtener ID Cuenta
-        cur.execute("SELECT account_id FROM accounts WHERE account_name = %s", (cuenta,))
-        acc_id = cur.fetchone()[0]
-        
-        # 3. Insertar Transacción (Evitar duplicados simples por fecha+monto+desc)
-        # Idealmente usaríamos hash del archivo, pero por ahora simple
+    for cuenta, txs in per_account.items():
+        account_id = ensure_account(cuenta, account_type="Bank Account")
+        if not account_id:
+            print(f"   ⚠️ No pude asegurar la cuenta {cuenta}")
+            continue
         try:
-            cur.execute("""
-                INSERT INTO transactions (account_id, date, amount, description, status)
-                VALUES (%s, %s, %s, %s, 'CLEARED')
-            """, (acc_id, fecha, monto, desc))
-            count += 1
-            
-            # GATILLO DE ALERTA
-            check_and_alert_transaction(monto, desc, cuenta, fecha)
-            
+            # Carga masiva (COPY a partir de BULK_COPY_MIN_ROWS filas)
+            new_txs = insert_new_transactions(account_id, txs, import_source=filename)
         except Exception as e:
-            print(f"Error insertando linea: {e}")
-            conn.rollback()
+            print(f"   ❌ Error insertando movimientos de {cuenta}: {e}")
             continue
-            
-    conn.commit()
-    cur.close()
-    conn.close()
+        count += len(new_txs)
+
+        # GATILLO DE ALERTA (solo movimientos nuevos: reimportar no repite alertas; y de esos,
+        # solo gastos grandes y recientes llegan a Gemini)
+        for tx in new_txs:
+            check_and_alert_transaction(tx["amount"], tx["description"], cuenta, tx["date"])
+
     print(f"   ✅ Insertados {count} registros en cuenta '{records[0][3]}'.")
 
 
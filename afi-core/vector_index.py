@@ -0,0 +1,263 @@
+"""
+Gestión del índice vectorial de `financial_wisdom.embedding` (pgvector).
+
+El ivfflat de migrations/0001 se crea sobre la tabla vacía: sus listas no representan el
+corpus y además es `vector_cosine_ops`, que solo sirve al operador `<=>`. Tras una ingesta
+masiva se reconstruye con parámetros explícitos:
+
+    python vector_index.py info
+    python vector_index.py hnsw --m 16 --ef-construction 64
+    python vector_index.py ivfflat --lists 100
+    python vector_index.py quantized binary      # índice de primera pasada compacto (pgvector >= 0.7)
+
+Los parámetros se eligen con el benchmark de verify_rag.py (recall@k y p50/p99 contra
+búsqueda exacta); en consulta se ajustan con set_search_params (hnsw.ef_search /
+ivfflat.probes, SET LOCAL).
+
+Almacenamiento compacto (VECTOR_QUANTIZATION): índices HNSW de expresión sobre
+`embedding::halfvec` (2 bytes/dim) o `binary_quantize(embedding)` (1 bit/dim) para la
+primera pasada ANN; los VECTOR_RERANK_FACTOR * k candidatos se re-ordenan con la distancia
+exacta sobre el `vector` float original, así que el resultado final no pierde precisión.
+Requiere pgvector >= 0.7; con versiones anteriores search() cae a la búsqueda float.
+"""
+import math
+import os
+import sys
+import time
+from typing import List, Optional
+
+from database import get_conn
+from embedding_cache import EMBEDDING_MODEL
+
+VECTOR_INDEX_NAME = "idx_financial_wisdom_embedding"
+VECTOR_INDEX_METHOD = os.getenv("VECTOR_INDEX_METHOD", "hnsw")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+VECTOR_INDEX_BUILD_MEM = os.getenv("VECTOR_INDEX_BUILD_MEM", "512MB")
+
+# Operador de distancia que sirve cada opclass
+OPCLASS_OPERATORS = {
+    "vector_cosine_ops": "<=>",
+    "vector_l2_ops": "<->",
+    "vector_ip_ops": "<#>",
+}
+DEFAULT_OPCLASS = "vector_cosine_ops"
+
+VECTOR_DIM = 768  # financial_wisdom.embedding VECTOR(768)
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")  # none | halfvec | binary
+VECTOR_RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+QUANTIZATION_MIN_VERSION = (0, 7, 0)
+
+# Expresión indexada y operador de la primera pasada, por modo
+QUANTIZED_INDEXES = {
+    "halfvec": {
+        "name": "idx_financial_wisdom_embedding_half",
+        "expression": f"(embedding::halfvec({VECTOR_DIM}))",
+        "opclass": "halfvec_cosine_ops",
+        "order_by": f"embedding::halfvec({VECTOR_DIM}) <=> %(q)s::halfvec({VECTOR_DIM})",
+    },
+    "binary": {
+        "name": "idx_financial_wisdom_embedding_bit",
+        "expression": f"(binary_quantize(embedding)::bit({VECTOR_DIM}))",
+        "opclass": "bit_hamming_ops",
+        "order_by": f"binary_quantize(embedding)::bit({VECTOR_DIM}) <~> binary_quantize(%(q)s::vector)",
+    },
+}
+
+_pgvector_version = None
+
+
+def default_lists(rows: int) -> int:
+    """Recomendación de pgvector: filas/1000 hasta 1M filas, sqrt(filas) por encima."""
+    if rows > 1_000_000:
+        return max(10, int(math.sqrt(rows)))
+    return max(10, rows // 1000)
+
+
+def index_ddl(method: str, opclass: str = DEFAULT_OPCLASS, m: int = HNSW_M,
+              ef_construction: int = HNSW_EF_CONSTRUCTION, lists: Optional[int] = None) -> str:
+    if opclass not in OPCLASS_OPERATORS:
+        raise ValueError(f"Opclass no soportada: {opclass}")
+    if method == "hnsw":
+        options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    elif method == "ivfflat":
+        options = f"lists = {int(lists or 100)}"
+    else:
+        raise ValueError(f"Método de índice no soportado: {method}")
+    return (
+        f"CREATE INDEX {VECTOR_INDEX_NAME} ON financial_wisdom "
+        f"USING {method} (embedding {opclass}) WITH ({options});"
+    )
+
+
+def rebuild_index(method: str = VECTOR_INDEX_METHOD, opclass: str = DEFAULT_OPCLASS, m: int = HNSW_M,
+                  ef_construction: int = HNSW_EF_CONSTRUCTION, lists: Optional[int] = None) -> dict:
+    """
+    Reemplaza el índice vectorial (DROP + CREATE en una transacción) y actualiza
+    estadísticas. ivfflat sin `lists` usa default_lists(filas).
+    """
+    start = time.perf_counter()
+    with get_conn() as conn:
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            cur.execute("SELECT set_config('maintenance_work_mem', %s, true);", (VECTOR_INDEX_BUILD_MEM,))
+            cur.execute("SELECT COUNT(*) FROM financial_wisdom WHERE embedding IS NOT NULL;")
+            rows = cur.fetchone()[0]
+            if method == "ivfflat" and not lists:
+                lists = default_lists(rows)
+            ddl = index_ddl(method, opclass, m=m, ef_construction=ef_construction, lists=lists)
+            cur.execute(f"DROP INDEX IF EXISTS {VECTOR_INDEX_NAME};")
+            cur.execute(ddl)
+        conn.commit()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE financial_wisdom;")
+    elapsed = time.perf_counter() - start
+    print(f"🧭 Índice {method} reconstruido sobre {rows} vectores en {elapsed:.1f}s: {ddl}")
+    return {"method": method, "rows": rows, "seconds": round(elapsed, 2), "ddl": ddl}
+
+
+def pgvector_version(cur) -> tuple:
+    global _pgvector_version
+    if _pgvector_version is None:
+        cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector';")
+        row = cur.fetchone()
+        _pgvector_version = tuple(int(part) for part in row[0].split(".")) if row else (0, 0, 0)
+    return _pgvector_version
+
+
+def supports_quantization(version: tuple) -> bool:
+    return version >= QUANTIZATION_MIN_VERSION
+
+
+def quantized_index_ddl(quantization: str, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION) -> str:
+    if quantization not in QUANTIZED_INDEXES:
+        raise ValueError(f"Cuantización no soportada: {quantization}")
+    spec = QUANTIZED_INDEXES[quantization]
+    return (
+        f"CREATE INDEX {spec['name']} ON financial_wisdom USING hnsw ({spec['expression']} {spec['opclass']}) "
+        f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)});"
+    )
+
+
+def rebuild_quantized_index(quantization: str, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION) -> Optional[dict]:
+    """(Re)crea el índice compacto de primera pasada. None si pgvector no soporta halfvec/bit."""
+    ddl = quantized_index_ddl(quantization, m=m, ef_construction=ef_construction)
+    start = time.perf_counter()
+    with get_conn() as conn:
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            version = pgvector_version(cur)
+            if not supports_quantization(version):
+                print(f"⚠️ pgvector {'.'.join(map(str, version))} no soporta {quantization}; se requiere >= 0.7.")
+                return None
+            cur.execute("SELECT set_config('maintenance_work_mem', %s, true);", (VECTOR_INDEX_BUILD_MEM,))
+            cur.execute(f"DROP INDEX IF EXISTS {QUANTIZED_INDEXES[quantization]['name']};")
+            cur.execute(ddl)
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    print(f"🧭 Índice {quantization} reconstruido en {elapsed:.1f}s: {ddl}")
+    return {"quantization": quantization, "seconds": round(elapsed, 2), "ddl": ddl}
+
+
+def index_sizes() -> dict:
+    """Bytes de cada índice vectorial existente (float, halfvec, binary)."""
+    names = {"none": VECTOR_INDEX_NAME, **{mode: spec["name"] for mode, spec in QUANTIZED_INDEXES.items()}}
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT relname, pg_relation_size(oid) FROM pg_class WHERE relname = ANY(%s);",
+                (list(names.values()),),
+            )
+            sizes = dict(cur.fetchall())
+    return {mode: sizes[name] for mode, name in names.items() if name in sizes}
+
+
+def search_sql(quantization: str = "none") -> str:
+    """Top-k por coseno; con cuantización, primera pasada compacta + re-ranking exacto en float."""
+    exact = "SELECT id, content, COALESCE(source, metadata->>'source') AS source, " \
+            "1 - (embedding <=> %(q)s::vector) AS score FROM {relation} " \
+            "ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s"
+    if quantization == "none":
+        return exact.format(relation="financial_wisdom WHERE embedding_model = %(model)s")
+    candidates = (
+        "(SELECT id, content, source, metadata, embedding FROM financial_wisdom "
+        f"WHERE embedding_model = %(model)s ORDER BY {QUANTIZED_INDEXES[quantization]['order_by']} "
+        "LIMIT %(candidates)s) AS candidates"
+    )
+    return exact.format(relation=candidates)
+
+
+def search(embedding, top_k: int = 3, quantization: str = VECTOR_QUANTIZATION,
+           rerank_factor: int = VECTOR_RERANK_FACTOR, model: Optional[str] = None) -> List[dict]:
+    """Búsqueda en pgvector con el mismo formato que wisdom.WisdomIndex.search (+ id)."""
+    literal = "[" + ",".join(f"{float(x):.6f}" for x in embedding) + "]"
+    candidates = max(top_k, top_k * rerank_factor)
+    with get_conn() as conn:
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            if quantization != "none" and not supports_quantization(pgvector_version(cur)):
+                quantization = "none"
+            # ef_search acota cuántos candidatos devuelve el HNSW: debe cubrir la primera pasada
+            set_search_params(cur, ef_search=max(40, candidates))
+            cur.execute(
+                search_sql(quantization),
+                {"q": literal, "k": top_k, "candidates": candidates, "model": model or EMBEDDING_MODEL},
+            )
+            rows = cur.fetchall()
+    return [{"id": row[0], "content": row[1], "source": row[2], "score": float(row[3])} for row in rows]
+
+
+def index_info() -> Optional[dict]:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT i.indexdef, pg_relation_size(c.oid)
+                FROM pg_indexes i
+                JOIN pg_class c ON c.relname = i.indexname
+                WHERE i.tablename = 'financial_wisdom' AND i.indexname = %s;
+                """,
+                (VECTOR_INDEX_NAME,),
+            )
+            row = cur.fetchone()
+    if not row:
+        return None
+    indexdef, size = row
+    opclass = next((op for op in OPCLASS_OPERATORS if op in indexdef), DEFAULT_OPCLASS)
+    method = "hnsw" if "USING hnsw" in indexdef else "ivfflat" if "USING ivfflat" in indexdef else "otro"
+    return {"method": method, "opclass": opclass, "operator": OPCLASS_OPERATORS[opclass], "bytes": size, "ddl": indexdef}
+
+
+def set_search_params(cur, ef_search: Optional[int] = None, probes: Optional[int] = None) -> None:
+    """Parámetros de búsqueda para la transacción actual (requiere autocommit=False)."""
+    if ef_search is not None:
+        cur.execute("SELECT set_config('hnsw.ef_search', %s, true);", (str(int(ef_search)),))
+    if probes is not None:
+        cur.execute("SELECT set_config('ivfflat.probes', %s, true);", (str(int(probes)),))
+
+
+def _option(argv: List[str], name: str, default=None):
+    if name in argv and argv.index(name) + 1 < len(argv):
+        return int(argv[argv.index(name) + 1])
+    return default
+
+
+def main(argv: List[str]) -> None:
+    command = argv[0] if argv else ""
+    if command == "info":
+        print(index_info() or "⚠️ No hay índice vectorial en financial_wisdom.")
+    elif command == "hnsw":
+        rebuild_index("hnsw", m=_option(argv, "--m", HNSW_M),
+                      ef_construction=_option(argv, "--ef-construction", HNSW_EF_CONSTRUCTION))
+    elif command == "ivfflat":
+        rebuild_index("ivfflat", lists=_option(argv, "--lists"))
+    elif command == "quantized" and len(argv) > 1:
+        rebuild_quantized_index(argv[1], m=_option(argv, "--m", HNSW_M),
+                                ef_construction=_option(argv, "--ef-construction", HNSW_EF_CONSTRUCTION))
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
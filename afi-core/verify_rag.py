@@ -1,41 +1,256 @@
+"""
+Verificación y benchmark del RAG sobre financial_wisdom.
+
+    python verify_rag.py                          # pregunta de humo contra pgvector
+    python verify_rag.py bench --k 10 --queries 200 --ef-search 10,40,100 --probes 1,5,10
+    python verify_rag.py bench-quant --k 10 --queries 200 --rerank 1,4,10
+
+El benchmark mide recall@k y latencia p50/p99 del índice pgvector (vector_index.py) frente a
+la búsqueda exacta por fuerza bruta (NumPy sobre todo el corpus real), para elegir
+m / ef_construction / ef_search / lists / probes con datos. Las consultas son vectores del
+corpus con un poco de ruido, para no premiar que cada uno se encuentre a sí mismo.
+
+bench-quant compara almacenamiento float32 / halfvec / binary (+ re-ranking exacto): bytes
+por vector y del índice, recall@k y latencia, tanto en pgvector (si la versión lo soporta)
+como en memoria (wisdom.py).
+"""
 import os
-import psycopg2
+import sys
+import time
+from typing import List, Optional
+
 import google.generativeai as genai
+import numpy as np
+
+from database import get_conn
+from embedding_cache import embed_text
+import vector_index
+from vector_index import index_info, set_search_params
 
-# Configuración
-DB_HOST = os.getenv("DB_HOST", "afi_db")
-DB_NAME = os.getenv("DB_NAME", "afi_brain")
-DB_USER = os.getenv("DB_USER", "afi_user")
-DB_PASS = os.getenv("DB_PASS")
-API_KEY = os.getenv("GOOGLE_API_KEY")
+BENCH_NOISE = 0.05
+BENCH_SEED = 7
 
-genai.configure(api_key=API_KEY)
+genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+
+def _vec_literal(vec) -> str:
+    return "[" + ",".join(f"{float(x):.6f}" for x in vec) + "]"
 
-def get_conn():
-    return psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASS)
 
 def test_query(question):
     print(f"❓ Pregunta: '{question}'")
-    
+
     # 1. Embed
-    resp = genai.embed_content(model="models/text-embedding-004", content=question, task_type="retrieval_query")
-    embedding = resp["embedding"]
-    vec_literal = "[" + ",".join(f"{float(x):.6f}" for x in embedding) + "]"
+    embedding = embed_text(question, task_type="retrieval_query")
+    if embedding is None:
+        print("❌ No se pudo generar el embedding.")
+        return
+    info = index_info()
+    operator = info["operator"] if info else "<=>"
 
     # 2. Search
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT content, source FROM financial_wisdom ORDER BY embedding <-> %s::vector LIMIT 2",
-        (vec_literal,)
-    )
-    rows = cur.fetchall()
-    
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT content, source FROM financial_wisdom ORDER BY embedding {operator} %s::vector LIMIT 2",
+                (_vec_literal(embedding),),
+            )
+            rows = cur.fetchall()
+
     print(f"📚 Resultados encontrados: {len(rows)}\n")
     for i, (content, source) in enumerate(rows):
         print(f"--- Resultado {i+1} (Fuente: {source}) ---")
         print(content[:300] + "...") # Preview
         print("-------------------------------------------\n")
 
+
+def load_corpus():
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, embedding::real[] FROM financial_wisdom WHERE embedding IS NOT NULL ORDER BY id;")
+            rows = cur.fetchall()
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    matrix = np.asarray([row[1] for row in rows], dtype=np.float32)
+    return ids, matrix
+
+
+def exact_top_k(matrix: np.ndarray, queries: np.ndarray, k: int, operator: str = "<=>") -> np.ndarray:
+    """Vecinos exactos (índices de fila) con la misma métrica que el operador del índice."""
+    if operator == "<=>":
+        unit = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        scores = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ unit.T
+    elif operator == "<#>":
+        scores = queries @ matrix.T
+    else:
+        scores = -((queries ** 2).sum(axis=1, keepdims=True) - 2 * queries @ matrix.T + (matrix ** 2).sum(axis=1))
+    k = min(k, matrix.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+
+def recall_at_k(expected: List[set], found: List[list]) -> float:
+    hits = sum(len(e & set(f)) for e, f in zip(expected, found))
+    total = sum(len(e) for e in expected)
+    return hits / total if total else 0.0
+
+
+def percentile_ms(samples: List[float], pct: float) -> float:
+    return round(float(np.percentile(samples, pct)) * 1000, 2) if samples else 0.0
+
+
+def run_ann(queries: np.ndarray, k: int, operator: str, ef_search: Optional[int] = None,
+            probes: Optional[int] = None):
+    found, latencies = [], []
+    with get_conn() as conn:
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            set_search_params(cur, ef_search=ef_search, probes=probes)
+            sql = f"SELECT id FROM financial_wisdom ORDER BY embedding {operator} %s::vector LIMIT %s"
+            for query in queries:
+                literal = _vec_literal(query)
+                start = time.perf_counter()
+                cur.execute(sql, (literal, k))
+                found.append([row[0] for row in cur.fetchall()])
+                latencies.append(time.perf_counter() - start)
+    return found, latencies
+
+
+def benchmark(k: int = 10, n_queries: int = 200, ef_search: Optional[List[int]] = None,
+              probes: Optional[List[int]] = None) -> List[dict]:
+    info = index_info()
+    if not info:
+        print("⚠️ No hay índice vectorial; se mide solo el seq scan.")
+    operator = info["operator"] if info else "<=>"
+    ids, matrix = load_corpus()
+    if not len(ids):
+        print("⚠️ financial_wisdom está vacía.")
+        return []
+
+    rng = np.random.default_rng(BENCH_SEED)
+    sample = rng.choice(len(ids), size=min(n_queries, len(ids)), replace=False)
+    queries = matrix[sample] + rng.normal(0, BENCH_NOISE * float(np.abs(matrix).mean()), size=(len(sample), matrix.shape[1])).astype(np.float32)
+    expected = [set(ids[row]) for row in exact_top_k(matrix, queries, k, operator)]
+
+    start = time.perf_counter()
+    exact_top_k(matrix, queries, k, operator)
+    numpy_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    if info and info["method"] == "hnsw":
+        settings = [{"ef_search": value} for value in (ef_search or [40])]
+    elif info and info["method"] == "ivfflat":
+        settings = [{"probes": value} for value in (probes or [1])]
+    else:
+        settings = [{}]
+
+    report = []
+    for setting in settings:
+        found, latencies = run_ann(queries, k, operator, **setting)
+        report.append({
+            **setting,
+            "recall": round(recall_at_k(expected, found), 4),
+            "p50_ms": percentile_ms(latencies, 50),
+            "p99_ms": percentile_ms(latencies, 99),
+        })
+
+    print(f"📏 Corpus {len(ids)} x {matrix.shape[1]} | índice {info['method'] if info else 'ninguno'} | "
+          f"k={k} | {len(queries)} consultas | NumPy exacto {numpy_ms:.3f} ms/consulta")
+    for row in report:
+        label = ", ".join(f"{key}={row[key]}" for key in ("ef_search", "probes") if key in row) or "sin parámetros"
+        print(f"   {label:<18} recall@{k}={row['recall']:.4f}  p50={row['p50_ms']} ms  p99={row['p99_ms']} ms")
+    return report
+
+
+def memory_quantized_top_k(matrix: np.ndarray, queries: np.ndarray, k: int, mode: str, rerank_factor: int) -> np.ndarray:
+    """Top-k en memoria con primera pasada float16 o binaria y re-ranking exacto en float32."""
+    unit = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    q_unit = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    candidates = min(len(matrix), k * rerank_factor)
+    if mode == "halfvec":
+        first = q_unit.astype(np.float16) @ unit.astype(np.float16).T
+    else:
+        codes = np.packbits(unit > 0, axis=1)
+        q_codes = np.packbits(q_unit > 0, axis=1)
+        popcount = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+        first = -np.stack([popcount[np.bitwise_xor(codes, q)].sum(axis=1) for q in q_codes]).astype(np.float32)
+    cand = np.argpartition(-first, candidates - 1, axis=1)[:, :candidates]
+    exact = np.einsum("qd,qcd->qc", q_unit, unit[cand])
+    order = np.argsort(-exact, axis=1)[:, :k]
+    return np.take_along_axis(cand, order, axis=1)
+
+
+def benchmark_quantization(k: int = 10, n_queries: int = 200, rerank_factors: Optional[List[int]] = None) -> List[dict]:
+    ids, matrix = load_corpus()
+    if not len(ids):
+        print("⚠️ financial_wisdom está vacía.")
+        return []
+    rng = np.random.default_rng(BENCH_SEED)
+    sample = rng.choice(len(ids), size=min(n_queries, len(ids)), replace=False)
+    queries = matrix[sample] + rng.normal(0, BENCH_NOISE * float(np.abs(matrix).mean()), size=(len(sample), matrix.shape[1])).astype(np.float32)
+    expected_rows = exact_top_k(matrix, queries, k)
+    expected = [set(ids[row]) for row in expected_rows]
+    dim = matrix.shape[1]
+    bytes_per_vector = {"none": dim * 4, "halfvec": dim * 2, "binary": dim // 8}
+
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            version = vector_index.pgvector_version(cur)
+    pg_ok = vector_index.supports_quantization(version)
+    sizes = vector_index.index_sizes()
+
+    report = []
+    for mode in ("none", "halfvec", "binary"):
+        for factor in (rerank_factors or [4]) if mode != "none" else [1]:
+            start = time.perf_counter()
+            rows = exact_top_k(matrix, queries, k) if mode == "none" else memory_quantized_top_k(matrix, queries, k, mode, factor)
+            mem_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            entry = {
+                "mode": mode, "rerank": factor, "bytes_per_vector": bytes_per_vector[mode],
+                "memory_bytes": bytes_per_vector[mode] * len(ids),
+                "memory_recall": round(recall_at_k(expected, [list(ids[row]) for row in rows]), 4),
+                "memory_ms": round(mem_ms, 3), "pg_index_bytes": sizes.get(mode),
+            }
+            if mode == "none" or pg_ok:
+                found, latencies = [], []
+                for query in queries:
+                    t0 = time.perf_counter()
+                    found.append([r["id"] for r in vector_index.search(query, k, quantization=mode, rerank_factor=factor)])
+                    latencies.append(time.perf_counter() - t0)
+                entry.update(pg_recall=round(recall_at_k(expected, found), 4),
+                             pg_p50_ms=percentile_ms(latencies, 50), pg_p99_ms=percentile_ms(latencies, 99))
+            report.append(entry)
+
+    print(f"📏 Corpus {len(ids)} x {dim} | k={k} | {len(queries)} consultas | "
+          f"pgvector {'.'.join(map(str, version))}")
+    for e in report:
+        pg = (f"pg recall={e['pg_recall']:.4f} p50={e['pg_p50_ms']} p99={e['pg_p99_ms']} ms"
+              if "pg_recall" in e else "pg: no soportado")
+        index_size = f"{e['pg_index_bytes'] / 1e6:.1f} MB" if e["pg_index_bytes"] else "-"
+        print(f"   {e['mode']:<8} rerank={e['rerank']:<3} {e['bytes_per_vector']:>5} B/vec "
+              f"RAM {e['memory_bytes'] / 1e6:6.1f} MB recall={e['memory_recall']:.4f} {e['memory_ms']} ms | "
+              f"índice {index_size} | {pg}")
+    return report
+
+
+def _int_list(argv: List[str], name: str) -> Optional[List[int]]:
+    if name in argv and argv.index(name) + 1 < len(argv):
+        return [int(value) for value in argv[argv.index(name) + 1].split(",")]
+    return None
+
+
 if __name__ == "__main__":
-    test_query("What is the 4% rule?")
+    args = sys.argv[1:]
+    if args and args[0] == "bench-quant":
+        benchmark_quantization(
+            k=(_int_list(args, "--k") or [10])[0],
+            n_queries=(_int_list(args, "--queries") or [200])[0],
+            rerank_factors=_int_list(args, "--rerank"),
+        )
+    elif args and args[0] == "bench":
+        benchmark(
+            k=(_int_list(args, "--k") or [10])[0],
+            n_queries=(_int_list(args, "--queries") or [200])[0],
+            ef_search=_int_list(args, "--ef-search"),
+            probes=_int_list(args, "--probes"),
+        )
+    else:
+        test_query("What is the 4% rule?")
@@ -1,16 +1,176 @@
-import chromadb
-
-
-class WisdomRetriever:
-    def __init__(self):
-        self.client = chromadb.HttpClient(host="chroma-db", port=8000)
-        self.collection = self.client.get_collection("financial_wisdom")
-
-    def get_advice(self, query: str, n_results: int = 3):
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
-        context = "\n".join(results["documents"][0]) if results["documents"] else ""
-        sources = [m.get("source") for m in results["metadatas"][0]] if results["metadatas"] else []
-        return context, sources
+"""
+Índice en memoria del corpus `financial_wisdom` (libros ingestados por rag_ingest.py /
+ingest_books.py). Postgres/pgvector sigue siendo la fuente de verdad; aquí se cargan todos
+los vectores en una matriz NumPy contigua y normalizada, y el top-k sale de un único
+producto matriz-vector (similitud coseno) sin ir a la DB.
+
+Solo se cargan los vectores del modelo de embedding vigente (EMBEDDING_MODEL): durante un
+re-index por cambio de modelo los del modelo anterior no son comparables con la consulta.
+
+Recarga en caliente: como mucho cada WISDOM_RELOAD_SECONDS se compara la firma de la tabla
+(filas + id máximo); si cambió se reconstruye la matriz y se reemplaza de forma atómica.
+Es el único retriever de sabiduría: lo usan main.retrieve_wisdom y
+text_to_ui_agent.get_wisdom_context. Con WISDOM_BACKEND=pgvector la búsqueda va a la DB
+(vector_index.search: float, o halfvec/binary + re-ranking exacto según
+VECTOR_QUANTIZATION) con la misma salida; útil cuando el corpus ya no cabe en RAM.
+"""
+import os
+import threading
+import time
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import vector_index
+from database import get_conn
+from embedding_cache import EMBEDDING_MODEL, embed_text
+
+WISDOM_BACKEND = os.getenv("WISDOM_BACKEND", "memory")  # memory | pgvector
+WISDOM_RELOAD_SECONDS = float(os.getenv("WISDOM_RELOAD_SECONDS", "60"))
+# float16 reduce la RAM a la mitad y el top-k prácticamente no cambia, pero NumPy no tiene
+# BLAS en float16: la búsqueda es mucho más lenta (~80x en 5k x 768, ver `verify_rag.py bench-quant`)
+WISDOM_INDEX_DTYPE = np.float16 if os.getenv("WISDOM_INDEX_DTYPE", "float32") == "float16" else np.float32
+
+
+class WisdomIndex:
+    def __init__(self, dtype=WISDOM_INDEX_DTYPE):
+        self.dtype = dtype
+        self.matrix = np.zeros((0, 0), dtype=dtype)
+        self.contents: List[str] = []
+        self.sources: List[Optional[str]] = []
+        self.signature: Optional[Tuple[int, int]] = None
+        self.checked_at = 0.0
+        self.loaded_at: Optional[float] = None
+        self.load_ms = 0.0
+        self.searches = 0
+        self.search_ms_total = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @staticmethod
+    def _signature(cur) -> Tuple[int, int]:
+        cur.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM financial_wisdom;")
+        count, max_id = cur.fetchone()
+        return int(count), int(max_id)
+
+    def build(self, rows: Sequence[tuple]) -> None:
+        """rows = (content, source, embedding). Descarta vectores de dimensión distinta a la mayoritaria."""
+        rows = [row for row in rows if row[2]]
+        dim = Counter(len(row[2]) for row in rows).most_common(1)[0][0] if rows else 0
+        rows = [row for row in rows if len(row[2]) == dim]
+        matrix = np.asarray([row[2] for row in rows], dtype=np.float32).reshape(len(rows), dim)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = np.ascontiguousarray(matrix / norms, dtype=self.dtype)
+        contents = [row[0] for row in rows]
+        sources = [row[1] for row in rows]
+        # Reemplazo atómico: una búsqueda concurrente ve la matriz vieja o la nueva, nunca una mezcla
+        with self._lock:
+            self.matrix, self.contents, self.sources = matrix, contents, sources
+
+    def refresh(self, force: bool = False) -> bool:
+        """Recarga desde Postgres si la tabla cambió. Devuelve True si reconstruyó la matriz."""
+        if not force and self._fresh():
+            return False
+        # Una sola recarga a la vez: en una ráfaga de consultas el resto espera y reusa la matriz nueva
+        with self._refresh_lock:
+            if not force and self._fresh():
+                return False
+            start = time.perf_counter()
+            with get_conn() as conn:
+                with conn.cursor() as cur:
+                    signature = self._signature(cur)
+                    self.checked_at = time.monotonic()
+                    if not force and signature == self.signature:
+                        return False
+                    cur.execute(
+                        """
+                        SELECT content, COALESCE(source, metadata->>'source'), embedding::real[]
+                        FROM financial_wisdom
+                        WHERE embedding IS NOT NULL AND embedding_model = %s
+                        ORDER BY id;
+                        """,
+                        (EMBEDDING_MODEL,),
+                    )
+                    rows = cur.fetchall()
+            self.build(rows)
+            self.signature = signature
+            self.loaded_at = time.time()
+            self.load_ms = (time.perf_counter() - start) * 1000
+        print(f"📚 Índice de sabiduría cargado: {len(self.contents)} fragmentos en {self.load_ms:.0f} ms")
+        return True
+
+    def _fresh(self) -> bool:
+        return self.signature is not None and time.monotonic() - self.checked_at < WISDOM_RELOAD_SECONDS
+
+    def search(self, embedding: Sequence[float], top_k: int = 3) -> List[dict]:
+        start = time.perf_counter()
+        with self._lock:
+            matrix, contents, sources = self.matrix, self.contents, self.sources
+        if not contents or top_k <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        if query.shape[0] != matrix.shape[1]:
+            print(f"⚠️ Dimensión de embedding {query.shape[0]} != índice {matrix.shape[1]}")
+            return []
+        norm = float(np.linalg.norm(query))
+        if norm == 0:
+            return []
+        scores = matrix @ (query / norm).astype(matrix.dtype)
+        k = min(top_k, len(contents))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.searches += 1
+            self.search_ms_total += elapsed
+        return [{"content": contents[i], "source": sources[i], "score": float(scores[i])} for i in top]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "fragments": len(self.contents),
+                "dim": int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0,
+                "dtype": np.dtype(self.dtype).name,
+                "bytes": int(self.matrix.nbytes),
+                "load_ms": round(self.load_ms, 1),
+                "searches": self.searches,
+                "search_ms_avg": round(self.search_ms_total / self.searches, 3) if self.searches else 0.0,
+            }
+
+
+_index = WisdomIndex()
+
+
+def warm() -> None:
+    """Carga inicial (arranque de main); si falla, la primera búsqueda lo reintenta."""
+    if WISDOM_BACKEND == "pgvector":
+        return
+    try:
+        _index.refresh(force=True)
+    except Exception as e:
+        print(f"⚠️ No se pudo cargar el índice de sabiduría: {e}")
+
+
+def retrieve(query: str, top_k: int = 3, embedding: Optional[Sequence[float]] = None) -> List[dict]:
+    """Top-k fragmentos para `query` (o para su embedding ya calculado)."""
+    vec = embedding if embedding is not None else embed_text(query, task_type="retrieval_query")
+    if vec is None:
+        return []
+    if WISDOM_BACKEND == "pgvector":
+        return vector_index.search(vec, top_k)
+    try:
+        _index.refresh()
+    except Exception as e:
+        # Sin DB seguimos sirviendo la última matriz cargada
+        print(f"⚠️ Recarga del índice de sabiduría falló: {e}")
+    return _index.search(vec, top_k)
+
+
+def format_snippets(results: List[dict], default_source: str) -> str:
+    return "\n\n".join(f"[{r['source'] or default_source}] {r['content']}" for r in results)
+
+
+def wisdom_stats() -> dict:
+    return _index.stats()
@@ -48,11 +48,11 @@ def verify_otp(phone: str, code: str) -> Dict[str, Optional[str]]:
         return {"token": None, "error": f"Error de conexión: {e}"}
 
 
-def call_core_api(question: str) -> Dict:
+def call_core_api(question: str, history: Optional[List] = None) -> Dict:
     payload = {
         "question": question,
         "token": st.session_state.get("auth_token"),
-        "history": st.session_state.get("messages") or [],
+        "history": (st.session_state.get("messages") or []) if history is None else history,
     }
     try:
         r = requests.post(f"{CORE_URL}/chat/query", json=payload, timeout=25)
@@ -66,6 +66,17 @@ def call_core_api(question: str) -> Dict:
         return {"answer": "No se pudo conectar con el cerebro de AFI.", "viz_type": "text"}
 
 
+def fetch_next_page(page_token: str) -> Optional[Dict]:
+    payload = {"page_token": page_token, "token": st.session_state.get("auth_token")}
+    try:
+        r = requests.post(f"{CORE_URL}/chat/query/page", json=payload, timeout=25)
+        if r.status_code == 200:
+            return r.json()
+        return None
+    except Exception:
+        return None
+
+
 # --- Render helpers ---
 def safe_parse(data):
     """Asegura que data sea un Diccionario, no un String JSON"""
@@ -115,6 +126,27 @@ def render_payload(raw_data):
     elif viz_type == "table":
         st.dataframe(df, use_container_width=True)
 
+    render_load_more(data)
+
+
+def render_load_more(data: Dict):
+    """Botón 'Cargar más': trae la siguiente página y la agrega al payload en sesión."""
+    page_token = data.get("page_token")
+    if not page_token:
+        if data.get("truncated"):
+            st.caption("Resultado recortado. Refina la pregunta para ver el resto.")
+        return
+    if st.button("Cargar más", key=f"more_{page_token}"):
+        page = fetch_next_page(page_token)
+        if page is None:
+            st.warning("La página expiró. Vuelve a hacer la pregunta.")
+            return
+        # data es el mismo dict guardado en session_state: se extiende en sitio
+        data["data"] = (data.get("data") or []) + (page.get("data") or [])
+        data["page_token"] = page.get("page_token")
+        data["truncated"] = page.get("truncated")
+        st.rerun()
+
 def show_empty_state_ui():
     """Lo que se muestra cuando el sistema es nuevo"""
     st.info("👋 **¡Bienvenido a AFI!** Tu Bóveda está lista pero vacía.")
@@ -196,7 +228,8 @@ def render_executive_summary():
     # 1. Consultar estado de datos
     try:
         # Pedimos al core un chequeo rápido
-        summary = call_core_api("Dame un resumen ejecutivo con patrimonio total, gastos del mes, deuda y tendencia mensual.")
+        # Sin historial: la misma pregunta en cada rerun sale de la caché de respuestas del core
+        summary = call_core_api("Dame un resumen ejecutivo con patrimonio total, gastos del mes, deuda y tendencia mensual.", history=[])
         data = safe_parse(summary)
         
         # 2. DETECTOR DE VACÍO